@@ -33,6 +33,7 @@ import re
 import tempfile
 import subprocess
 import shutil
+import difflib
 import apt_pkg
 import apt_repos
 import time
@@ -45,10 +46,12 @@ import reprepro_bundle
 from reprepro_bundle import PROJECT_DIR, BundleError
 from .update_rule import UpdateRule
 from .bundle import Bundle
-
-APT_REPOS_CMD = "apt-repos/bin/apt-repos"
-if not os.path.exists(APT_REPOS_CMD):
-    APT_REPOS_CMD = "apt-repos"
+from .suite_scan import DEFAULT_SCAN_JOBS
+from .release_watch import ReleaseWatcher, WAIT_MIN_DELAY, WAIT_MAX_DELAY
+from .package_list import getPackageList
+from .bundle_catalog import BundleCatalog
+from .bundle_repos import BundleReposConfig
+from .git_mirror import GitMirror, reserveBundleId, releaseBundleId
 
 logger = logging.getLogger(reprepro_bundle.PROGNAME)
 
@@ -121,6 +124,10 @@ def main():
         p.add_argument("--wait", "-w", action="store_true", default=False, help="""
                             print the list and actively wait (retrying the command again in the background)
                             until the list output changes. Then print the new list and exit""")
+        p.add_argument("--max-wait-delay", type=int, default=WAIT_MAX_DELAY, help="""
+                            The maximum number of seconds to wait between two checks with --wait. The
+                            delay starts at {} seconds and grows up to this value while the list doesn't
+                            change. The default value is '{}'.""".format(WAIT_MIN_DELAY, WAIT_MAX_DELAY))
 
     for p in [parse_init, parse_edit, parse_black, parse_meta, parse_seal, parse_clone, parse_apply, parse_show, parse_list]:
         p.add_argument("--own-suite", default=DEFAULT_OWN_SUITE, help="""
@@ -142,6 +149,12 @@ def main():
         g.add_argument("--highlighted-suites", default=DEFAULT_HIGHLIGHTED, help="""
                             Comma separated list of Suite-Selectors that define suites whose entries should be put on top of the sources_control.list.
                             The default value is '{}'.""".format(DEFAULT_HIGHLIGHTED))
+        g.add_argument("--scan-jobs", type=int, default=DEFAULT_SCAN_JOBS, help="""
+                            Maximum number of suites that are scanned (downloaded and parsed) in parallel.
+                            Use 1 to scan the suites one after another. The default value is '{}'.""".format(DEFAULT_SCAN_JOBS))
+        g.add_argument("--low-memory", action="store_true", default=False, help="""
+                            Don't hold all scanned packages in memory but merge the suites source by source while
+                            writing the sources_control.list. Useful for very large distributions.""")
 
     for p in [parse_edit]:
         g = p.add_argument_group('''sub command 'edit' specific options''')
@@ -198,6 +211,11 @@ def main():
                         command line completion, it is also allowed to specify the full path relative to the projects root in the form
                         repo/bundle/<distribution>[/<bundleID>].""")
 
+    for p in [parse_repos]:
+        p.add_argument("--verify", action="store_true", default=False, help="""
+                        Don't write repo/bundle/bundle.repos, but compare it with a full rebuild from all bundles
+                        and print the differences. Exits with an error if the file is not up to date.""")
+
     for p in [parse_bundles]:
         g = p.add_argument_group('''sub command 'bundles' specific options''')
         g.add_argument("-r", "--readonly", action="store_true", default=False, help="Just print bundles that are marked readonly (that are already sealed).")
@@ -234,7 +252,7 @@ def cmd_init(args):
     #bundle = setupContext(args) - no setup here because context can only be initialized inside the commit_context
     with choose_commit_context(None, args, "INITIALIZED bundle '{bundleName}'", args.bundleName[0]) as (bundle, git_add, cwd):
         git_add.append(create_reprepro_config(bundle))
-        git_add.append(updateReposConfig(cwd=cwd))
+        git_add.append(updateReposConfig(cwd=cwd, bundle=bundle))
 
 
 def confirm_edit_precondition_or_exit(bundle, args):
@@ -316,12 +334,12 @@ def cmd_meta(args):
         Subcommand meta: Edit the bundle's metadata
     '''
     bundle = setupContext(args)
-    with choose_commit_context(bundle, args, "EDITED metadata of bundle '{bundleName}'") as (bundle, git_add, unused_cwd):
+    with choose_commit_context(bundle, args, "EDITED metadata of bundle '{bundleName}'") as (bundle, git_add, cwd):
         create_reprepro_config(bundle)
         infofile = edit_meta(bundle, CANCEL_REMARK.format(action="meta"))
         if infofile:
             git_add.append(infofile)
-            git_add.append(updateReposConfig())
+            git_add.append(updateReposConfig(cwd=cwd, bundle=bundle))
 
 
 def cmd_show(args):
@@ -341,23 +359,28 @@ def cmd_list(args):
     logging.getLogger("apt_repos").setLevel(logging.ERROR)
     cur = None
     firstrun = True
+    watcher = None
     while firstrun or args.wait:
         try:
             bundle.setOwnSuite(args.own_suite)
         except BundleError:
             pass
-        res = get_bundle_list(bundle, "")
-        if cur != res:
-            if len(res) > 0:
-                print("{}\n{}".format('' if firstrun else '\n', res))
-                if firstrun and args.wait:
-                    print("waiting for change ...", end='', flush=True)
-            if cur != None:
-                break #done
-            else:
-                cur = res
+        if args.wait and not watcher and bundle.getOwnSuite():
+            watcher = ReleaseWatcher(bundle.getOwnSuite().getDistsUrl(), maxDelay=args.max_wait_delay)
+        # the package list is only queried again if the suite's Release file changed
+        if not watcher or watcher.hasChanged() or cur is None:
+            res = get_bundle_list(bundle, "")
+            if cur != res:
+                if len(res) > 0:
+                    print("{}\n{}".format('' if firstrun else '\n', res))
+                    if firstrun and args.wait:
+                        print("waiting for change ...", end='', flush=True)
+                if cur != None:
+                    break #done
+                else:
+                    cur = res
         if args.wait:
-            time.sleep(5)
+            time.sleep(watcher.getDelay() if watcher else WAIT_MIN_DELAY)
             print(".", end='', flush=True)
         firstrun = False
 
@@ -392,7 +415,7 @@ def cmd_seal(args):
         git_add.append(infofile)
         git_add.append(bundle.updateInfofile(rollout=True))
         git_add.append(create_reprepro_config(bundle, readOnly=True))
-        git_add.append(updateReposConfig(cwd=cwd))
+        git_add.append(updateReposConfig(cwd=cwd, bundle=bundle))
     sealedHook = reprepro_bundle.getHooksConfig(cwd=cwd).get('bundle_sealed', None)
     if sealedHook:
         info = bundle.getInfo()
@@ -457,6 +480,10 @@ def cmd_update_repos_config(args):
     '''
         Subcommand update-repos-config: updates the file repo/bundle/bundle.repos
     '''
+    if args.verify:
+        if not verifyReposConfig():
+            raise BundleError("The file repo/bundle/bundle.repos is not up to date!")
+        return
     with choose_commit_context(None, args, "UPDATED apt-repos config") as (unused_bundle, git_add, cwd):
         git_add.append(updateReposConfig(cwd=cwd))
 
@@ -479,7 +506,7 @@ def cmd_clone(args):
         args.add_from = srcSuiteName
         args.reference_suites = None
         git_add.append(update_sources_control_list(newBundle, args))
-        git_add.append(updateReposConfig(cwd=cwd))
+        git_add.append(updateReposConfig(cwd=cwd, bundle=newBundle))
         git_add.append(create_reprepro_config(newBundle))
 
 
@@ -487,69 +514,52 @@ def cmd_bundles(args):
     '''
         Subcommand bundles: list available bundles.
     '''
-    for bundle in sorted(scanBundles()):
+    for bundle in BundleCatalog().getEntries():
         if args.bundleNameFilter in bundle.bundleName:
             if args.readonly and bundle.isEditable():
                 continue
             if args.editable and not bundle.isEditable():
                 continue
             editable = "EDITABLE" if bundle.isEditable() else "READONLY"
-            info = bundle.getInfo()
-            target = "[{}]".format(info.get("Target", "no-target"))
-            creator = "({})".format(info.get("Creator", "unknown-creator"))
-            subject = info.get("Releasenotes", "--no-subject--").split("\n")[0]
-            basedOn = info.get("BasedOn", "NEW")
+            target = "[{}]".format(bundle.get("Target", "no-target"))
+            creator = "({})".format(bundle.get("Creator", "unknown-creator"))
+            subject = bundle.get("Subject", "--no-subject--")
+            basedOn = bundle.get("BasedOn", "NEW")
             basedOn = "<BasedOn:{}>".format(basedOn) if not basedOn == 'NEW' else ''
             print(" ".join((bundle.bundleName, editable, target, subject, creator, basedOn)).rstrip())
 
 
-def scanBundles(cwd=PROJECT_DIR):
-    res = set()
-    bundle_root = os.path.join(cwd, "repo", "bundle")
-    for distribution in os.listdir(bundle_root):
-        distribution_path = os.path.join(bundle_root, distribution)
-        if not os.path.isdir(distribution_path):
-            continue
-        for bundleId in os.listdir(distribution_path):
-            bundle_path = os.path.join(distribution_path, bundleId)
-            bundle_distributions_path = os.path.join(bundle_path, 'conf', 'distributions')
-            if not os.path.isfile(bundle_distributions_path):
-                continue
-            try:
-                bundle = Bundle(os.path.relpath(bundle_path, cwd), basedir=cwd)
-                res.add(bundle)
-            except BundleError as e:
-                logger.info("Skipping invalid bundle '{}': {}".format(bundle_path, str(e)))
-    return res
+def updateReposConfig(cwd=PROJECT_DIR, bundle=None):
+    '''
+        Updates the file repo/bundle/bundle.repos and returns it's path. If `bundle` is
+        given, only the entry of this bundle is updated in the existing file, otherwise
+        (or if the existing file can't be read) the file is rebuilt from all bundles.
+    '''
+    config = BundleReposConfig(cwd=cwd)
+    if bundle and config.load():
+        if not config.updateBundle(bundle):
+            return config.getConfFile()
+    else:
+        config.rebuild()
+    return config.store()
 
 
-def updateReposConfig(cwd=PROJECT_DIR):
-    bundle_root = os.path.join(cwd, "repo", "bundle")
-    confFile = os.path.join(bundle_root, "bundle.repos")
-    with open(confFile, "w") as out:
-        print('[', file=out)
-        dist = None
-        liEnd = None
-        for bundle in sorted(scanBundles(cwd=cwd)):
-            if dist != bundle.distribution:
-                dist = bundle.distribution
-                if liEnd:
-                    print(liEnd + ',', file=out)
-                print(' {', file=out)
-                print('    "Oid": "bundle-repositories-{}",'.format(bundle.distribution), file=out)
-                print('    "Suites":', file=out)
-                print('    ["--------",', file=out)
-                liEnd='    "---------"]\n }'
-            tags = list()
-            tags.append("staging" if bundle.isEditable() else "sealed")
-            rollout = bundle.getInfo().get("Rollout")
-            if rollout and rollout.lower() == "true":
-                tags.append("rollout")
-            print('    {{ "Suite": "{}", "Url": "{}", "Tags": [ "{}" ] }},'.format(bundle.bundleName, bundle.bundleName, '", "'.join(tags)), file=out)
-        if liEnd:
-            print(liEnd, file=out)
-        print(']', file=out)
-    return confFile
+def verifyReposConfig(cwd=PROJECT_DIR):
+    '''
+        Compares the file repo/bundle/bundle.repos with the result of a full rebuild,
+        prints the differences and returns True if there are none.
+    '''
+    config = BundleReposConfig(cwd=cwd)
+    config.rebuild()
+    expected = config.render().splitlines(keepends=True)
+    try:
+        with open(config.getConfFile(), "r") as fh:
+            current = fh.readlines()
+    except OSError:
+        current = list()
+    diff = list(difflib.unified_diff(current, expected, config.getConfFile(), "rebuilt"))
+    sys.stdout.writelines(diff)
+    return len(diff) == 0
 
 
 def setupContext(args, require_editable=True, require_own_suite=False):
@@ -674,11 +684,13 @@ def update_sources_control_list(bundle, args, cancel_remark=None):
     highlightedSuites.extend(addFrom)
     sourcesDict = bundle.parseSourcesControlList()
     upgrade_keep_component = not args.no_upgrade_keep_component if "no_upgrade_keep_component" in args.__dict__ else True
+    scan_jobs = args.scan_jobs if "scan_jobs" in args.__dict__ else DEFAULT_SCAN_JOBS
+    low_memory = args.low_memory if "low_memory" in args.__dict__ else False
     if "interactive_suite_filter" in args.__dict__ and args.interactive_suite_filter:
         supplierSuites, refSuites, highlightedSuites = interactive_suite_filter(supplierSuites, refSuites, highlightedSuites)
     with apt_repos.suppress_unwanted_apt_pkg_messages() as forked:
         if forked:
-            bundle.updateSourcesControlList(supplierSuites, refSuites, sourcesDict, highlightedSuites, addFrom, upgradeFrom, upgrade_keep_component, args.no_apt_update, cancel_remark)
+            bundle.updateSourcesControlList(supplierSuites, refSuites, sourcesDict, highlightedSuites, addFrom, upgradeFrom, upgrade_keep_component, args.no_apt_update, cancel_remark, scan_jobs, low_memory)
     return bundle.scl
 
 
@@ -725,9 +737,8 @@ def print_metadata(bundle):
 
 
 def get_bundle_list(bundle, fallback=None):
-    if bundle.getOwnSuiteName():
-        with open("/dev/null", "w") as devnull:
-            return subprocess.check_output([APT_REPOS_CMD, "-b .apt-repos", "ls", "-s", bundle.getOwnSuiteName(), "-col", "CpvaSs", "-r", "." ], stderr=devnull).decode('utf-8')
+    if bundle.getOwnSuite():
+        return getPackageList(bundle.getOwnSuite())
     return fallback
 
 
@@ -854,30 +865,62 @@ def git_local_commit_context(bundle, commit_msg, bundleName=None):
 def git_clean_commit_and_push_context(git_repo_url, git_branch, bundle, own_suite, commit_msg, bundleName=None):
     if not git_repo_url:
         raise BundleError("Could not determine the git repository url. Use --git-repo-url to set one explicitely.")
-    # clone to temp dir
+    # checkout to temp dir
     tmpDir = tempfile.mkdtemp()
     basedir = os.path.join(tmpDir, 'local_repo')
-    logger.debug("Cloning {} to {}".format(git_repo_url, basedir))
-    subprocess.check_call(('git', 'clone', git_repo_url, basedir))
-    subprocess.check_call(('git', 'checkout', git_branch), cwd=basedir)
-
-    if bundle:
-        bundle = Bundle(bundle.bundleName, basedir)
-    elif bundleName:
-        bundle = Bundle(bundleName, basedir)
+    mirror = GitMirror(git_repo_url, reprepro_bundle.getCacheDir("git-mirrors"))
+    worktreeMirror = None # the mirror the worktree basedir needs to be removed from
+    reserved = None # tuple (distribution, bundleID) of a reserved bundleID
     try:
-        if bundle and own_suite:
-            bundle.setOwnSuite(own_suite)
-    except BundleError as e:
-        logger.warning(str(e))
-    git_add_list = list() # of filenames
-
-    yield (bundle, git_add_list, basedir)
-
-    bundleName = bundle.bundleName if bundle else None
-    git_commit(git_add_list, commit_msg.format(bundleName=bundleName), cwd=basedir)
-    git_push(git_branch, cwd=basedir)
-    shutil.rmtree(tmpDir)
+        try:
+            mirror.update()
+            m = re.match(r"^(repo/bundle/)?([\w\.]+)$", bundleName or "")
+            if (not bundle) and m:
+                # reserve the new bundleID before the checkout, so that it won't collide on push
+                try:
+                    reserved = (m.group(2), reserveBundleId(mirror, m.group(2), git_branch))
+                    bundleName = "{}/{}".format(*reserved)
+                except subprocess.CalledProcessError as e:
+                    logger.warning("Could not reserve a new bundleID: {} --> using the next free bundleID of the checkout".format(e))
+            logger.debug("Checking out {} from git mirror {} to {}".format(git_branch, mirror.getGitDir(), basedir))
+            mirror.addWorktree(basedir, git_branch)
+            worktreeMirror = mirror
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.warning("Could not use the git mirror {}: {} --> cloning instead".format(mirror.getGitDir(), e))
+            shutil.rmtree(basedir, ignore_errors=True)
+            logger.debug("Cloning {} to {}".format(git_repo_url, basedir))
+            subprocess.check_call(('git', 'clone', git_repo_url, basedir))
+            subprocess.check_call(('git', 'checkout', git_branch), cwd=basedir)
+
+        if bundle:
+            bundle = Bundle(bundle.bundleName, basedir)
+        elif bundleName:
+            bundle = Bundle(bundleName, basedir)
+        try:
+            if bundle and own_suite:
+                bundle.setOwnSuite(own_suite)
+        except BundleError as e:
+            logger.warning(str(e))
+        git_add_list = list() # of filenames
+
+        yield (bundle, git_add_list, basedir)
+
+        bundleName = bundle.bundleName if bundle else None
+        git_commit(git_add_list, commit_msg.format(bundleName=bundleName), cwd=basedir)
+        git_push(git_branch, cwd=basedir)
+        if reserved and bundle and git_is_tracked(os.path.join("repo", "bundle", bundle.bundleName), cwd=basedir):
+            # the pushed bundle now holds the bundleID, so the reservation is no longer needed
+            try:
+                releaseBundleId(mirror, *reserved)
+            except subprocess.CalledProcessError as e:
+                logger.warning("Could not release the reservation of bundleID {}: {}".format(bundle.bundleName, e))
+    finally:
+        if worktreeMirror:
+            try:
+                worktreeMirror.removeWorktree(basedir)
+            except (subprocess.CalledProcessError, OSError) as e:
+                logger.warning("Could not remove the worktree {} from the git mirror {}: {}".format(basedir, worktreeMirror.getGitDir(), e))
+        shutil.rmtree(tmpDir, ignore_errors=True)
 
 
 def git_commit(git_add_list, msg, cwd=PROJECT_DIR):
@@ -894,14 +937,24 @@ def git_commit(git_add_list, msg, cwd=PROJECT_DIR):
             logger.warning(line)
 
 
+def git_is_tracked(path, cwd=PROJECT_DIR):
+    '''
+        Returns True if `path` is contained in the commit HEAD.
+    '''
+    out = subprocess.check_output(('git', 'ls-tree', '--name-only', 'HEAD', path), cwd=cwd)
+    return len(out.strip()) > 0
+
+
 def git_push(git_branch, cwd=PROJECT_DIR):
+    # pushing HEAD also works for the detached HEAD of a git mirror's worktree
+    refspec = 'HEAD:refs/heads/' + git_branch
     try:
-        subprocess.check_call(('git', 'push', 'origin', git_branch), cwd=cwd)
+        subprocess.check_call(('git', 'push', 'origin', refspec), cwd=cwd)
     except subprocess.CalledProcessError:
         # did the 'push' failed because of another person pushed before?
         # - fix this situation and retry the 'push'
-        subprocess.check_call(('git', 'pull', '-r'), cwd=cwd)
-        subprocess.check_call(('git', 'push', 'origin', git_branch), cwd=cwd)
+        subprocess.check_call(('git', 'pull', '-r', 'origin', git_branch), cwd=cwd)
+        subprocess.check_call(('git', 'push', 'origin', refspec), cwd=cwd)
 
 
 if __name__ == "__main__":
@@ -70,6 +70,15 @@ def __getConfig(confFiles):
     return res
 
 
+def getCacheDir(name, cwd=PROJECT_DIR):
+    '''
+        Returns the path of the folder used to cache data of type `name`. Caches are
+        stored next to apt-repos' own cache in .apt-repos/.apt-repos_cache, so they
+        are already excluded from git. The folder is not created by this function.
+    '''
+    return os.path.join(cwd, ".apt-repos", ".apt-repos_cache", "reprepro-bundle-tools", name)
+
+
 class BundleError (Exception):
     def __init__(self, message):
         super(BundleError, self).__init__(message)
@@ -29,7 +29,9 @@ import sys
 import json
 from reprepro_bundle_appserver import common_app_server, common_interfaces
 from aiohttp import web
-from reprepro_bundle.BundleCLI import scanBundles
+from reprepro_bundle import PROJECT_DIR
+from reprepro_bundle.bundle import Bundle
+from reprepro_bundle.bundle_catalog import BundleCatalog
 
 progname = "bundle-app"
 logger = logging.getLogger("reprepro_bundle_appserver.bundle_app")
@@ -41,7 +43,7 @@ if not os.path.exists(APP_DIST):
 
 async def handle_get_bundleList(request):
     res = list()
-    for bundle in sorted(scanBundles()):
+    for bundle in BundleCatalog().getEntries():
         res.append(common_interfaces.Bundle(bundle))
     return web.json_response(res)
 
@@ -54,9 +56,9 @@ async def handle_set_metadata(request):
 
 
 async def handle_get_metadata(request):
-    for bundle in sorted(scanBundles()):
-        if bundle.bundleName == request.rel_url.query['bundlename']:
-            return web.json_response(common_interfaces.BundleMetadata(bundle))
+    for entry in BundleCatalog().getEntries():
+        if entry.bundleName == request.rel_url.query['bundlename']:
+            return web.json_response(common_interfaces.BundleMetadata(Bundle(entry.bundleName, basedir=PROJECT_DIR)))
     return web.Response(text="error")
 
 
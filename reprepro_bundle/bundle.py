@@ -23,12 +23,18 @@ import re
 import apt_pkg
 import getpass
 import apt_repos
+import heapq
+import shutil
+import tempfile
+import itertools
 
-from reprepro_bundle import BundleError
+from reprepro_bundle import BundleError, getCacheDir
 from .package_status import PackageStatus
-from .package import Package
+from .package import Package, sortPackages
+from .package_classifier import PackageClassifier
+from .suite_scan import scanSuites, spoolSuites, DEFAULT_SCAN_JOBS
 from apt_repos import PackageField
-from jinja2 import Environment, FileSystemLoader
+from .template_env import getTemplateEnvironment
 
 logger = logging.getLogger(__name__)
 
@@ -76,7 +82,6 @@ class Bundle():
         self._infofile = "info"
         self._updatesfile = "updates"
         self._ownSuite = None
-        self._templateEnv = Environment(loader=FileSystemLoader(self.getTemplateDir()))
 
 
     def setOwnSuite(self, ownSuiteStr):
@@ -95,6 +100,12 @@ class Bundle():
             raise BundleError("Could not connect bundle '{}' to it's own apt-repos suite '{}'.".format(self.bundleName, selector))
 
 
+    def getOwnSuite(self):
+        '''
+            returns the apt_repos.RepoSuite object of the bundle itself or None (see getOwnSuiteName()).
+        '''
+        return self._ownSuite
+
     def getOwnSuiteName(self):
         '''
             returns the apt-repos suite identifier for the bundle itself or None if
@@ -152,6 +163,13 @@ class Bundle():
         '''
         return os.path.join(self.basedir, "templates", "bundle", self.distribution)
 
+    def getTemplateEnv(self):
+        '''
+            Returns the (shared) jinja2 Environment for the templates in getTemplateDir().
+            It is only created when the first template is rendered.
+        '''
+        return getTemplateEnvironment(self.getTemplateDir(), getCacheDir("templates", cwd=self.basedir))
+
     def getBlacklistFile(self):
         return os.path.join(self.__confDir, self._blacklist)
 
@@ -189,6 +207,7 @@ class Bundle():
         if not os.path.isdir(self.__confDir):
             os.makedirs(self.__confDir)
         readOnly = "Yes" if readOnly else "No"
+        templateEnv = self.getTemplateEnv()
         # evaluate main templates
         for templateFile in [ "info.once", "distributions", "sources_control.list.once" ]:
             targetFile = os.path.join(self.__confDir, templateFile)
@@ -196,7 +215,7 @@ class Bundle():
                 targetFile = os.path.join(self.__confDir, templateFile[0:-len(".once")])
                 if os.path.isfile(targetFile):
                     continue
-            template = self._templateEnv.get_template(templateFile)
+            template = templateEnv.get_template(templateFile)
             with open(targetFile, "w", encoding="utf-8") as outfile:
                 outfile.write(template.render(
                     creator=getpass.getuser(),
@@ -206,7 +225,7 @@ class Bundle():
                     baseBundleName="NEW",
                     updateRules=" ".join([r.getRuleName() for r in updateRules])))
         # creating conf/updates file
-        updatesSkel = self._templateEnv.get_template("updates.skel")
+        updatesSkel = templateEnv.get_template("updates.skel")
         blacklistFile = self._blacklist if os.path.exists(self.getBlacklistFile()) else None
         with open(self.getUpdatesFile(), "w") as fh:
             print("\n".join([r.getUpdateRule(updatesSkel, self.getOwnSuiteName(), blacklistFile) for r in updateRules]), file=fh)
@@ -280,8 +299,9 @@ class Bundle():
             msg = "Could not parse {}:\n{}".format(self.scl, e)
             for l in msg.split("\n"):
                 logger.warn(l)
+        classifier = PackageClassifier(self.getOwnSuiteName())
         for unused_source, packages in sorted(sourcesDict.items()):
-            self._markActive(packages, packages)
+            classifier.markActive(sortPackages(packages), packages)
         return sourcesDict
 
 
@@ -325,7 +345,7 @@ class Bundle():
             self._writeBlacklist(blacklisted)
 
 
-    def updateSourcesControlList(self, supplierSuites, refSuites, prevSourcesDict, highlightedSuites, addFrom, upgradeFrom, upgradeKeepComponent, no_update, cancel_remark=None):
+    def updateSourcesControlList(self, supplierSuites, refSuites, prevSourcesDict, highlightedSuites, addFrom, upgradeFrom, upgradeKeepComponent, no_update, cancel_remark=None, scanJobs=DEFAULT_SCAN_JOBS, streaming=False):
         '''
            This method scans the provided `supplierSuites`, `refSuites` and the bundles ownSuite to
            create an user editable version of the sources_control.list providing a full overview
@@ -350,51 +370,33 @@ class Bundle():
 
            All the above mentioned lists of suite identifiers expext apt_repos.RepoSuite Objects.
            If `no_update` is true, apt-repos is adviced to don't update it's apt cache for the
-           particular repositories.
+           particular repositories. Up to `scanJobs` suites are scanned in parallel and
+           the query results are cached per suite (see `suite_scan.scanSuites()`). All
+           sources are classified in one pass by a PackageClassifier.
+
+           If `streaming` is true, the suites are not held in memory. Instead the query results
+           of all suites are merged ordered by source name and the sources_control.list is written
+           source by source (see `_streamSourcesControlList()`).
         '''
-        reqFields = PackageField.getByFieldsString('CvsSy')
         suites = set(supplierSuites)
         suites = suites.union(highlightedSuites)
         suites = suites.union(refSuites)
         logger.info("Creating sources_control.list for {} suites".format(len(suites)))
 
-        sources = dict() # maps suite -> source-name -> QueryResult
-        binaries = dict() # maps suite -> source-name (grouping binaries by their source-name) -> QueryResult
-        sourcesNames = set() # set of all sources names
+        classifier = PackageClassifier(self.getOwnSuiteName(), refSuites, addFrom, upgradeFrom, upgradeKeepComponent)
+        highlightedNames = set([s.getSuiteName() for s in highlightedSuites])
+        if streaming:
+            self._streamSourcesControlList(suites, not no_update, scanJobs, classifier, prevSourcesDict, highlightedNames, cancel_remark)
+            return
+
         highlighted = set(prevSourcesDict.keys()) # set of names of sources that should be highlighted
-        action = ("Updating and " if not no_update else "") + "Querying"
-        for suite in sorted(suites):
-            logger.info("{} suite {}".format(action, suite))
-            suite.scan(not no_update)
-            sources[suite] = self._setToMap(suite.querySources('.', True, None, None, reqFields))
-            # scan sources associated to binaries and filter the latest version for each source
-            mostRecent = dict()
-            for binSrc in sorted(suite.queryPackages('.', True, None, None, reqFields)):
-                k = binSrc.getData()[0]
-                mostRecent[k] = binSrc
-            binaries[suite] = self._setToMap([ v for k, v in mostRecent.items() ])
-            if suite in highlightedSuites:
-                highlighted = highlighted.union(sources[suite].keys()).union(binaries[suite].keys())
-            sourcesNames = sourcesNames.union(sources[suite].keys()).union(binaries[suite].keys())
-
-        sourcesDict = dict()
-        for source in sourcesNames:
-            packages = sourcesDict.get(source, set())
-            sourcesDict[source] = packages
-            mergePackages = prevSourcesDict.get(source, set())
-            for suite in suites:
-                s = sources.get(suite, dict()).get(source, None)
-                b = binaries.get(suite, dict()).get(source, None)
-                package = Package.getByQueryResults(s, b)
-                if package:
-                    packages.add(package)
-            # update PackageStatus and activate (only one)
-            current = self._getCurrentReferenceVersion(packages, refSuites)
-            for package in sorted(packages):
-                package.updateStatus(current)
-                if package.status == PackageStatus.IS_CURRENT and package.suiteName == self.getOwnSuiteName():
-                    package.status = PackageStatus.SHOULD_BE_KEPT
-            self._markActive(packages, mergePackages, addFrom, upgradeFrom, upgradeKeepComponent)
+        scanned = scanSuites(suites, not no_update, scanJobs, getCacheDir("query", cwd=self.basedir))
+        for suiteName, (sources, binaries) in scanned.items():
+            if suiteName in highlightedNames:
+                highlighted.update(sources.keys())
+                highlighted.update(binaries.keys())
+
+        sourcesDict = classifier.classifyAll(scanned, prevSourcesDict)
 
         self._writeSourcesControlList(sourcesDict, highlighted, cancel_remark)
 
@@ -487,60 +489,6 @@ class Bundle():
         return self.bundleName < other.bundleName
 
 
-    def _getCurrentReferenceVersion(self, packages, refSuites):
-        '''
-        returns the one package from the list of (all equally named!) packages that
-        is the `current` package from the view of this bundle. The `current` package
-        is either the package found in Own-Suite (if so) or the package with
-        the highest version found in any of the reference suites refSuites. This method
-        returns None if the package is not contained in Own-Suite or refSuites.
-        '''
-        latest = None
-        for package in sorted(packages):
-            if package.suiteName == self.getOwnSuiteName():
-                return package
-            elif package.suiteName in [s.getSuiteName() for s in refSuites]:
-                latest = package
-        return latest
-
-
-    def _markActive(self, packages, mergePackages, addFrom=None, upgradeFrom=None, upgradeKeepComponent=None):
-        '''
-            This method has some kind of precedence mechanism to ensure that only one
-            package from a list of (equally named) `packages` is marked active.
-
-            In this context the lowest priority is given to all packages that are currently
-            available (from scanning refSuites and ownSuite).
-
-            medium priority to `mergePackages` which contains the packages that were active
-            in a previous version of the sources_control.list and thus should set active
-            (merged) into the new list.
-
-            `addFrom`- and `upgradeFrom`-suites describe suites whose new / upgradable
-            packages should always be marked as active (with highest precidence), except
-            upgradeKeepComponent is True and an upgrade would change the component.
-        '''
-        markedForActivation = (None, 0) # tuple of (package, precedence)
-        currentComponent = None
-        for package in sorted(packages):
-            (_, precedence) = markedForActivation
-            if   precedence < 1 and (package.status == PackageStatus.IS_CURRENT or package.status == PackageStatus.SHOULD_BE_KEPT):
-                markedForActivation = (package, 1)
-                currentComponent = package.component
-            elif precedence < 2 and package in mergePackages:
-                markedForActivation = (package, 2)
-            elif precedence < 3 and addFrom and package.status == PackageStatus.IS_MISSING and package.suiteName in [s.getSuiteName() for s in addFrom]:
-                markedForActivation = (package, 3)
-            elif precedence < 4 and upgradeFrom and package.status == PackageStatus.IS_UPGRADE and package.suiteName in [s.getSuiteName() for s in upgradeFrom]:
-                if upgradeKeepComponent and currentComponent and currentComponent != package.component:
-                    logger.warn("Skipping upgradable {} {} which would change the physical component from '{}' to '{}'".format(package.sourceName, package.version, currentComponent, package.component))
-                else:
-                    markedForActivation = (package, 4)
-        (markedForActivation, _) = markedForActivation
-        if markedForActivation:
-            markedForActivation.active = True
-
-
     def _writeSourcesControlList(self, sourcesDict, highlighted, cancel_remark=None):
         sep = "\n#" + "=" * 80
         with open(self.scl, 'w') as outfile:
@@ -552,7 +500,7 @@ class Bundle():
             sourcesReordered.extend(sorted(sourcesDict.keys() - highlighted))
             for source in sourcesReordered:
                 packages = sourcesDict.get(source, set())
-                for package in sorted(packages):
+                for package in sortPackages(packages):
                     if sep and len(highlighted) > 0 and not source in highlighted:
                         print(sep, file=outfile)
                         sep = None
@@ -563,6 +511,49 @@ class Bundle():
                     print(actionString, file=outfile)
 
 
+    def _streamSourcesControlList(self, suites, update, scanJobs, classifier, prevSourcesDict, highlightedNames, cancel_remark=None):
+        '''
+            Writes the same sources_control.list as `_writeSourcesControlList()` with a memory
+            consumption that is proportional to the number of suites instead of the number of
+            packages: the suites are spooled to the query cache (see `suite_scan.spoolSuites()`),
+            their rows are k-way merged by source name and each source is classified and written
+            on it's own. Highlighted sources are written directly, all other sources are collected
+            in a temporary file that is appended to the sources_control.list in the end.
+        '''
+        sep = "\n#" + "=" * 80
+        cache = spoolSuites(suites, update, getCacheDir("query", cwd=self.basedir), scanJobs)
+        rows = heapq.merge(*[cache.iterRows(s.getSuiteName()) for s in sorted(suites)], key=lambda r: r[0])
+        withHighlights = len(prevSourcesDict) > 0
+        with open(self.scl, 'w') as outfile, tempfile.TemporaryFile('w+') as restfile:
+            if cancel_remark:
+                print(cancel_remark, file=outfile)
+            lastHighlighted = None
+            lastRest = None
+            for source, group in itertools.groupby(rows, key=lambda r: r[0]):
+                packages = set()
+                isHighlighted = source in prevSourcesDict
+                for (_, s, b) in group:
+                    packages.add(Package.getByScanResults(s, b))
+                    isHighlighted = isHighlighted or (s or b)[2] in highlightedNames
+                classifier.classify(packages, prevSourcesDict.get(source, set()))
+                if isHighlighted:
+                    (out, last, lastHighlighted) = (outfile, lastHighlighted, source)
+                    withHighlights = True
+                else:
+                    (out, last, lastRest) = (restfile, lastRest, source)
+                if last:
+                    print(file=out)
+                for package in sortPackages(packages):
+                    print(package.formatActionString(), file=out)
+            if lastRest:
+                if withHighlights:
+                    print(sep, file=outfile)
+                if lastHighlighted:
+                    print(file=outfile)
+                restfile.seek(0)
+                shutil.copyfileobj(restfile, outfile)
+
+
     def _writeBlacklist(self, blacklisted, proposed=set(), cancel_remark=None):
         sep = "\n#" + "=" * 20 + " uncomment to blacklist: " + "=" * 20
         with open(self.getBlacklistFile(), 'w') as outfile:
@@ -574,12 +565,3 @@ class Bundle():
                 print(sep, file=outfile)
                 for package in sorted(proposed):
                     print("# {} purge".format(package), file=outfile)
-
-
-    def _setToMap(self, myset):
-        res = dict()
-        for r in myset:
-            if len(r.getData()) > 0:
-                k = r.getData()[0]
-                res[k] = r
-        return res
@@ -0,0 +1,152 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import json
+import logging
+import tempfile
+from reprepro_bundle import PROJECT_DIR, BundleError, getCacheDir
+from .bundle import Bundle
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILE = "catalog.json"
+
+
+class CatalogEntry:
+    '''
+        The cataloged state of a bundle: it's name, distribution, editable state and
+        the fields "Target", "Creator", "Subject" (the first line of the Releasenotes),
+        "BasedOn" and "Rollout" of it's info file.
+    '''
+    def __init__(self, bundleName, editable, fields):
+        self.bundleName = bundleName
+        self.distribution = bundleName.split("/", 1)[0]
+        self.__editable = editable
+        self.__fields = fields
+
+    def isEditable(self):
+        return self.__editable
+
+    def get(self, field, default=None):
+        '''
+            Returns the value of the info file `field` or `default` if the info file
+            doesn't contain the field.
+        '''
+        return self.__fields.get(field, default)
+
+    def __lt__(self, other):
+        return self.bundleName < other.bundleName
+
+
+class BundleCatalog:
+    '''
+        A persistent catalog of all bundles in <cwd>/repo/bundle. Instead of creating a
+        Bundle object and parsing conf/distributions and conf/info for each bundle each
+        time the bundles are listed, the catalog keeps a CatalogEntry for each bundle
+        together with the mtimes and sizes of both files. An entry is only created again
+        if one of these files changed.
+
+        The catalog is stored as json file in the cache folder getCacheDir("catalog"),
+        so the project's git tree is not touched.
+    '''
+    def __init__(self, cwd=PROJECT_DIR):
+        self.__cwd = cwd
+        self.__bundleRoot = os.path.join(cwd, "repo", "bundle")
+        self.__cacheDir = getCacheDir("catalog", cwd=cwd)
+        self.__catalogFile = os.path.join(self.__cacheDir, CATALOG_FILE)
+
+    def getEntries(self):
+        '''
+            Returns the sorted list of CatalogEntry objects for all (valid) bundles.
+        '''
+        cached = self.__load()
+        catalog = dict()
+        changed = False
+        for bundlePath in self.__findBundlePaths():
+            relPath = os.path.relpath(bundlePath, self.__cwd)
+            stamp = [self.__getStamp(os.path.join(bundlePath, 'conf', name)) for name in ('distributions', 'info')]
+            entry = cached.get(relPath)
+            if not entry or entry.get('stamp') != stamp:
+                changed = True
+                try:
+                    entry = self.__createEntry(relPath, stamp)
+                except BundleError as e:
+                    logger.info("Skipping invalid bundle '{}': {}".format(bundlePath, str(e)))
+                    continue
+            catalog[relPath] = entry
+        if changed or len(catalog) != len(cached):
+            try:
+                self.__store(catalog)
+            except OSError as e:
+                logger.debug("Could not update the bundle catalog {}: {}".format(self.__catalogFile, e))
+        # different folders (like 1 and 0001) could describe the same bundleName
+        entries = { e['bundleName']: CatalogEntry(e['bundleName'], e['editable'], e['fields']) for e in catalog.values() }
+        return sorted(entries.values())
+
+    def __findBundlePaths(self):
+        res = list()
+        for distribution in os.listdir(self.__bundleRoot):
+            distribution_path = os.path.join(self.__bundleRoot, distribution)
+            if not os.path.isdir(distribution_path):
+                continue
+            for bundleId in os.listdir(distribution_path):
+                bundle_path = os.path.join(distribution_path, bundleId)
+                if os.path.isfile(os.path.join(bundle_path, 'conf', 'distributions')):
+                    res.append(bundle_path)
+        return res
+
+    def __createEntry(self, relPath, stamp):
+        bundle = Bundle(relPath, basedir=self.__cwd)
+        info = bundle.getInfo()
+        fields = { key: info[key] for key in ("Target", "Creator", "BasedOn", "Rollout") if key in info }
+        if "Releasenotes" in info:
+            fields["Subject"] = info["Releasenotes"].split("\n")[0]
+        return {
+            'bundleName': bundle.bundleName,
+            'editable': bundle.isEditable(),
+            'fields': fields,
+            'stamp': stamp
+        }
+
+    def __getStamp(self, filename):
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size]
+
+    def __load(self):
+        try:
+            with open(self.__catalogFile, "r") as fh:
+                return json.load(fh)
+        except (OSError, ValueError) as e:
+            logger.debug("No usable bundle catalog {}: {}".format(self.__catalogFile, e))
+        return dict()
+
+    def __store(self, catalog):
+        os.makedirs(self.__cacheDir, exist_ok=True)
+        fd, tmpFile = tempfile.mkstemp(dir=self.__cacheDir)
+        try:
+            with os.fdopen(fd, "w") as out:
+                json.dump(catalog, out, indent=1, sort_keys=True)
+            os.replace(tmpFile, self.__catalogFile)
+        except Exception:
+            os.remove(tmpFile)
+            raise
@@ -0,0 +1,144 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import json
+import bisect
+import logging
+import tempfile
+from reprepro_bundle import PROJECT_DIR
+from .bundle_catalog import BundleCatalog
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_REPOS_FILE = "bundle.repos"
+
+
+def getBundleReposTags(editable, rollout):
+    '''
+        Returns the list of apt-repos tags for a bundle with the editable state
+        `editable` and the info field value `rollout`.
+    '''
+    tags = ["staging" if editable else "sealed"]
+    if rollout and rollout.lower() == "true":
+        tags.append("rollout")
+    return tags
+
+
+class BundleReposConfig:
+    '''
+        The in-memory model of the apt-repos configuration repo/bundle/bundle.repos
+        that describes all bundles as apt-repos suites. The model is a list of
+        (bundleName, tags) tuples sorted by bundleName, so that a single bundle
+        entry can be updated without rescanning all bundles.
+    '''
+    def __init__(self, cwd=PROJECT_DIR):
+        self.__confFile = os.path.join(cwd, "repo", "bundle", BUNDLE_REPOS_FILE)
+        self.__cwd = cwd
+        self.__entries = list()
+
+    def getConfFile(self):
+        return self.__confFile
+
+    def load(self):
+        '''
+            Loads the model from the existing bundle.repos file. Returns False if
+            the file doesn't exist or couldn't be parsed.
+        '''
+        try:
+            with open(self.__confFile, "r") as fh:
+                config = json.load(fh)
+            entries = list()
+            for repo in config:
+                for suite in repo["Suites"]:
+                    if isinstance(suite, dict):
+                        entries.append((suite["Suite"], list(suite["Tags"])))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug("Could not load {}: {}".format(self.__confFile, e))
+            return False
+        self.__entries = sorted(entries)
+        return True
+
+    def rebuild(self):
+        '''
+            Rebuilds the model from all bundles in repo/bundle.
+        '''
+        self.__entries = [
+            (entry.bundleName, getBundleReposTags(entry.isEditable(), entry.get("Rollout")))
+            for entry in BundleCatalog(cwd=self.__cwd).getEntries()
+        ]
+
+    def updateBundle(self, bundle):
+        '''
+            Adds or replaces the entry for the Bundle `bundle`. Returns True if the
+            model changed.
+        '''
+        entry = (bundle.bundleName, getBundleReposTags(bundle.isEditable(), bundle.getInfo().get("Rollout")))
+        index = bisect.bisect_left(self.__entries, (bundle.bundleName,))
+        if index < len(self.__entries) and self.__entries[index][0] == bundle.bundleName:
+            if self.__entries[index] == entry:
+                return False
+            self.__entries[index] = entry
+        else:
+            self.__entries.insert(index, entry)
+        return True
+
+    def getEntries(self):
+        return list(self.__entries)
+
+    def render(self):
+        '''
+            Returns the content of the bundle.repos file for the current model.
+        '''
+        lines = ['[']
+        dist = None
+        liEnd = None
+        for (bundleName, tags) in self.__entries:
+            distribution = bundleName.split("/", 1)[0]
+            if dist != distribution:
+                dist = distribution
+                if liEnd:
+                    lines.append(liEnd + ',')
+                lines.append(' {')
+                lines.append('    "Oid": "bundle-repositories-{}",'.format(distribution))
+                lines.append('    "Suites":')
+                lines.append('    ["--------",')
+                liEnd = '    "---------"]\n }'
+            lines.append('    {{ "Suite": "{}", "Url": "{}", "Tags": [ "{}" ] }},'.format(bundleName, bundleName, '", "'.join(tags)))
+        if liEnd:
+            lines.append(liEnd)
+        lines.append(']')
+        return "\n".join(lines) + "\n"
+
+    def store(self):
+        '''
+            Atomically writes the model to the bundle.repos file and returns the
+            path of the file.
+        '''
+        confDir = os.path.dirname(self.__confFile)
+        fd, tmpFile = tempfile.mkstemp(dir=confDir, prefix="." + BUNDLE_REPOS_FILE)
+        try:
+            with os.fdopen(fd, "w") as out:
+                out.write(self.render())
+            os.chmod(tmpFile, 0o644)
+            os.replace(tmpFile, self.__confFile)
+        except Exception:
+            os.remove(tmpFile)
+            raise
+        return self.__confFile
@@ -0,0 +1,224 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import time
+import uuid
+import fcntl
+import socket
+import getpass
+import hashlib
+import logging
+import subprocess
+from contextlib import contextmanager
+from reprepro_bundle import BundleError
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_IDS_REFS = "refs/bundle-ids/"
+RESERVE_ATTEMPTS = 10
+# status reported by 'git push --porcelain' if the pushed ref already exists remotely.
+# "failed to update ref" is reported if a concurrent push created the ref first.
+PUSH_REF_EXISTS_STATUS = (
+    "[rejected] (stale info)",
+    "[rejected] (already exists)",
+    "[rejected] (fetch first)",
+    "[rejected] (non-fast-forward)",
+    "[remote rejected] (failed to update ref)"
+)
+
+
+class GitMirror:
+    '''
+        A persistent local bare repository that mirrors the branches of the git
+        repository `url` (as remote "origin"). Instead of cloning the whole
+        repository for each clean commit, the mirror is refreshed with `git fetch`
+        and a throwaway worktree is checked out from it. Commits created in the
+        worktree are stored in the mirror and can be pushed to "origin" directly.
+
+        The mirror is stored in `cacheDir` in a folder derived from `url`. Changes
+        of the mirror are serialized by a lock file, so that concurrent commands
+        could share the mirror.
+    '''
+    def __init__(self, url, cacheDir):
+        self.__url = url
+        self.__gitDir = os.path.join(cacheDir, hashlib.sha256(url.encode("utf-8")).hexdigest()[:16] + ".git")
+        self.__lockFile = self.__gitDir + ".lock"
+
+    def getGitDir(self):
+        return self.__gitDir
+
+    def update(self):
+        '''
+            Creates the mirror if it doesn't exist yet and fetches all branches of
+            the remote repository. Reservation refs are not fetched (see `listRemoteRefs()`).
+        '''
+        with self.__locked():
+            if not os.path.isdir(self.__gitDir):
+                logger.debug("Creating git mirror {} for {}".format(self.__gitDir, self.__url))
+                subprocess.check_call(('git', 'init', '--quiet', '--bare', self.__gitDir))
+                subprocess.check_call(('git', 'remote', 'add', 'origin', self.__url), cwd=self.__gitDir)
+            logger.debug("Fetching {} into git mirror {}".format(self.__url, self.__gitDir))
+            subprocess.check_call(('git', 'fetch', '--quiet', '--prune', 'origin',
+                                   '+refs/heads/*:refs/remotes/origin/*'), cwd=self.__gitDir)
+
+    def listFiles(self, branch, path):
+        '''
+            Returns the names of the files and folders in the folder `path` of the
+            (fetched) branch `branch` without checking out the branch.
+        '''
+        out = subprocess.check_output(('git', 'ls-tree', '--name-only', 'origin/' + branch, path.rstrip("/") + "/"), cwd=self.__gitDir)
+        return [os.path.basename(line) for line in out.decode("utf-8").splitlines()]
+
+    def getHead(self, branch):
+        '''
+            Returns the commit id of the (fetched) branch `branch`.
+        '''
+        out = subprocess.check_output(('git', 'rev-parse', 'refs/remotes/origin/' + branch), cwd=self.__gitDir)
+        return out.decode("utf-8").strip()
+
+    def listRemoteRefs(self, *patterns):
+        '''
+            Returns a dict mapping the names of the refs in the remote repository that match
+            one of the `patterns` (see git ls-remote) to their commit ids. The refs are only
+            listed, not fetched, and all of them are listed by one request.
+        '''
+        out = subprocess.check_output(('git', 'ls-remote', '--refs', 'origin') + patterns, cwd=self.__gitDir)
+        res = dict()
+        for line in out.decode("utf-8").splitlines():
+            (commit, ref) = line.split("\t")
+            res[ref] = commit
+        return res
+
+    def createRemoteRef(self, ref, branch, message):
+        '''
+            Atomically creates the ref `ref` in the remote repository. The ref points
+            to a new commit with the commit message `message` on top of the head of
+            `branch`, so each created ref points to a unique object and only this tiny
+            commit object needs to be pushed. Returns False if `ref` already exists in
+            the remote repository. Other failures (e.g. network or authentication
+            errors or refs rejected by the server) raise a CalledProcessError.
+        '''
+        env = dict(os.environ)
+        user = getpass.getuser()
+        for role in ("AUTHOR", "COMMITTER"):
+            env.setdefault("GIT_{}_NAME".format(role), user)
+            env.setdefault("GIT_{}_EMAIL".format(role), "{}@{}".format(user, socket.getfqdn()))
+        head = 'refs/remotes/origin/' + branch
+        commit = subprocess.check_output(('git', 'commit-tree', head + '^{tree}', '-p', head, '-m', message),
+                                         cwd=self.__gitDir, env=env).decode("utf-8").strip()
+        cmd = ('git', 'push', '--porcelain', '--force-with-lease={}:'.format(ref), 'origin', '{}:{}'.format(commit, ref))
+        proc = subprocess.run(cmd, cwd=self.__gitDir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if proc.returncode == 0:
+            return True
+        out = proc.stdout.decode("utf-8", errors="replace")
+        for line in out.splitlines():
+            fields = line.split("\t")
+            # porcelain status line of our ref: "!\t<from>:<to>\t[rejected] (<reason>)"
+            if len(fields) >= 3 and fields[0] == "!" and fields[1].endswith(":" + ref) and \
+                    fields[2] in PUSH_REF_EXISTS_STATUS:
+                return False
+        logger.debug("Pushing {} failed: {}".format(ref, proc.stderr.decode("utf-8", errors="replace").strip()))
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=proc.stdout, stderr=proc.stderr)
+
+    def deleteRemoteRef(self, ref):
+        '''
+            Deletes the ref `ref` in the remote repository. Raises a CalledProcessError
+            if it couldn't be deleted.
+        '''
+        subprocess.check_call(('git', 'push', '--quiet', 'origin', ':' + ref), cwd=self.__gitDir)
+
+    def addWorktree(self, path, branch):
+        '''
+            Checks out the (fetched) branch `branch` of the remote repository as
+            detached HEAD into a new worktree `path`.
+        '''
+        with self.__locked():
+            subprocess.check_call(('git', 'worktree', 'prune'), cwd=self.__gitDir)
+            subprocess.check_call(('git', 'worktree', 'add', '--detach', path, 'origin/' + branch), cwd=self.__gitDir)
+
+    def removeWorktree(self, path):
+        '''
+            Removes the worktree `path` including all it's files.
+        '''
+        with self.__locked():
+            subprocess.check_call(('git', 'worktree', 'remove', '--force', path), cwd=self.__gitDir)
+
+    @contextmanager
+    def __locked(self):
+        os.makedirs(os.path.dirname(self.__gitDir), exist_ok=True)
+        with open(self.__lockFile, "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def reserveBundleId(mirror, distribution, branch, attempts=RESERVE_ATTEMPTS):
+    '''
+        Reserves the next free bundleID for `distribution` by creating the ref
+        refs/bundle-ids/<distribution>/<bundleID> in the remote repository of the
+        GitMirror `mirror`. The next free bundleID is the successor of the highest
+        bundleID found in repo/bundle/<distribution> of `branch` and in the currently
+        reserved bundleIDs. If somebody else reserved the same bundleID in the
+        meantime, the next one is tried. Returns the reserved bundleID as int.
+        A CalledProcessError is raised if the reservation ref couldn't be pushed for
+        other reasons than an already existing ref.
+
+        A reservation is released (see `releaseBundleId()`) once the bundle is pushed to
+        `branch`, so only bundleIDs that are not yet pushed are reserved by refs. The
+        reservation refs and the head of `branch` are listed by one request. If the head
+        differs from the one fetched to `mirror`, the mirror is updated first, so that a
+        bundleID whose reservation was released is always found in the fetched files.
+    '''
+    prefix = "{}{}/".format(BUNDLE_IDS_REFS, distribution)
+    head = "refs/heads/" + branch
+    for unused_attempt in range(attempts):
+        remote = mirror.listRemoteRefs(head, prefix + "*")
+        if remote.get(head) == mirror.getHead(branch):
+            break
+        logger.debug("Branch {} changed since the last fetch --> updating the git mirror".format(branch))
+        mirror.update()
+    else:
+        raise BundleError("Could not reserve a new bundleID for distribution '{}' as the branch {} changes constantly".format(distribution, branch))
+    highest = 0
+    for name in mirror.listFiles(branch, os.path.join("repo", "bundle", distribution)) + \
+            [ref[len(prefix):] for ref in remote.keys() if ref.startswith(prefix)]:
+        if name.isdigit():
+            highest = max(highest, int(name))
+    for number in range(highest + 1, highest + 1 + attempts):
+        # the random token keeps the reservation commit unique even for the same user at the same second
+        message = "Reserved bundleID {}/{} for {}@{} at {} ({})".format(
+            distribution, number, getpass.getuser(), socket.getfqdn(), time.strftime("%Y-%m-%d %H:%M:%S %z"), uuid.uuid4())
+        if mirror.createRemoteRef("{}{}".format(prefix, number), branch, message):
+            logger.info("Reserved bundleID {} for distribution '{}'".format(number, distribution))
+            return number
+        logger.debug("bundleID {} for distribution '{}' is already reserved".format(number, distribution))
+    raise BundleError("Could not reserve a new bundleID for distribution '{}' after {} attempts".format(distribution, attempts))
+
+
+def releaseBundleId(mirror, distribution, number):
+    '''
+        Releases the bundleID `number` of `distribution` reserved by `reserveBundleId()`
+        by deleting it's reservation ref. This must only be done after the bundle is pushed,
+        so that the bundleID is found in the pushed files instead.
+    '''
+    mirror.deleteRemoteRef("{}{}/{}".format(BUNDLE_IDS_REFS, distribution, number))
+    logger.debug("Released the reservation of bundleID {} for distribution '{}'".format(number, distribution))
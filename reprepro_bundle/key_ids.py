@@ -0,0 +1,168 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import subprocess
+from reprepro_bundle import getCacheDir
+from reprepro_bundle.openpgp_keyring import readPublicKeyIDs
+
+logger = logging.getLogger(__name__)
+
+KEY_IDS_CACHE_FILE = "keyids.json"
+
+
+def getPublicKeyIDs(gpgFile, cacheDir=None, useGpg=False):
+    '''
+        Returns the set of (long) key IDs of all primary keys and subkeys contained
+        in the keyring `gpgFile` (or an empty set if `gpgFile` is not set).
+        The IDs are cached in `cacheDir` (default: getCacheDir("keyids")), so the
+        keyring is only read for keyrings that were not seen before or have changed.
+
+        The keyring is read in-process by the openpgp_keyring reader (which needs
+        no writable GNUPGHOME). gpg is only called if the reader can't handle
+        the keyring or if `useGpg` is True.
+    '''
+    if not gpgFile:
+        return set()
+    cache = KeyIdCache(cacheDir or getCacheDir("keyids"))
+    ids = cache.get(gpgFile)
+    if ids is None:
+        ids = listPublicKeyIDs(gpgFile, useGpg)
+        try:
+            cache.put(gpgFile, ids)
+        except OSError as e:
+            logger.warning("Could not update the key-ID cache in {}: {}".format(cache.getCacheDir(), e))
+    return ids
+
+
+def listPublicKeyIDs(gpgFile, useGpg=False):
+    '''
+        Returns the set of key IDs contained in the keyring `gpgFile` without caching.
+    '''
+    if not useGpg:
+        try:
+            return readPublicKeyIDs(gpgFile)
+        except ValueError as e:
+            logger.debug("Falling back to gpg for reading keyring {}: {}".format(gpgFile, e))
+    return listPublicKeyIDsWithGpg(gpgFile)
+
+
+def listPublicKeyIDsWithGpg(gpgFile):
+    ids = set()
+    res = subprocess.check_output(["gpg", "--list-public-keys", "--keyring", gpgFile, "--no-default-keyring", "--no-options", "--with-colons"]).decode('utf-8')
+    for line in res.splitlines():
+        parts = line.split(':')
+        if len(parts) >= 5 and parts[0] in ["pub", "sub"]:
+            ids.add(parts[4])
+    return ids
+
+
+class KeyIdCache:
+    '''
+        A persistent cache for the key IDs contained in keyring files. The cache is
+        one json file in `cacheDir` with an entry per keyring path holding the size,
+        mtime and sha256 checksum of the keyring the IDs were listed for. An entry is
+        used without reading the keyring as long as size and mtime are unchanged,
+        otherwise the checksum decides. Keyrings with the same content at different
+        paths share their IDs. Loaded entries are also kept in memory for the
+        lifetime of the process.
+    '''
+    __memory = dict() # maps cacheFile -> path -> entry
+
+    def __init__(self, cacheDir):
+        self.__cacheDir = cacheDir
+        self.__cacheFile = os.path.join(cacheDir, KEY_IDS_CACHE_FILE)
+
+    def getCacheDir(self):
+        return self.__cacheDir
+
+    def get(self, gpgFile):
+        '''
+            Returns the cached set of key IDs for the keyring `gpgFile` or None.
+        '''
+        path = os.path.abspath(gpgFile)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        entry = self.__memory.get(self.__cacheFile, dict()).get(path)
+        if self.__isUnchanged(entry, st):
+            return set(entry['ids'])
+        entries = self.__load()
+        entry = entries.get(path)
+        if self.__isUnchanged(entry, st):
+            return set(entry['ids'])
+        checksum = self.__checksum(path)
+        for other in list(entries.values()):
+            if other.get('sha256') == checksum:
+                ids = set(other['ids'])
+                try:
+                    self.put(gpgFile, ids, checksum)
+                except OSError as e:
+                    logger.debug("Could not update the key-ID cache {}: {}".format(self.__cacheFile, e))
+                return ids
+        return None
+
+    def put(self, gpgFile, ids, checksum=None):
+        '''
+            Stores the set of key IDs `ids` for the current state of the keyring `gpgFile`.
+        '''
+        path = os.path.abspath(gpgFile)
+        st = os.stat(path)
+        entries = self.__load()
+        entries[path] = {
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns,
+            'sha256': checksum or self.__checksum(path),
+            'ids': sorted(ids)
+        }
+        os.makedirs(self.__cacheDir, exist_ok=True)
+        fd, tmpFile = tempfile.mkstemp(dir=self.__cacheDir)
+        try:
+            with os.fdopen(fd, "w") as out:
+                json.dump(entries, out, indent=1, sort_keys=True)
+            os.replace(tmpFile, self.__cacheFile)
+        except Exception:
+            os.remove(tmpFile)
+            raise
+        self.__memory[self.__cacheFile] = entries
+
+    def __load(self):
+        try:
+            with open(self.__cacheFile, "r") as fh:
+                entries = json.load(fh)
+        except (OSError, ValueError) as e:
+            logger.debug("No usable key-ID cache {}: {}".format(self.__cacheFile, e))
+            entries = dict()
+        self.__memory[self.__cacheFile] = entries
+        return entries
+
+    def __isUnchanged(self, entry, st):
+        return entry is not None and entry.get('size') == st.st_size and entry.get('mtime') == st.st_mtime_ns
+
+    def __checksum(self, filename):
+        sha = hashlib.sha256()
+        with open(filename, "rb") as fh:
+            for chunk in iter(lambda: fh.read(65536), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
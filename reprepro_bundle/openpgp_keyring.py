@@ -0,0 +1,155 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+'''
+    A minimal reader for OpenPGP keyrings (binary or ascii armored, RFC 4880 / RFC 9580)
+    that extracts the long key IDs of all primary keys and subkeys - the same IDs that
+    `gpg --list-public-keys --with-colons` prints in the 5th field of "pub" and "sub" lines.
+'''
+import base64
+import hashlib
+
+TAG_PUBLIC_KEY = 6
+TAG_PUBLIC_SUBKEY = 14
+
+ARMOR_BEGIN = "-----BEGIN PGP PUBLIC KEY BLOCK-----"
+ARMOR_END = "-----END PGP PUBLIC KEY BLOCK-----"
+
+
+def readPublicKeyIDs(keyringFile):
+    '''
+        Returns the set of long key IDs (16 uppercase hex digits) of all primary keys and
+        subkeys contained in `keyringFile`. Raises a ValueError if the file is not an
+        OpenPGP keyring this reader understands (e.g. a gpg keybox).
+    '''
+    with open(keyringFile, "rb") as fh:
+        data = fh.read()
+    if ARMOR_BEGIN.encode('ascii') in data:
+        blocks = dearmor(data.decode('ascii', errors='replace'))
+    else:
+        blocks = [data]
+    ids = set()
+    for block in blocks:
+        for (tag, body) in iterPackets(block):
+            if tag in (TAG_PUBLIC_KEY, TAG_PUBLIC_SUBKEY):
+                ids.add(getKeyID(body))
+    return ids
+
+
+def dearmor(text):
+    '''
+        Returns the list of binary blocks contained in the ascii armored `text`.
+    '''
+    blocks = list()
+    lines = iter(text.splitlines())
+    for line in lines:
+        if line.strip() != ARMOR_BEGIN:
+            continue
+        # skip armor headers up to the first empty line
+        for line in lines:
+            if not line.strip():
+                break
+        b64 = list()
+        for line in lines:
+            line = line.strip()
+            if line == ARMOR_END:
+                break
+            if not line.startswith("="): # ignore the checksum line
+                b64.append(line)
+        else:
+            raise ValueError("missing '{}'".format(ARMOR_END))
+        blocks.append(base64.b64decode("".join(b64), validate=True))
+    return blocks
+
+
+def iterPackets(data):
+    '''
+        Yields tuples (tag, body) for all packets in the binary OpenPGP data `data`.
+    '''
+    pos = 0
+    while pos < len(data):
+        octet = data[pos]
+        pos += 1
+        if not octet & 0x80:
+            raise ValueError("invalid packet header at offset {}".format(pos - 1))
+        if octet & 0x40: # new format
+            tag = octet & 0x3f
+            body = bytearray()
+            while True:
+                (length, pos, partial) = _newFormatLength(data, pos)
+                body += data[pos:pos + length]
+                pos += length
+                if not partial:
+                    break
+            body = bytes(body)
+        else: # old format
+            tag = (octet >> 2) & 0x0f
+            lengthType = octet & 0x03
+            if lengthType == 3:
+                length = len(data) - pos
+            else:
+                size = (1, 2, 4)[lengthType]
+                length = int.from_bytes(data[pos:pos + size], 'big')
+                pos += size
+            body = data[pos:pos + length]
+            pos += length
+        if pos > len(data):
+            raise ValueError("truncated packet with tag {}".format(tag))
+        yield (tag, body)
+
+
+def getKeyID(body):
+    '''
+        Returns the long key ID for the body of a public key or public subkey packet.
+    '''
+    if not body:
+        raise ValueError("empty key packet")
+    version = body[0]
+    if version == 4:
+        fingerprint = hashlib.sha1(b"\x99" + len(body).to_bytes(2, 'big') + body).digest()
+        return fingerprint[-8:].hex().upper()
+    elif version in (5, 6):
+        prefix = b"\x9a" if version == 5 else b"\x9b"
+        fingerprint = hashlib.sha256(prefix + len(body).to_bytes(4, 'big') + body).digest()
+        return fingerprint[:8].hex().upper()
+    elif version in (2, 3):
+        # the key ID is the low 64 bits of the RSA modulus: version(1), created(4),
+        # validity(2), algorithm(1) followed by the MPI of the modulus
+        bits = int.from_bytes(body[8:10], 'big')
+        modulus = body[10:10 + (bits + 7) // 8]
+        if len(modulus) < 8:
+            raise ValueError("invalid v{} key packet".format(version))
+        return modulus[-8:].hex().upper()
+    raise ValueError("unsupported key packet version {}".format(version))
+
+
+def _newFormatLength(data, pos):
+    '''
+        Returns the tuple (length, pos, partial) for the new format length starting at `pos`.
+    '''
+    if pos >= len(data):
+        raise ValueError("truncated packet length at offset {}".format(pos))
+    o1 = data[pos]
+    if o1 < 192:
+        return (o1, pos + 1, False)
+    elif o1 < 224:
+        return (((o1 - 192) << 8) + data[pos + 1] + 192, pos + 2, False)
+    elif o1 == 255:
+        return (int.from_bytes(data[pos + 1:pos + 5], 'big'), pos + 5, False)
+    return (1 << (o1 & 0x1f), pos + 1, True)
@@ -18,11 +18,12 @@
 # https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
 ##########################################################################
 import logging
-import apt_pkg
 import re
+import sys
 import reprepro_bundle
 from reprepro_bundle.package_status import PackageStatus
 from reprepro_bundle.package_existence import PackageExistence
+from reprepro_bundle.version_key import versionKey
 
 logger = logging.getLogger(__name__)
 
@@ -32,16 +33,39 @@ class Package:
         are identified by their source package name and their status.
         This class provides methods for reading and writing single lines
         of the sources_control.list generated by the class Bundle.
+
+        Packages are created in large numbers (one per source and suite), so
+        they use __slots__, intern their strings and precompute the identity
+        key used for hashing and the key used for sorting at construction. Only
+        `status` and `active` may change later; `status` is therefore not part of
+        the hash and is compared separately when sorting.
     '''
+    __slots__ = ('sourceName', 'version', 'suiteName', 'section', 'component', 'existanceType',
+                 'active', '_status', '_statusRank', '_key', '_hash', '_sortKey')
+
     def __init__(self, sourceName, version, suiteName, section, component, existanceType, status=PackageStatus.UNKNOWN):
-        self.sourceName = sourceName
-        self.version = version
-        self.suiteName = suiteName
-        self.section = section
-        self.component = component
+        self.sourceName = _intern(sourceName)
+        self.version = _intern(version)
+        self.suiteName = _intern(suiteName)
+        self.section = _intern(section)
+        self.component = _intern(component)
         self.existanceType = existanceType
         self.status = status
         self.active = False
+        # pylint: disable=E1136
+        self._key = (self.sourceName, self.version, self.suiteName, self.section, existanceType.value[0])
+        self._hash = hash(self._key)
+        self._sortKey = (self.sourceName, versionKey(self.version), self.suiteName, self.section, existanceType.value[0])
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, status):
+        # pylint: disable=E1136
+        self._status = status
+        self._statusRank = status.value[0]
 
     def __str__(self):
         return "Package('{}', '{}', '{}', '{}', {}, {})".format(self.sourceName, self.version, self.suiteName, self.section, self.existanceType, self.status)
@@ -69,10 +93,10 @@ class Package:
         return "{:19} {:8} OF {} {} {} {} {}".format(comment + action, str(self.existanceType), self.sourceName, self.version, prep, str(self.suiteName), self.section)
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
     def __eq__(self, other):
-        return other and self.status == other.status and self.sourceName == other.sourceName and self.version == other.version and self.suiteName == other.suiteName and self.section == other.section and self.existanceType == other.existanceType
+        return isinstance(other, Package) and self._statusRank == other._statusRank and self._key == other._key
 
     def __ne__(self, other):
         return not(self == other)
@@ -80,22 +104,23 @@ class Package:
     def __lt__(self, other):
         if not other:
             return False
-        if self.status != other.status:
-            return self.status < other.status
-        elif self.sourceName != other.sourceName:
-            return self.sourceName < other.sourceName
-        elif self.version != other.version:
-            return apt_pkg.version_compare(self.version, other.version) < 0
-        elif self.suiteName != other.suiteName:
-            return self.suiteName < other.suiteName
-        elif self.section != other.section:
-            return self.section < other.section
-        elif self.existanceType != other.existanceType:
-            return self.existanceType < other.existanceType
-        return False
+        if self._statusRank != other._statusRank:
+            return self._statusRank < other._statusRank
+        return self._sortKey < other._sortKey
+
+    def sortKey(self):
+        '''
+            Returns the key that orders packages by status, source name, version (see
+            `version_key.versionKey()`), suite name, section and existance type.
+        '''
+        return (self._statusRank, self._sortKey)
 
     @staticmethod
-    def getByQueryResults(source, binaries):
+    def getByScanResults(source, binaries):
+        '''
+            creates a Package from the rows (sourceName, version, suiteName, section, component)
+            found for one source in the sources resp. binaries of a suite (see suite_scan.scanSuites).
+        '''
         peType = PackageExistence.MISSING
         res = None
         if source and binaries:
@@ -105,8 +130,8 @@ class Package:
         elif not source and binaries:
             (peType, res) = (PackageExistence.BIN, binaries)
         if res:
-            (sourceName, version, suite, section, component) = res.getData()
-            return Package(sourceName, version, suite.getSuiteName(), section, component, peType)
+            (sourceName, version, suiteName, section, component) = res
+            return Package(sourceName, version, suiteName, section, component, peType)
         return None
 
     @staticmethod
@@ -119,3 +144,15 @@ class Package:
         peType = PackageExistence.getByStr(what)
         status = PackageStatus.getByAction(action)
         return Package(sourceName, version, suite, section, "unknown", peType, status)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def sortPackages(packages):
+    '''
+        Returns the list of `packages` in the same order as sorted(`packages`), but sorted
+        by `Package.sortKey()` instead of pairwise calls of `Package.__lt__()`.
+    '''
+    return sorted(packages, key=Package.sortKey)
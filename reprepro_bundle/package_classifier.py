@@ -0,0 +1,135 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import logging
+from reprepro_bundle.package_status import PackageStatus
+from reprepro_bundle.package import Package, sortPackages
+
+logger = logging.getLogger(__name__)
+
+
+class PackageClassifier:
+    '''
+        This class assigns the PackageStatus and the active flag to the packages of a
+        sources_control.list. The roles of the involved suites (the bundle's own suite,
+        reference suites, addFrom- and upgradeFrom-suites) are given as lists of
+        apt_repos.RepoSuite objects and are precomputed once as sets of suite names,
+        so classifying a source doesn't depend on the number of suites of a role.
+    '''
+    def __init__(self, ownSuiteName, refSuites=None, addFrom=None, upgradeFrom=None, upgradeKeepComponent=None):
+        self.ownSuiteName = ownSuiteName
+        self.refSuiteNames = self.__getSuiteNames(refSuites)
+        self.addFromNames = self.__getSuiteNames(addFrom)
+        self.upgradeFromNames = self.__getSuiteNames(upgradeFrom)
+        self.upgradeKeepComponent = upgradeKeepComponent
+
+    def classifyAll(self, scanned, prevSourcesDict):
+        '''
+            Builds the table of packages (grouped by source name) from `scanned`, the result
+            of suite_scan.scanSuites(), in one pass over all suites and classifies all sources.
+            `prevSourcesDict` maps source names to the packages that were active in the
+            previous sources_control.list (see Bundle.parseSourcesControlList()).
+
+            Returns a dict mapping each source name to a set of classified packages.
+        '''
+        sourcesDict = dict()
+        for unused_suiteName, (sources, binaries) in sorted(scanned.items()):
+            for source in sources.keys() | binaries.keys():
+                package = Package.getByScanResults(sources.get(source), binaries.get(source))
+                packages = sourcesDict.get(source)
+                if packages is None:
+                    packages = set()
+                    sourcesDict[source] = packages
+                packages.add(package)
+        for source, packages in sourcesDict.items():
+            self.classify(packages, prevSourcesDict.get(source, set()))
+        return sourcesDict
+
+    def classify(self, packages, mergePackages):
+        '''
+            Updates the PackageStatus of (all equally named) `packages` in relation to
+            the current reference package and marks one of them active (see `markActive()`).
+        '''
+        ordered = sortPackages(packages)
+        current = self.getCurrentReferencePackage(ordered)
+        for package in ordered:
+            package.updateStatus(current)
+            if package.status == PackageStatus.IS_CURRENT and package.suiteName == self.ownSuiteName:
+                package.status = PackageStatus.SHOULD_BE_KEPT
+        # the status is the first sort criterion, so the packages are sorted again
+        self.markActive(sortPackages(ordered), mergePackages)
+
+    def getCurrentReferencePackage(self, packages):
+        '''
+            returns the one package from the sorted list of (all equally named!) `packages` that
+            is the `current` package from the view of this bundle. The `current` package
+            is either the package found in Own-Suite (if so) or the package with
+            the highest version found in any of the reference suites. This method
+            returns None if the package is not contained in Own-Suite or reference suites.
+        '''
+        latest = None
+        for package in packages:
+            if package.suiteName == self.ownSuiteName:
+                return package
+            elif package.suiteName in self.refSuiteNames:
+                latest = package
+        return latest
+
+    def markActive(self, packages, mergePackages):
+        '''
+            This method has some kind of precedence mechanism to ensure that only one
+            package from a list of (equally named) `packages` is marked active. The
+            `packages` are expected in the order of `sortPackages()` according to their
+            current status, so the current package (which determines the component kept
+            by upgradeKeepComponent) is seen first. Of several packages with the same
+            precedence, the first one is marked active.
+
+            In this context the lowest priority is given to all packages that are currently
+            available (from scanning refSuites and ownSuite).
+
+            medium priority to `mergePackages` which contains the packages that were active
+            in a previous version of the sources_control.list and thus should set active
+            (merged) into the new list.
+
+            `addFrom`- and `upgradeFrom`-suites describe suites whose new / upgradable
+            packages should always be marked as active (with highest precidence), except
+            upgradeKeepComponent is True and an upgrade would change the component.
+        '''
+        markedForActivation = (None, 0) # tuple of (package, precedence)
+        currentComponent = None
+        for package in packages:
+            (_, precedence) = markedForActivation
+            if   precedence < 1 and (package.status == PackageStatus.IS_CURRENT or package.status == PackageStatus.SHOULD_BE_KEPT):
+                markedForActivation = (package, 1)
+                currentComponent = package.component
+            elif precedence < 2 and package in mergePackages:
+                markedForActivation = (package, 2)
+            elif precedence < 3 and package.status == PackageStatus.IS_MISSING and package.suiteName in self.addFromNames:
+                markedForActivation = (package, 3)
+            elif precedence < 4 and package.status == PackageStatus.IS_UPGRADE and package.suiteName in self.upgradeFromNames:
+                if self.upgradeKeepComponent and currentComponent and currentComponent != package.component:
+                    logger.warn("Skipping upgradable {} {} which would change the physical component from '{}' to '{}'".format(package.sourceName, package.version, currentComponent, package.component))
+                else:
+                    markedForActivation = (package, 4)
+        (markedForActivation, _) = markedForActivation
+        if markedForActivation:
+            markedForActivation.active = True
+
+    def __getSuiteNames(self, suites):
+        return frozenset(s.getSuiteName() for s in suites) if suites else frozenset()
@@ -0,0 +1,67 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import apt_repos
+from apt_repos import PackageField
+
+# the columns of `apt-repos ls -col CpvaSs` as tuples (field, header)
+PACKAGE_LIST_COLUMNS = [
+    ('C', 'Source'),
+    ('p', 'Package'),
+    ('v', 'Version'),
+    ('a', 'Arch'),
+    ('S', 'Section'),
+    ('s', 'Suite')
+]
+
+
+def getPackageList(suite, update=True):
+    '''
+        Returns the list of all binary packages of the apt_repos.RepoSuite `suite` as
+        table in the format of `apt-repos ls -s <suite> -col CpvaSs -r .`, but without
+        starting apt-repos in a subprocess. If `update` is True, the suite's apt cache
+        is updated before.
+    '''
+    fields = "".join([field for (field, unused_header) in PACKAGE_LIST_COLUMNS])
+    table = None
+    with apt_repos.suppress_unwanted_apt_pkg_messages() as forked:
+        if forked:
+            suite.scan(update)
+            res = suite.queryPackages('.', True, None, None, PackageField.getByFieldsString(fields))
+            table = formatTable([header for (unused_field, header) in PACKAGE_LIST_COLUMNS],
+                                [[str(value) for value in row.getData()] for row in sorted(res)])
+    return table
+
+
+def formatTable(headers, rows):
+    '''
+        Formats the list of `rows` (each a list of strings) as table with the column
+        `headers`. The columns are padded to their widest value and separated by " | "
+        and the header is underlined with "=". The result ends with a newline.
+    '''
+    widths = [len(header) for header in headers]
+    for row in rows:
+        widths = [max(width, len(value)) for (width, value) in zip(widths, row)]
+    lines = [
+        " | ".join([header.ljust(width) for (header, width) in zip(headers, widths)]),
+        " | ".join(["=" * width for width in widths])
+    ]
+    for row in rows:
+        lines.append(" | ".join([value.ljust(width) for (value, width) in zip(row, widths)]))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,248 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import re
+import mmap
+import hashlib
+import logging
+import tempfile
+import apt_pkg
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RBQC3\n"
+NONE = "\x00"
+NO_CHECKSUM = "-"
+
+
+class QueryCache:
+    '''
+        A persistent cache for the rows (sourceName, version, suiteName, section, component)
+        that are queried from a suite's sources and binaries (see suite_scan.scanSuites).
+
+        For each suite one file is stored in `cacheDir`. It starts with a header holding the
+        sha256 checksum, size and mtime of the suite's Release (or InRelease) file the rows
+        were queried for and the checksum of the suite's configuration (see `getSuiteConfig()`)
+        and a line with the path of the Release file, followed by one tab separated line per
+        row, ordered by the source name. As long as
+        size and mtime of the Release file and the suite's configuration are unchanged, loading
+        a suite costs one stat and one sequential read. If size or mtime changed, the checksum
+        decides whether the cached rows can still be used.
+    '''
+    def __init__(self, cacheDir):
+        self.__cacheDir = cacheDir
+
+    def getCacheDir(self):
+        return self.__cacheDir
+
+    def load(self, suiteName, releaseFile, suiteConfig):
+        '''
+            Returns the tuple (sources, binaries) of dicts mapping a source name to it's row
+            if there is a cache entry for `suiteName` matching the `releaseFile` and the
+            `suiteConfig`, otherwise None.
+        '''
+        cacheFile = self.__getCacheFile(suiteName)
+        try:
+            with open(cacheFile, "rb") as fh:
+                header = self.__checkHeader(fh, releaseFile, suiteConfig)
+                if not header:
+                    return None
+                (numSources, numBinaries) = header
+                try:
+                    res = (self.__toMap(self.__iterRows(fh, numSources, suiteName)),
+                           self.__toMap(self.__iterRows(fh, numBinaries, suiteName)))
+                    if fh.read(1):
+                        raise ValueError("unexpected data after the last row")
+                except ValueError as e:
+                    logger.warning("Ignoring corrupt query cache file {}: {}".format(cacheFile, e))
+                    return None
+        except (OSError, ValueError) as e:
+            logger.debug("No usable query cache for suite {}: {}".format(suiteName, e))
+            return None
+        return res
+
+    def isValid(self, suiteName, releaseFile, suiteConfig):
+        '''
+            Returns True if there is a cache entry for `suiteName` matching the `releaseFile`
+            and the `suiteConfig`. Only the header of the cache entry is read.
+        '''
+        try:
+            with open(self.__getCacheFile(suiteName), "rb") as fh:
+                return self.__checkHeader(fh, releaseFile, suiteConfig) is not None
+        except (OSError, ValueError):
+            return False
+
+    def getReleaseFile(self, suiteName):
+        '''
+            Returns the path of the Release file the cache entry for `suiteName` was stored
+            for or None. Unless apt updates the suite, this is still the suite's current
+            Release file, so the cache entry can be checked without scanning the suite.
+        '''
+        try:
+            with open(self.__getCacheFile(suiteName), "rb") as fh:
+                return self.__readHeader(fh)[4]
+        except (OSError, ValueError):
+            return None
+
+    def iterRows(self, suiteName):
+        '''
+            Iterates over the cache entry for `suiteName` without loading it into memory. It yields
+            tuples (sourceName, sourceRow, binaryRow) ordered by sourceName, where either sourceRow
+            or binaryRow may be None if the source has no source resp. binary packages in the suite.
+            The validity of the cache entry is not checked (see `isValid()`).
+
+            The file is opened once and sources and binaries are read from two maps of it, so
+            both always belong to the same version of the entry (entries are replaced, not
+            rewritten in place, see `store()`).
+        '''
+        with open(self.__getCacheFile(suiteName), "rb") as fh, \
+             mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as srcIn, \
+             mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as binIn:
+            (_, _, _, _, _, numSources, numBinaries) = self.__readHeader(srcIn)
+            binIn.seek(srcIn.tell())
+            for _ in range(numSources):
+                binIn.readline()
+            sources = self.__iterRows(srcIn, numSources, suiteName)
+            binaries = self.__iterRows(binIn, numBinaries, suiteName)
+            src = next(sources, None)
+            bin = next(binaries, None)
+            while src or bin:
+                if bin is None or (src is not None and src[0] < bin[0]):
+                    yield (src[0], src, None)
+                    src = next(sources, None)
+                elif src is None or bin[0] < src[0]:
+                    yield (bin[0], None, bin)
+                    bin = next(binaries, None)
+                else:
+                    yield (src[0], src, bin)
+                    src = next(sources, None)
+                    bin = next(binaries, None)
+
+    def store(self, suiteName, releaseFile, suiteConfig, sources, binaries):
+        '''
+            Stores the dicts `sources` and `binaries` (mapping a source name to it's row)
+            for `suiteName`, the current state of `releaseFile` and the `suiteConfig`. If
+            `releaseFile` is None, the entry can only be read by `iterRows()` and is never
+            valid for `load()`.
+        '''
+        os.makedirs(self.__cacheDir, exist_ok=True)
+        if releaseFile:
+            st = os.stat(releaseFile)
+            (checksum, size, mtime) = (self.__checksum(releaseFile), st.st_size, st.st_mtime_ns)
+        else:
+            (checksum, size, mtime) = (NO_CHECKSUM, 0, 0)
+        fd, tmpFile = tempfile.mkstemp(dir=self.__cacheDir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as out:
+                out.write(MAGIC.decode('utf-8'))
+                out.write("{} {} {} {} {} {}\n".format(checksum, size, mtime, suiteConfig, len(sources), len(binaries)))
+                out.write((releaseFile or "") + "\n")
+                for rows in (sources, binaries):
+                    for _, (sourceName, version, _, section, component) in sorted(rows.items()):
+                        out.write("\t".join([self.__encode(v) for v in (sourceName, version, section, component)]) + "\n")
+            os.replace(tmpFile, self.__getCacheFile(suiteName))
+        except Exception:
+            os.remove(tmpFile)
+            raise
+
+    def __readHeader(self, fh):
+        if fh.readline() != MAGIC:
+            raise ValueError("unknown cache file format")
+        (checksum, size, mtime, suiteConfig, numSources, numBinaries) = fh.readline().decode('utf-8').split()
+        line = fh.readline()
+        if not line.endswith(b"\n"):
+            raise ValueError("unexpected end of file")
+        releaseFile = line.decode('utf-8')[:-1] or None
+        return (checksum, int(size), int(mtime), suiteConfig, releaseFile, int(numSources), int(numBinaries))
+
+    def __checkHeader(self, fh, releaseFile, suiteConfig):
+        '''
+            Reads the header of the cache entry `fh` and returns the tuple (numSources, numBinaries)
+            if it describes a cache entry matching `releaseFile` and `suiteConfig`, otherwise None.
+        '''
+        (checksum, size, mtime, cachedConfig, _, numSources, numBinaries) = self.__readHeader(fh)
+        if not releaseFile or checksum == NO_CHECKSUM or cachedConfig != suiteConfig:
+            return None
+        st = os.stat(releaseFile)
+        if size != st.st_size or mtime != st.st_mtime_ns:
+            if checksum != self.__checksum(releaseFile):
+                return None
+            logger.debug("Release file {} was touched but didn't change".format(releaseFile))
+        return (numSources, numBinaries)
+
+    def __getCacheFile(self, suiteName):
+        return os.path.join(self.__cacheDir, re.sub("[^a-zA-Z0-9.-]", "_", suiteName))
+
+    def __checksum(self, filename):
+        sha = hashlib.sha256()
+        with open(filename, "rb") as fh:
+            for chunk in iter(lambda: fh.read(65536), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def __encode(self, value):
+        return NONE if value is None else str(value)
+
+    def __toRow(self, line, suiteName):
+        (sourceName, version, section, component) = [None if v == NONE else v for v in line.split("\t")]
+        return (sourceName, version, suiteName, section, component)
+
+    def __toMap(self, rows):
+        res = dict()
+        for row in rows:
+            res[row[0]] = row
+        return res
+
+    def __iterRows(self, fh, count, suiteName):
+        for _ in range(count):
+            line = fh.readline()
+            if not line.endswith(b"\n"):
+                raise ValueError("unexpected end of file")
+            yield self.__toRow(line.decode('utf-8')[:-1], suiteName)
+
+def getReleaseFile(suite):
+    '''
+        Returns the path to the local copy of the InRelease or Release file of the
+        apt_repos.RepoSuite `suite` or None, if it could not be found. This function
+        uses the current apt_pkg configuration and therefore has to be called right
+        after `suite.scan()`.
+    '''
+    try:
+        listsDir = apt_pkg.config.find_dir("Dir::State::lists")
+        distsUrl = suite.getDistsUrl().rstrip("/") + "/"
+        for name in ("InRelease", "Release"):
+            releaseFile = os.path.join(listsDir, apt_pkg.uri_to_filename(distsUrl + name))
+            if os.path.isfile(releaseFile):
+                return releaseFile
+    except Exception as e:
+        logger.debug("Could not determine the Release file of suite {}: {}".format(suite, e))
+    return None
+
+
+def getSuiteConfig(suite):
+    '''
+        Returns a checksum of the configuration of the apt_repos.RepoSuite `suite` that
+        determines the queried rows besides the Release file (the repository url, the
+        apt suite, the components and the architectures). Cache entries stored for a
+        different configuration of the suite are not used.
+    '''
+    config = "\n".join([str(suite.getRepoUrl()), str(suite.getAptSuite()),
+                        " ".join(sorted(suite.getComponents())), " ".join(sorted(suite.getArchitectures()))])
+    return hashlib.sha256(config.encode('utf-8')).hexdigest()
@@ -0,0 +1,115 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import hashlib
+import logging
+import urllib.request
+import urllib.error
+
+logger = logging.getLogger(__name__)
+
+FETCH_TIMEOUT = 30
+WAIT_MIN_DELAY = 2
+WAIT_MAX_DELAY = 60
+
+
+class ReleaseWatcher:
+    '''
+        Watches the Release file of an apt repository suite (given by it's dists url) for
+        changes. Each check is a conditional GET (If-None-Match / If-Modified-Since), so
+        an unchanged Release file is not transferred again, and a change is only reported
+        if the checksum of the Release file really changed.
+
+        The delay to wait before the next check starts at `minDelay` seconds and is
+        doubled after each check without change up to `maxDelay` seconds (by default
+        WAIT_MIN_DELAY and WAIT_MAX_DELAY).
+    '''
+    def __init__(self, distsUrl, minDelay=WAIT_MIN_DELAY, maxDelay=WAIT_MAX_DELAY):
+        self.__urls = [distsUrl.rstrip("/") + "/" + name for name in ("InRelease", "Release")]
+        self.__minDelay = minDelay
+        self.__maxDelay = maxDelay
+        self.__delay = minDelay
+        self.__url = None
+        self.__etag = None
+        self.__lastModified = None
+        self.__checksum = None
+
+    def hasChanged(self):
+        '''
+            Checks the Release file and returns True if it's checksum changed since the last
+            check. The first successful check always returns True. A Release file that can't
+            be read is treated as unchanged, so an unreachable repository is not queried
+            again and again, and the delay is increased as well.
+        '''
+        try:
+            data = self.__fetch()
+        except (OSError, ValueError) as e:
+            logger.debug("Could not check the Release file, assuming it is unchanged: {}".format(e))
+            self.__increaseDelay()
+            return False
+        if data is None: # not modified
+            self.__increaseDelay()
+            return False
+        checksum = hashlib.sha256(data).hexdigest()
+        if checksum == self.__checksum:
+            self.__increaseDelay()
+            return False
+        self.__checksum = checksum
+        self.__resetDelay()
+        return True
+
+    def getDelay(self):
+        '''
+            Returns the number of seconds to wait before the next check.
+        '''
+        return self.__delay
+
+    def __fetch(self):
+        '''
+            Returns the content of the Release file or None if it is not modified.
+        '''
+        error = None
+        for url in ([self.__url] if self.__url else self.__urls):
+            req = urllib.request.Request(url)
+            if self.__etag:
+                req.add_header('If-None-Match', self.__etag)
+            if self.__lastModified:
+                req.add_header('If-Modified-Since', self.__lastModified)
+            try:
+                with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT) as response:
+                    self.__url = url
+                    self.__etag = response.headers.get('ETag')
+                    self.__lastModified = response.headers.get('Last-Modified')
+                    return response.read()
+            except urllib.error.HTTPError as e:
+                if e.code == 304 and self.__url:
+                    return None
+                error = e
+            except urllib.error.URLError as e:
+                error = e
+        self.__url = None
+        self.__etag = None
+        self.__lastModified = None
+        raise error
+
+    def __increaseDelay(self):
+        self.__delay = min(self.__delay * 2, self.__maxDelay)
+
+    def __resetDelay(self):
+        self.__delay = self.__minDelay
@@ -0,0 +1,178 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import logging
+import concurrent.futures
+import apt_repos
+from apt_repos import PackageField
+from reprepro_bundle import BundleError
+from reprepro_bundle.query_cache import QueryCache, getReleaseFile, getSuiteConfig
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCAN_JOBS = 4
+SCAN_FIELDS = 'CvsSy'
+
+
+def scanSuites(suites, update, jobs=DEFAULT_SCAN_JOBS, cacheDir=None):
+    '''
+        Scans the apt_repos.RepoSuite objects `suites` (performing an apt update
+        before if `update` is True) and queries their sources and binaries.
+
+        The suites are independent of each other, so up to `jobs` suites are
+        scanned concurrently in separate processes. A ProcessPoolExecutor is
+        required (instead of a ThreadPoolExecutor) because apt-repo's suite.scan()
+        uses the global apt_pkg configuration. Workers are forked and therefore
+        inherit the current apt-repos base directory.
+
+        The result is a dict that maps each suiteName to a tuple (sources, binaries)
+        where both elements map a source name to a row
+        (sourceName, version, suiteName, section, component). The result is
+        independent of `jobs` and of the order in which the workers finish.
+
+        If `cacheDir` is set, the rows are cached there per suite (see QueryCache)
+        and a suite is only queried again if it's Release file changed. Without
+        `update`, the Release file can't change, so the cache is checked before and
+        a suite is only scanned if it's cache entry is missing or outdated.
+    '''
+    return _forEachSuite(suites, update, jobs, _querySuite, cacheDir)
+
+
+def spoolSuites(suites, update, cacheDir, jobs=DEFAULT_SCAN_JOBS):
+    '''
+        Like scanSuites, but the rows are not returned to the caller. Instead it is
+        ensured that `cacheDir` contains an entry for each suite, so that the rows
+        can be streamed ordered by source name using the returned QueryCache's
+        iterRows(). Only the (worker) process scanning a suite holds it's rows in
+        memory and only until they are stored.
+    '''
+    _forEachSuite(suites, update, jobs, _spoolSuite, cacheDir)
+    return QueryCache(cacheDir)
+
+
+def _forEachSuite(suites, update, jobs, func, cacheDir):
+    suiteNames = [s.getSuiteName() for s in sorted(suites)]
+    action = ("Updating and " if update else "") + "Querying"
+    res = dict()
+    if jobs is None or jobs <= 1 or len(suiteNames) <= 1:
+        for suite in sorted(suites):
+            logger.info("{} suite {}".format(action, suite))
+            res[suite.getSuiteName()] = func(suite, update, cacheDir)
+        return res
+    logger.info("{} {} suites using {} parallel jobs".format(action, len(suiteNames), jobs))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as ppe:
+        futures = dict()
+        for suiteName in suiteNames:
+            futures[suiteName] = ppe.submit(_scanSuite, func, suiteName, update, cacheDir)
+        for suiteName in suiteNames:
+            res[suiteName] = futures[suiteName].result()
+    return res
+
+
+def _scanSuite(func, suiteName, update, cacheDir=None):
+    '''
+        Worker entry point for _forEachSuite: resolves the suite by it's unique
+        suiteName (RepoSuite objects are not passed between processes) and
+        returns the result of `func` for this suite.
+    '''
+    suites = sorted(apt_repos.getSuites([suiteName]))
+    if len(suites) != 1:
+        raise BundleError("Can't scan suite '{}' since it doesn't select exactly one suite.".format(suiteName))
+    logger.info("{} suite {}".format(("Updating and " if update else "") + "Querying", suites[0]))
+    return func(suites[0], update, cacheDir)
+
+
+def _querySuite(suite, update, cacheDir=None):
+    cache = QueryCache(cacheDir) if cacheDir else None
+    suiteConfig = getSuiteConfig(suite)
+    checked = _getUnscannedReleaseFile(suite, update, cache)
+    if checked:
+        res = cache.load(suite.getSuiteName(), checked, suiteConfig)
+        if res:
+            logger.debug("Using cached query results for suite {} without scanning it".format(suite))
+            return res
+    suite.scan(update)
+    releaseFile = getReleaseFile(suite) if cache else None
+    if releaseFile and releaseFile != checked:
+        res = cache.load(suite.getSuiteName(), releaseFile, suiteConfig)
+        if res:
+            logger.debug("Using cached query results for suite {}".format(suite))
+            return res
+    (sources, binaries) = _queryRows(suite)
+    if releaseFile:
+        try:
+            cache.store(suite.getSuiteName(), releaseFile, suiteConfig, sources, binaries)
+        except OSError as e:
+            logger.warning("Could not update the query cache for suite {}: {}".format(suite, e))
+    return (sources, binaries)
+
+
+def _spoolSuite(suite, update, cacheDir):
+    cache = QueryCache(cacheDir)
+    suiteConfig = getSuiteConfig(suite)
+    checked = _getUnscannedReleaseFile(suite, update, cache)
+    if checked and cache.isValid(suite.getSuiteName(), checked, suiteConfig):
+        logger.debug("Using cached query results for suite {} without scanning it".format(suite))
+        return None
+    suite.scan(update)
+    releaseFile = getReleaseFile(suite)
+    if releaseFile and releaseFile != checked and cache.isValid(suite.getSuiteName(), releaseFile, suiteConfig):
+        logger.debug("Using cached query results for suite {}".format(suite))
+        return None
+    (sources, binaries) = _queryRows(suite)
+    cache.store(suite.getSuiteName(), releaseFile, suiteConfig, sources, binaries)
+    return None
+
+
+def _getUnscannedReleaseFile(suite, update, cache):
+    '''
+        Returns the Release file of `suite` known from it's cache entry if it can be
+        checked before scanning the suite (which is only the case without an `update`).
+    '''
+    if update or not cache:
+        return None
+    return cache.getReleaseFile(suite.getSuiteName())
+
+
+def _queryRows(suite):
+    reqFields = PackageField.getByFieldsString(SCAN_FIELDS)
+    sources = _toMap(suite.querySources('.', True, None, None, reqFields))
+    # scan sources associated to binaries and keep the latest version for each source
+    # (the last one in sort order, without sorting all binaries)
+    mostRecent = dict()
+    for binSrc in suite.queryPackages('.', True, None, None, reqFields):
+        k = binSrc.getData()[0]
+        latest = mostRecent.get(k)
+        if latest is None or not binSrc < latest:
+            mostRecent[k] = binSrc
+    binaries = _toMap(mostRecent.values())
+    return (sources, binaries)
+
+
+def _toMap(queryResults):
+    '''
+        maps source names to picklable rows (sourceName, version, suiteName, section, component)
+    '''
+    res = dict()
+    for r in queryResults:
+        data = r.getData()
+        if len(data) > 0:
+            (sourceName, version, suite, section, component) = data
+            res[sourceName] = (sourceName, version, suite.getSuiteName(), section, component)
+    return res
@@ -0,0 +1,57 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import logging
+import threading
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+__environments = dict()
+__lock = threading.Lock()
+
+
+def getTemplateEnvironment(templateDir, cacheDir=None):
+    '''
+        Returns the jinja2 Environment loading templates from `templateDir`. The
+        Environment is created on first use and then shared by all callers using the
+        same `templateDir`, so compiled templates are reused. If `cacheDir` is given,
+        the compiled templates are also stored as bytecode in this folder and reused
+        by later runs (as long as the template files are not modified).
+    '''
+    key = os.path.abspath(templateDir)
+    with __lock:
+        env = __environments.get(key)
+        if not env:
+            env = Environment(loader=FileSystemLoader(templateDir),
+                              bytecode_cache=__getBytecodeCache(cacheDir))
+            __environments[key] = env
+        return env
+
+
+def __getBytecodeCache(cacheDir):
+    if not cacheDir:
+        return None
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+    except OSError as e:
+        logger.debug("Not using a template bytecode cache in {}: {}".format(cacheDir, e))
+        return None
+    return FileSystemBytecodeCache(cacheDir)
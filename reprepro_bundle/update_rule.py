@@ -19,9 +19,9 @@
 ##########################################################################
 import logging
 import re
-import subprocess
 import apt_repos
 from reprepro_bundle import BundleError
+from reprepro_bundle.key_ids import getPublicKeyIDs
 
 logger = logging.getLogger(__name__)
 
@@ -77,11 +77,4 @@ class UpdateRule:
         return res
 
     def getPublicKeyIDs(self, gpgFile):
-        ids = set()
-        if gpgFile:
-            res = subprocess.check_output(["gpg", "--list-public-keys", "--keyring", gpgFile, "--no-default-keyring", "--no-options", "--with-colons"]).decode('utf-8')
-            for line in res.splitlines():
-                parts = line.split(':')
-                if len(parts) >= 5 and parts[0] in ["pub", "sub"]:
-                    ids.add(parts[4])
-        return ids
+        return getPublicKeyIDs(gpgFile)
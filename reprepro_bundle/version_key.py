@@ -0,0 +1,94 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import re
+import functools
+
+_DIGITS = re.compile("([0-9]+)")
+_LETTERS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+# number of version keys kept for reuse by packages of other suites with the same version
+KEY_CACHE_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def versionKey(version):
+    '''
+        Returns a key for the debian version string `version`, so that comparing the keys
+        of two versions gives the same result as apt_pkg.version_compare (respectively
+        dpkg --compare-versions). Versions that dpkg regards as equal (e.g. '1.0' and '1.00')
+        get equal keys. Computing a key once and comparing keys is much cheaper than a call
+        to apt_pkg.version_compare for each comparison of a sort.
+    '''
+    epoch = 0
+    if ":" in version:
+        (epochStr, rest) = version.split(":", 1)
+        if epochStr.isdigit():
+            (epoch, version) = (int(epochStr), rest)
+    (upstream, revision) = version.rsplit("-", 1) if "-" in version else (version, "")
+    return (epoch, _encode(_flatten(upstream)), _encode(_flatten(revision)))
+
+
+def _order(c):
+    '''
+        The weight of a non-digit character like in dpkg's verrevcmp: '~' sorts before
+        everything (even the end of a part), letters sort before all other characters.
+    '''
+    if c == "~":
+        return -1
+    if c in _LETTERS:
+        return ord(c)
+    return ord(c) + 256
+
+
+def _flatten(part):
+    '''
+        Returns the values of `part` (upstream version or revision) in the order dpkg
+        compares them: the weights of the characters of each non-digit chunk followed
+        by 0 (the end of the chunk) and the numeric value of each digit chunk.
+    '''
+    values = list()
+    for (i, chunk) in enumerate(_DIGITS.split(part)):
+        if i % 2:
+            values.append(int(chunk))
+        else:
+            values.extend(_order(c) for c in chunk)
+            values.append(0)
+    return values
+
+
+def _encode(values):
+    '''
+        dpkg compares two parts as if the shorter one would be padded with 0 values, so
+        'a' < 'a.1' but 'a~1' < 'a'. Plain tuple comparison regards the shorter tuple as
+        less, so the values are encoded as one element per non-zero value (including the
+        number of zeros before it) followed by an end marker that compares to each element
+        like padding would do.
+    '''
+    res = list()
+    zeros = 0
+    for value in values:
+        if value == 0:
+            zeros += 1
+            continue
+        # a positive value wins against padding (the end marker) and the more, the earlier it
+        # comes; a negative value looses against padding and the more, the earlier it comes.
+        res.append((1, -zeros, value) if value > 0 else (-1, zeros, value))
+        zeros = 0
+    res.append((0,))
+    return tuple(res)
@@ -37,14 +37,16 @@ def BundleIDs_validate(data):
     raise TypeError("invalid bundleIDs")
 
 def Bundle(bundle):
-    info = bundle.getInfo() or dict()
+    '''
+        `bundle` is a reprepro_bundle.bundle_catalog.CatalogEntry
+    '''
     return {
         'name': bundle.bundleName,
         'distribution': bundle.bundleName.split("/", 1)[0],
-        'target': info.get("Target", "unknown"),
-        'subject': info.get("Releasenotes", "--no-subject--").split("\n", 1)[0],
+        'target': bundle.get("Target", "unknown"),
+        'subject': bundle.get("Subject", "--no-subject--"),
         'readonly': not bundle.isEditable(),
-        'creator': info.get("Creator", "unknown")
+        'creator': bundle.get("Creator", "unknown")
     }
 
 def Bundle_validate(data):
@@ -100,7 +102,7 @@ def ManagedBundle(bundle, tracBaseUrl=None):
     }
 
 def ManagedBundleInfo(bundle, tracBaseUrl=None):
-    info = bundle.getInfo() or dict()
+    summary = bundle.getInfoSummary()
     repoInfo = dict()
     if bundle.getRepoSuite():
         repoInfo = {
@@ -110,9 +112,9 @@ def ManagedBundleInfo(bundle, tracBaseUrl=None):
         }
     return {
         'id': bundle.getID(),
-        'basedOn': info.get("BasedOn"),
-        'subject': info.get("Releasenotes", "--no-subject--").split("\n", 1)[0],
-        'creator': info.get("Creator", "unknown"),
+        'basedOn': summary.get("BasedOn"),
+        'subject': summary.get("Subject", "--no-subject--"),
+        'creator': summary.get("Creator", "unknown"),
         **repoInfo
     }
 
@@ -26,25 +26,28 @@ import sys
 import argparse
 import logging
 import re
-import subprocess
 import json
 import apt_pkg
 import apt_repos
 from apt_repos import PackageField
 import reprepro_bundle_compose
-from reprepro_bundle_compose import PROJECT_DIR, BUNDLES_LIST_FILE, progname, parseBundles, updateBundles, markBundlesForStatus, getBundleRepoSuites, getTargetRepoSuites, trac_api, getTracConfig, getParentTicketsFromBundleInfo
+from reprepro_bundle_compose import PROJECT_DIR, BUNDLES_LIST_FILE, progname, parseBundles, updateBundles, markBundlesForStatus, getBundleRepoSuites, getTargetRepoSuites, trac_api, getTracConfig, getParentTicketsFromBundleInfo, prefetchBundleInfos
 from reprepro_bundle_compose.bundle_status import BundleStatus
 from reprepro_bundle_compose.managed_bundle import ManagedBundle
 from reprepro_bundle_compose.distribution import Distribution
+from reprepro_bundle_compose.target_index import TargetIndex, indexBundles
+from reprepro_bundle_compose.changed_files import writeFileIfChanged, copyFileIfChanged, symlinkIfChanged
+from reprepro_bundle_compose.package_index import BinaryPackageIndex
+from reprepro_bundle import getCacheDir
+from reprepro_bundle.query_cache import getReleaseFile
 from os.path import expanduser
 from shutil import copyfile
 from urllib.parse import urljoin, urlparse
-from jinja2 import Environment, FileSystemLoader
+from reprepro_bundle.template_env import getTemplateEnvironment
 
 
 TEMPLATES_DIR = os.path.join(PROJECT_DIR, "templates", "bundle_compose")
 logger = logging.getLogger(progname)
-templateEnv = Environment(loader=FileSystemLoader(TEMPLATES_DIR))
 
 
 def setupLogging(loglevel):
@@ -100,11 +103,18 @@ def main():
     for p in [parse_ub]:
         p.add_argument("--no-trac", action="store_true", help="""
                         Don't sync against trac.""")
+        p.add_argument("--full-trac-sync", action="store_true", help="""
+                        Sync all tickets against trac instead of only the tickets changed since the last sync.""")
 
     for p in [parse_jsondump, parse_jsondeps]:
         p.add_argument('outputFilename', nargs=1, help="""
                         Name of the ouptFile for the json-dump.""")
 
+    for p in [parse_apply]:
+        p.add_argument("--changes-manifest", default=None, help="""
+                        Write a json file listing the repositories (and files) whose reprepro-config
+                        changed, so that only these repositories need to be processed again.""")
+
     for p in [parse_list]:
         p.add_argument("-s", "--stage", default=None, choices=sorted(BundleStatus.getAvailableStages()), help="""
                         Select only bundles in the provided stage.""")
@@ -154,12 +164,16 @@ def cmd_update_bundles(args):
             config = getTracConfig()
             parentTicketsField = config.get('UseParentTicketsFromInfoField')
             tracApi = trac_api.TracApi(config['TracUrl'], config.get('User'), config.get('Password'))
+            # check the connection before anything is changed, so that a failing trac
+            # doesn't abort the update halfway
+            tracApi.checkConnection()
         except KeyError as e:
             logger.warn("Missing Key {} in local trac configuration --> no synchronization with trac will be done!".format(e))
         except Exception as e:
+            tracApi = None
             logger.warn("Trac will not be synchronized: {}".format(e))
 
-    updateBundles(tracApi, parentTicketsField=parentTicketsField)
+    updateBundles(tracApi, parentTicketsField=parentTicketsField, fullTracSync=args.full_trac_sync)
 
 
 def cmd_stage(args):
@@ -183,17 +197,21 @@ def cmd_list(args):
     '''
     bundles = parseBundles(getBundleRepoSuites())
     tracUrl = getTracConfig().get('TracUrl')
-    nl = ""
+    groups = list() # list of tuples (status, selected bundles)
     for status in BundleStatus:
         if args.stage and not status.getStage() == args.stage:
             continue
         selected = filterBundles(bundles, status if not args.candidates else status.getCandidates())
         if len(selected) > 0:
-            headline="{}{} '{}'{}:".format(nl, "Bundles with status" if not args.candidates else "Candidates for status", status, " (stage '" + status.getStage() + "')" if status.getStage() else "")
-            if True: # make it switchable later?
-                print("{}\n{}".format(headline, "=" * len(headline)))
-            listBundles(selected, tracUrl)
-            nl = "\n"
+            groups.append((status, selected))
+    prefetchBundleInfos([bundle for bundle in set().union(*[selected for (_, selected) in groups]) if not bundle.hasInfoSummary()])
+    nl = ""
+    for (status, selected) in groups:
+        headline="{}{} '{}'{}:".format(nl, "Bundles with status" if not args.candidates else "Candidates for status", status, " (stage '" + status.getStage() + "')" if status.getStage() else "")
+        if True: # make it switchable later?
+            print("{}\n{}".format(headline, "=" * len(headline)))
+        listBundles(selected, tracUrl)
+        nl = "\n"
 
 
 def cmd_jsondump(args):
@@ -207,6 +225,7 @@ def cmd_jsondump(args):
         tracUrl = config.get('TracUrl')
         parentTicketsField = config.get('UseParentTicketsFromInfoField')
         logger.info("Extracting Bundle-Infos")
+        prefetchBundleInfos([bundle for bundle in bundles.values() if parentTicketsField or not bundle.hasInfoSummary()])
         bundleInfos = list()
         for bid, bundle in sorted(bundles.items()):
             logger.debug("Extracting Infos for {}".format(bid))
@@ -226,30 +245,26 @@ def cmd_jsondeps(args):
             bundles = parseBundles(getBundleRepoSuites())
             logger.info("Extracting Bundle-Dependencies")
 
-            packages = list()
+            index = BinaryPackageIndex(getCacheDir("jsondeps"))
+            selected = list()
             for bid, bundle in sorted(bundles.items()):
                 suite = bundle.getRepoSuite()
                 if suite and bundle.getStatus() > BundleStatus.STAGING and bundle.getStatus() < BundleStatus.PRODUCTION:
-                    logger.debug("Querying Packages for {} [{}]".format(bid, bundle.getStatus()))
+                    selected.append(bid)
                     suite.scan(True)
+                    releaseFile = getReleaseFile(suite)
+                    if index.isCurrent(bid, releaseFile):
+                        logger.debug("Using indexed Packages for {} [{}]".format(bid, bundle.getStatus()))
+                        continue
+                    logger.debug("Querying Packages for {} [{}]".format(bid, bundle.getStatus()))
                     res = suite.queryPackages(".", True, None, None, [ PackageField.BINARY_PACKAGE_NAME, PackageField.VERSION, PackageField.SUITE ])
-                    packages.extend(res)
-
-            bundleDeps = list()
-            packageDeps = list()
-            knownRelations = set()
-            last = None
-            for p in sorted(packages):
-                (package, unused_version, suite) = p.getData()
-                if package != last:
-                    last = package
-                    packageDeps.clear()
-                for dep in packageDeps:
-                    rel = "{}:{}".format(suite, dep)
-                    if not rel in knownRelations:
-                        knownRelations.add(rel)
-                        bundleDeps.append([ str(suite), str(dep) ])
-                packageDeps.append(suite)
+                    index.update(bid, releaseFile, [ tuple(str(v) for v in p.getData()) for p in res ])
+            index.retain(selected)
+            try:
+                index.store()
+            except OSError as e:
+                logger.warning("Could not store the binary package index in {}: {}".format(index.getCacheDir(), e))
+            bundleDeps = index.getDependencies()
 
             with open(args.outputFilename[0], "w", encoding="utf-8") as jsonFile:
                 print(json.dumps(sorted(bundleDeps, reverse=True), sort_keys=True, indent=4), file=jsonFile)
@@ -261,24 +276,30 @@ def cmd_apply(args):
         Applies the bundles list to the reprepro configuration for all target suites.
     '''
     bundles = parseBundles(getBundleRepoSuites())
-    createTargetRepreproConfigs(bundles)
+    repos = createTargetRepreproConfigs(bundles, TargetIndex(getTargetRepoSuites()))
+    changedRepos = [repo for repo in repos if repo['changed']]
+    logger.info("The reprepro-config changed for {} of {} repositories".format(len(changedRepos), len(repos)))
+    if args.changes_manifest:
+        with open(args.changes_manifest, "w", encoding="utf-8") as manifest:
+            print(json.dumps({ 'changed': changedRepos, 'repositories': repos }, sort_keys=True, indent=4), file=manifest)
+        logger.info("Changes manifest written to '{}'".format(args.changes_manifest))
 
 
-def createTargetRepreproConfigs(bundles):
+def createTargetRepreproConfigs(bundles, targetIndex):
     """
         Creates reprepro config files for targets in all known stages
+        using the TargetIndex `targetIndex`. Returns a list (sorted by url) with
+        a dict per repository containing the keys 'url', 'confDir' and 'changed'
+        (the list of changed config files relative to 'confDir').
     """
+    templateEnv = getTemplateEnvironment(TEMPLATES_DIR, getCacheDir("templates"))
     dist_template = templateEnv.get_template("target_distributions.skel")
     bundle_update_template = templateEnv.get_template("bundle_updates.skel")
     bundle_base_update_template = templateEnv.get_template("bundle-base_updates.skel")
 
-    updateUrls = set()
-    for stage in sorted(BundleStatus.getAvailableStages()):
-        targets = getTargetRepoSuites(stage)
-        logger.info("Found {} targets for stage '{}'".format(len(targets), stage))
-        for _, target in sorted(targets.items()):
-            logger.debug("Adding target {} with Url {}".format(target, target.getRepoUrl()))
-            updateUrls.add(target.getRepoUrl())
+    updateUrls = targetIndex.getRepoUrls(BundleStatus.getAvailableStages())
+    bundleIndex = indexBundles(bundles)
+    res = list()
 
     for url in sorted(updateUrls):
         p = urlparse(url)
@@ -310,16 +331,17 @@ def createTargetRepreproConfigs(bundles):
         if not os.path.isdir(updatesDir):
             os.mkdir(updatesDir)
 
-        repoTargets = list()
-        for _, target in sorted(getTargetRepoSuites().items()):
-            if target.getRepoUrl() == url:
-                repoTargets.append(target)
-        createTargetRepreproConfigForRepository(bundles, repoTargets, repoConfDir, bundle_update_template, bundle_base_update_template, dist_template)
+        repoTargets = targetIndex.getTargetsForUrl(url)
+        changed = createTargetRepreproConfigForRepository(bundleIndex, targetIndex, repoTargets, repoConfDir, bundle_update_template, bundle_base_update_template, dist_template)
+        res.append({ 'url': url, 'confDir': repoConfDir, 'changed': changed })
+    return res
 
 
-def createTargetRepreproConfigForRepository(bundles, repoTargets, repoConfDir, bundle_update_template, bundle_base_update_template, dist_template):
+def createTargetRepreproConfigForRepository(bundleIndex, targetIndex, repoTargets, repoConfDir, bundle_update_template, bundle_base_update_template, dist_template):
     '''
-        creates the complete configuration for all suites (targets) belonging to the same repository
+        creates the complete configuration for all suites (targets) belonging to the same repository.
+        Files are only written if their content changed. Returns the list of changed files
+        (relative to `repoConfDir`).
     '''
     logger.info("Creating reprepro-config at '{}' with {} suites".format(repoConfDir, len(repoTargets)))
     autogenerated = "# This file is auto-generated by '{}'. Don't edit it manually!\n".format(progname)
@@ -327,11 +349,9 @@ def createTargetRepreproConfigForRepository(bundles, repoTargets, repoConfDir, b
     update_rules = dict()
     # create update rules for bundles
     for target in repoTargets:
-        for unused_bid, bundle in sorted(bundles.items()):
-            if not bundle.isSupposedForTarget(target):
-                continue
+        for bundle in targetIndex.getBundlesForTarget(target, bundleIndex):
             ruleName = 'update-' + bundle.getID()
-            keyIds = sorted(getPublicKeyIDs(target.getTrustedGPGFile()))
+            keyIds = targetIndex.getPublicKeyIDs(target)
             chunk = bundle_update_template.render(
                 ruleName=ruleName,
                 repoUrl=bundle.getRepoUrl(),
@@ -341,40 +361,43 @@ def createTargetRepreproConfigForRepository(bundles, repoTargets, repoConfDir, b
                 publicKeys=("!|".join(keyIds)+"!" if len(keyIds) > 0 else ""))
             update_rules[ruleName] = chunk
             update_line[target] = update_line.get(target, "") + '\n ' + ruleName
-    with open(os.path.join(repoConfDir, 'distributions', 'bundle-compose_dynamic.conf'), "w") as upconf:
-        upconf.write(autogenerated)
-        for target in repoTargets:
-            # create update rule for bundle-base suites
-            updates = update_line.get(target, "")
-            baseDist = getBaseDist(target)
-            if not baseDist:
-                logger.warning("Skipping target {} as it has no 'base-dist.*' tag and no 'bundle-dist.*' tag!".format(target))
-                continue
-            for suite in sorted(apt_repos.getSuites(["bundle-base.{}:".format(baseDist)])):
-                ruleName = "update-" + suite.getSuiteName()
-                keyIds = sorted(getPublicKeyIDs(suite.getTrustedGPGFile()))
-                updates += '\n ' + ruleName
-                chunk = bundle_base_update_template.render(
-                    ruleName=ruleName,
-                    repoUrl=suite.getRepoUrl(),
-                    suite=suite.getAptSuite(),
-                    components=" ".join(suite.getComponents()),
-                    architectures=" ".join(suite.getArchitectures()),
-                    targetDistribution = baseDist,
-                    publicKeys=("!|".join(keyIds)+"!" if len(keyIds) > 0 else ""))
-                update_rules[ruleName] = chunk
-
-            # create distribution file
-            logger.debug("Updating target {}".format(target))
-            upconf.write(dist_template.render(
-                updates=updates,
-                suite=target.getAptSuite(),
-                components=" ".join(target.getComponents()),
-                architectures=" ".join(target.getArchitectures())))
+    changed = list()
+    distsConf = [autogenerated]
+    for target in repoTargets:
+        # create update rule for bundle-base suites
+        updates = update_line.get(target, "")
+        baseDist = targetIndex.getBaseDist(target)
+        if not baseDist:
+            logger.warning("Skipping target {} as it has no 'base-dist.*' tag and no 'bundle-dist.*' tag!".format(target))
+            continue
+        for suite in targetIndex.getBundleBaseSuites(baseDist):
+            ruleName = "update-" + suite.getSuiteName()
+            keyIds = targetIndex.getPublicKeyIDs(suite)
+            updates += '\n ' + ruleName
+            chunk = bundle_base_update_template.render(
+                ruleName=ruleName,
+                repoUrl=suite.getRepoUrl(),
+                suite=suite.getAptSuite(),
+                components=" ".join(suite.getComponents()),
+                architectures=" ".join(suite.getArchitectures()),
+                targetDistribution = baseDist,
+                publicKeys=("!|".join(keyIds)+"!" if len(keyIds) > 0 else ""))
+            update_rules[ruleName] = chunk
+
+        # create distribution file
+        logger.debug("Updating target {}".format(target))
+        distsConf.append(dist_template.render(
+            updates=updates,
+            suite=target.getAptSuite(),
+            components=" ".join(target.getComponents()),
+            architectures=" ".join(target.getArchitectures())))
+    distsFile = os.path.join('distributions', 'bundle-compose_dynamic.conf')
+    if writeFileIfChanged(os.path.join(repoConfDir, distsFile), "".join(distsConf)):
+        changed.append(distsFile)
     # create updates file
-    with open(os.path.join(repoConfDir, 'updates', 'bundle-compose_dynamic.conf'), "w") as upconf:
-        upconf.write(autogenerated)
-        upconf.write("".join([v for _, v in sorted(update_rules.items())]))
+    updatesFile = os.path.join('updates', 'bundle-compose_dynamic.conf')
+    if writeFileIfChanged(os.path.join(repoConfDir, updatesFile), autogenerated + "".join([v for _, v in sorted(update_rules.items())])):
+        changed.append(updatesFile)
     for root, dirs, files in os.walk(TEMPLATES_DIR):
         path = os.path.relpath(root, TEMPLATES_DIR)
         for f in dirs:
@@ -391,35 +414,21 @@ def createTargetRepreproConfigForRepository(bundles, repoTargets, repoConfDir, b
                 relPath = os.path.relpath(srcPath, repoConfDir)
                 name = f[:-len(".symlink")]
                 targetPath = os.path.join(repoConfDir, path, name)
-                logger.debug("Creating symlink {} --> {}".format(relPath, targetPath))
-                if os.path.exists(targetPath):
-                    os.remove(targetPath)
-                os.symlink(relPath, targetPath)
+                if symlinkIfChanged(relPath, targetPath):
+                    logger.debug("Created symlink {} --> {}".format(relPath, targetPath))
+                    changed.append(os.path.normpath(os.path.join(path, name)))
             elif f.endswith(".once"):
                 targetPath = os.path.join(repoConfDir, path, f[:-5])
                 if not os.path.exists(targetPath):
                     logger.debug("Once creating file from template {} --> {}".format(srcPath, targetPath))
                     copyfile(srcPath, targetPath)
+                    changed.append(os.path.normpath(os.path.join(path, f[:-5])))
             else:
                 targetPath = os.path.join(repoConfDir, path, f)
-                logger.debug("Copying file {} --> {}".format(srcPath, targetPath))
-                copyfile(srcPath, targetPath)
-
-
-def getBaseDist(targetRepoSuite):
-    '''
-        Returns the base-dist defined for the supplied targetRepoSuite or None, if there is
-        is no base-dist defined for the target. The base-dist is
-        * either the {value} defined by a "base-dist.{value}"-tag (if defined) or
-        * the {value} defined by a "bundle-dist.{value}"-tag (as fallback).
-    '''
-    bundleDist, baseDist = None, None
-    for tag in targetRepoSuite.getTags():
-        if tag.startswith("base-dist."):
-            baseDist = tag[len("base-dist."):]
-        if tag.startswith("bundle-dist."):
-            bundleDist = tag[len("bundle-dist."):]
-    return baseDist if baseDist else bundleDist
+                if copyFileIfChanged(srcPath, targetPath):
+                    logger.debug("Copied file {} --> {}".format(srcPath, targetPath))
+                    changed.append(os.path.normpath(os.path.join(path, f)))
+    return changed
 
 
 def filterBundles(bundles, status):
@@ -442,14 +451,14 @@ def listBundles(bundles, tracUrl=None):
 
 
 def __extractBundleInfos(bundle, tracUrl=None, parentTicketsField=None):
-    info = bundle.getInfo()
+    summary = bundle.getInfoSummary()
     bundleInfo = {
         'id': bundle.getID(),
         'target': bundle.getTarget(),
         'status': str(bundle.getStatus()),
-        'basedOn': info.get("BasedOn") or "NEW",
-        'subject': info.get("Releasenotes", "--no-subject--").split("\n", 1)[0],
-        'creator': info.get("Creator", "unknown")
+        'basedOn': summary.get("BasedOn") or "NEW",
+        'subject': summary.get("Subject", "--no-subject--"),
+        'creator': summary.get("Creator", "unknown")
     }
     if bundle.getTrac():
         bundleInfo['ticket'] = bundle.getTrac()
@@ -457,22 +466,11 @@ def __extractBundleInfos(bundle, tracUrl=None, parentTicketsField=None):
         if not tracUrl.endswith("/"):
             tracUrl += "/"
         bundleInfo['tracUrl'] = tracUrl
-    parentTickets = getParentTicketsFromBundleInfo(info, parentTicketsField)
+    parentTickets = getParentTicketsFromBundleInfo(bundle.getInfo(), parentTicketsField) if parentTicketsField else None
     if parentTickets:
         bundleInfo['parentTickets'] = parentTickets
     return bundleInfo
 
 
-def getPublicKeyIDs(gpgFile):
-    ids = set()
-    if gpgFile:
-        res = subprocess.check_output(["gpg", "--list-public-keys", "--keyring", gpgFile, "--no-default-keyring", "--no-options", "--with-colons"]).decode('utf-8')
-        for line in res.splitlines():
-            parts = line.split(':')
-            if len(parts) >= 5 and parts[0] in ["pub", "sub"]:
-                ids.add(parts[4])
-    return ids
-
-
 if __name__ == "__main__":
     main()
@@ -24,6 +24,8 @@ import os
 import sys
 import logging
 import subprocess
+import datetime
+import concurrent.futures
 import apt_pkg
 import git
 import re
@@ -32,6 +34,7 @@ from git.exc import GitCommandError
 from reprepro_bundle_compose.bundle_status import BundleStatus
 from reprepro_bundle_compose.managed_bundle import ManagedBundle
 from reprepro_bundle_compose.distribution import Distribution
+from reprepro_bundle_compose.trac_sync_state import TracSyncState
 
 logger = logging.getLogger(__name__)
 
@@ -46,15 +49,19 @@ import apt_repos
 HERE = os.path.realpath(os.path.dirname(os.path.realpath(__file__)) + "/..")
 if os.path.isdir(os.path.join(HERE, "reprepro_bundle_compose")):
     sys.path.insert(0, HERE)
+from reprepro_bundle import getCacheDir
+from reprepro_bundle.package_list import getPackageList
 
 progname = "bundle-compose"
 
-APT_REPOS_CMD = os.path.join(PROJECT_DIR, "apt-repos/bin/apt-repos")
-if not os.path.exists(APT_REPOS_CMD):
-    APT_REPOS_CMD = "apt-repos"
+INFO_FETCH_JOBS = 8
+# how far the trac sync high-water mark is set back to cover changes during a sync
+TRAC_SYNC_OVERLAP = datetime.timedelta(minutes=5)
+# the format of xmlrpc DateTime values
+TRAC_DATETIME_FORMAT = "%Y%m%dT%H:%M:%S"
 
 
-def updateBundles(tracApi=None, parentTicketsField=None, cwd=PROJECT_DIR):
+def updateBundles(tracApi=None, parentTicketsField=None, fullTracSync=False, cwd=PROJECT_DIR):
     preUpdateHook = getHooksConfig(cwd=cwd).get('pre_update_bundles', None)
     if preUpdateHook:
         cmd = preUpdateHook.split()
@@ -67,20 +74,28 @@ def updateBundles(tracApi=None, parentTicketsField=None, cwd=PROJECT_DIR):
     repo_suites = getBundleRepoSuites(cwd=cwd)
     managed_bundles = parseBundles(cwd=cwd)
     ids = set(repo_suites.keys()).union(managed_bundles.keys())
+    tracBundles = list() # bundles to be synchronized with their Trac-Tickets
+
+    # read the info files needed below concurrently instead of one request per bundle
+    for (id, bundle) in managed_bundles.items():
+        if id in repo_suites:
+            bundle.setRepoSuite(repo_suites[id])
+    prefetchBundleInfos([bundle for (id, bundle) in managed_bundles.items() if id in repo_suites and
+                         (not bundle.ignoresTargetFromInfoFile() or not (bundle.isSealed() and bundle.hasInfoSummary()))])
 
     for id in sorted(ids):
         logger.debug("Updating {}".format(id))
         bundle = managed_bundles.get(id)
         suite = repo_suites.get(id)
         if not bundle and suite:
-            bundle = ManagedBundle(None, suite)
+            bundle = ManagedBundle(None, suite, cwd=cwd)
             managed_bundles[id] = bundle
+            bundle.updateInfoSummary()
             logger.info("Added {} with status '{}'".format(bundle, bundle.getStatus()))
         elif bundle and not suite:
             if bundle.getStatus() != BundleStatus.DROPPED:
                 logger.warn("Could not find an apt-repos suite for bundle {} - Please check!".format(bundle))
         else:
-            bundle.setRepoSuite(suite)
             if not bundle.ignoresTargetFromInfoFile():
                 info = bundle.getInfo()
                 if info.get("Target") != bundle.getTarget():
@@ -88,6 +103,10 @@ def updateBundles(tracApi=None, parentTicketsField=None, cwd=PROJECT_DIR):
                         pass
                     else:
                         logger.warn("Target-Fields of {} and it's info file dont't match ('{}' vs. '{}') - Please check!".format(bundle, bundle.getTarget(), info.get("Target")))
+            # the summary is updated before the status, so that a bundle sealed since the
+            # last update gets the summary of it's final info file
+            if bundle.updateInfoSummary():
+                logger.debug("Updated info summary of {}".format(bundle))
             suiteStatus = BundleStatus.getByTags(suite.getTags())
             if bundle.getStatus() < suiteStatus:
                 if bundle.getStatus().allowsOverride():
@@ -103,44 +122,110 @@ def updateBundles(tracApi=None, parentTicketsField=None, cwd=PROJECT_DIR):
                     logger.info("Created Trac-Ticket #{} of {} - Don't forget to publish this change!".format(bundle.getTrac(), bundle))
                 else:
                     continue
-            ticket = tracApi.getTicketValues(bundle.getTrac())
-            fetchedTracStatus = BundleStatus.getByTracStatus(ticket['status'], ticket.get('resolution'))
-            if bundle.getStatus() < fetchedTracStatus:
-                if bundle.getStatus().allowsOverride():
-                    bundle.setStatus(fetchedTracStatus)
-                    logger.info("Updated {} to status '{}'".format(bundle, fetchedTracStatus))
-                else:
-                    logger.warn("Status of {} doesn't match it's Trac-Ticket status ('{}' vs. '{}') - Please check!".format(bundle, bundle.getStatus(), fetchedTracStatus))
-                    continue
-            pushTracStatus = bundle.getStatus().getTracStatus()
-            pushTracResolution = bundle.getStatus().getTracResolution()
-            if pushTracStatus and ticket['status'] != pushTracStatus:
-                tracApi.updateTicket(bundle.getTrac(), "Automatically updated by bundle-compose", {
-                    'status': pushTracStatus,
-                    'resolution': pushTracResolution if pushTracResolution else "",
-                })
-                logger.info("Updated Trac-Ticket #{} of {} to Status '{}'".format(bundle.getTrac(), bundle, (pushTracStatus + " as " + pushTracResolution) if pushTracResolution else pushTracStatus))
-            pushTarget = bundle.getTarget()
-            if pushTarget and ticket['bereitstellung'] != pushTarget:
-                tracApi.updateTicket(bundle.getTrac(), "Automatically updated by bundle-compose", {
-                    'bereitstellung': pushTarget
-                })
-                logger.info("Updated Trac-Ticket #{} of {} to Target '{}'".format(bundle.getTrac(), bundle, pushTarget))
+            tracBundles.append(bundle)
+
+    if tracApi and len(tracBundles) > 0:
+        syncState = TracSyncState(getCacheDir("trac-sync", cwd=cwd), tracApi.getTracUrl())
+        syncTracTickets(tracApi, tracBundles, syncState, fullTracSync)
 
     storeBundles(managed_bundles, cwd=cwd)
 
 
+def syncTracTickets(tracApi, bundles, syncState=None, fullTracSync=False):
+    '''
+        Synchronizes the status of the ManagedBundles `bundles` with their Trac-Tickets
+        and updates the status and target fields of the tickets if necessary. All tickets
+        are fetched at once and all updates are sent at once (both in batches using
+        trac's system.multicall) instead of a round trip for each ticket.
+
+        If a TracSyncState `syncState` of a previous synchronization is available, only
+        the tickets changed in trac since then (according to ticket.getRecentChanges)
+        and the tickets of bundles whose status or target changed locally are fetched,
+        unless `fullTracSync` is set. The `syncState` is updated and stored afterwards.
+    '''
+    # The new high-water mark is trac's time before the first query minus a safety overlap (or
+    # the local time if trac's time is unknown). Changes done by others while we synchronize
+    # are therefore fetched again next time, even if they are older than our own updates.
+    serverTime = tracApi.checkConnection() or datetime.datetime.now(datetime.timezone.utc)
+    since = (serverTime.astimezone(datetime.timezone.utc) - TRAC_SYNC_OVERLAP).strftime(TRAC_DATETIME_FORMAT)
+    if syncState and syncState.getSince() and not fullTracSync:
+        changed = set(str(tid) for tid in tracApi.getRecentChanges(syncState.getSince()))
+        pending = [bundle for bundle in bundles if bundle.getTrac() in changed or not syncState.isInSync(bundle)]
+        logger.info("Fetching {} of {} Trac-Tickets changed since {}".format(len(pending), len(bundles), syncState.getSince()))
+    else:
+        pending = bundles
+        logger.info("Fetching {} Trac-Tickets".format(len(bundles)))
+    tickets = tracApi.getTickets([bundle.getTrac() for bundle in pending])
+    updates = list() # list of tuples (id, comment, args)
+    messages = list()
+    inSync = list()
+    for bundle in pending:
+        (_, _, _, ticket) = tickets[bundle.getTrac()]
+        fetchedTracStatus = BundleStatus.getByTracStatus(ticket['status'], ticket.get('resolution'))
+        if bundle.getStatus() < fetchedTracStatus:
+            if bundle.getStatus().allowsOverride():
+                bundle.setStatus(fetchedTracStatus)
+                logger.info("Updated {} to status '{}'".format(bundle, fetchedTracStatus))
+            else:
+                logger.warn("Status of {} doesn't match it's Trac-Ticket status ('{}' vs. '{}') - Please check!".format(bundle, bundle.getStatus(), fetchedTracStatus))
+                if syncState:
+                    syncState.forget(bundle)
+                continue
+        inSync.append(bundle)
+        pushTracStatus = bundle.getStatus().getTracStatus()
+        pushTracResolution = bundle.getStatus().getTracResolution()
+        if pushTracStatus and ticket['status'] != pushTracStatus:
+            updates.append((bundle.getTrac(), "Automatically updated by bundle-compose", {
+                'status': pushTracStatus,
+                'resolution': pushTracResolution if pushTracResolution else "",
+            }))
+            messages.append("Updated Trac-Ticket #{} of {} to Status '{}'".format(bundle.getTrac(), bundle, (pushTracStatus + " as " + pushTracResolution) if pushTracResolution else pushTracStatus))
+        pushTarget = bundle.getTarget()
+        if pushTarget and ticket['bereitstellung'] != pushTarget:
+            updates.append((bundle.getTrac(), "Automatically updated by bundle-compose", {
+                'bereitstellung': pushTarget
+            }))
+            messages.append("Updated Trac-Ticket #{} of {} to Target '{}'".format(bundle.getTrac(), bundle, pushTarget))
+    if len(updates) > 0:
+        tracApi.updateTickets(updates)
+        for msg in messages:
+            logger.info(msg)
+    if syncState:
+        syncState.update(since, inSync)
+        try:
+            syncState.store()
+        except OSError as e:
+            logger.warning("Could not store the trac sync state: {}".format(e))
+
+
+def prefetchBundleInfos(bundles, jobs=INFO_FETCH_JOBS):
+    '''
+        Reads the info files of the ManagedBundles `bundles` concurrently with at most
+        `jobs` requests in parallel, so that subsequent calls of getInfo() don't block
+        on a round trip to the bundle server each.
+    '''
+    bundles = list(bundles)
+    if len(bundles) <= 1 or jobs <= 1:
+        for bundle in bundles:
+            bundle.getInfo()
+        return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for unused_info in executor.map(lambda bundle: bundle.getInfo(), bundles):
+            pass
+
+
 def parseBundles(repoSuites=None, selectIds=None, cwd=PROJECT_DIR):
     '''
         Parses the file BUNDLES_LIST_FILE and returns a dict of ID to ManagedBundle-Objects mappings
     '''
     bundlesListFile = os.path.join(cwd, BUNDLES_LIST_FILE)
-    return parseBundlesListFile(bundlesListFile, repoSuites, selectIds)
+    return parseBundlesListFile(bundlesListFile, repoSuites, selectIds, cwd=cwd)
 
 
-def parseBundlesListFile(bundlesListFile, repoSuites=None, selectIds=None):
+def parseBundlesListFile(bundlesListFile, repoSuites=None, selectIds=None, cwd=PROJECT_DIR):
     '''
-        Parses the file bundlesListsFile and returns a dict of ID to ManagedBundle-Objects mappings
+        Parses the file bundlesListsFile and returns a dict of ID to ManagedBundle-Objects mappings.
+        The info files of the bundles are cached in the project folder `cwd`.
     '''
     res = dict()
     if not os.path.isfile(bundlesListFile):
@@ -150,7 +235,7 @@ def parseBundlesListFile(bundlesListFile, repoSuites=None, selectIds=None):
     try:
         for section in file_bundles:
             try:
-                bundle = ManagedBundle(section)
+                bundle = ManagedBundle(section, cwd=cwd)
                 if selectIds != None and not bundle.getID() in selectIds:
                     continue
                 if repoSuites and bundle.getID() in repoSuites:
@@ -260,8 +345,8 @@ def createTracTicketForBundle(trac, bundle, parentTicketsField=None, cwd=PROJECT
     info = bundle.getInfo()
     milestone = Distribution.getByName(info.get('Distribution', '')).getMilestone()
     (subject, description) = splitReleasenotes(info)
-    package_list = subprocess.check_output([APT_REPOS_CMD, "-b .apt-repos", "ls", "-s", str(bundle.getID()), "-col", "CpvaSs", "-r", "." ], cwd=cwd)
-    description = description.replace("__DYNAMIC_PACKAGE_LIST__", package_list.decode("utf-8").rstrip())
+    package_list = getPackageList(bundle.getRepoSuite()) if bundle.getRepoSuite() else ""
+    description = description.replace("__DYNAMIC_PACKAGE_LIST__", package_list.rstrip())
     parentTickets = getParentTicketsFromBundleInfo(info, parentTicketsField)
     if parentTickets:
         parentTickets = " ".join([ "#{}".format(t) for t in parentTickets ])
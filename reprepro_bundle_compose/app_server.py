@@ -44,7 +44,7 @@ from reprepro_bundle_compose import \
         BUNDLES_LIST_FILE, BundleStatus, getTargetRepoSuites, \
         getBundleRepoSuites, parseBundles, trac_api, \
         getTracConfig, getGitRepoConfig, git_commit, \
-        ensure_clean_git_repo, GitNotCleanException
+        ensure_clean_git_repo, GitNotCleanException, prefetchBundleInfos
 from reprepro_bundle_appserver import common_app_server, common_interfaces
 from apt_repos import RepoSuite, PackageField, QueryResult
 
@@ -593,6 +593,7 @@ def get_managed_bundle_infos(bundleIds, cwd):
     repoSuites = getBundleRepoSuites(bundleIds, cwd=cwd)
     bundles = parseBundles(repoSuites, selectIds=[str(s) for s in repoSuites], cwd=cwd)
     tracUrl = getTracConfig(cwd=cwd).get('TracUrl')
+    prefetchBundleInfos([bundle for bundle in bundles.values() if not bundle.hasInfoSummary()])
     res = [ common_interfaces.ManagedBundleInfo(bundle, tracBaseUrl = tracUrl)
         for bundle in bundles.values() ]
     return res
@@ -0,0 +1,86 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import hashlib
+import logging
+import tempfile
+from shutil import copyfile
+
+logger = logging.getLogger(__name__)
+
+
+def writeFileIfChanged(path, content):
+    '''
+        Writes the string `content` to the file `path` unless the file already has exactly
+        this content (compared by sha256 checksum). Unchanged files keep their mtime, so
+        make-like tools don't regard them as changed. Changed files are replaced atomically,
+        so readers never see a partially written file. Returns True if the file was written.
+    '''
+    data = content.encode('utf-8')
+    if _checksumOfFile(path) == hashlib.sha256(data).hexdigest():
+        return False
+    fd, tmpFile = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix="." + os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.chmod(tmpFile, 0o644)
+        os.replace(tmpFile, path)
+    except Exception:
+        os.remove(tmpFile)
+        raise
+    return True
+
+
+def copyFileIfChanged(srcPath, targetPath):
+    '''
+        Copies `srcPath` to `targetPath` unless both files have the same content.
+        Returns True if the file was copied.
+    '''
+    if _checksumOfFile(targetPath) == _checksumOfFile(srcPath):
+        return False
+    copyfile(srcPath, targetPath)
+    return True
+
+
+def symlinkIfChanged(linkTarget, path):
+    '''
+        Creates (or replaces) the symlink `path` pointing to `linkTarget` unless it already
+        exists and points to `linkTarget`. Returns True if the symlink was (re-)created.
+    '''
+    if os.path.islink(path) and os.readlink(path) == linkTarget:
+        return False
+    if os.path.lexists(path):
+        os.remove(path)
+    os.symlink(linkTarget, path)
+    return True
+
+
+def _checksumOfFile(path):
+    '''
+        Returns the sha256 checksum of the file `path` or None if it can't be read.
+    '''
+    sha = hashlib.sha256()
+    try:
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(65536), b""):
+                sha.update(chunk)
+    except OSError:
+        return None
+    return sha.hexdigest()
@@ -0,0 +1,148 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import urllib.request
+import urllib.error
+from reprepro_bundle import getCacheDir
+
+logger = logging.getLogger(__name__)
+
+FETCH_TIMEOUT = 60
+
+
+class InfoFileCache:
+    '''
+        A persistent HTTP cache for the (small) info files of bundles. For each url the
+        cache stores the content and the ETag and Last-Modified headers of the response
+        in `cacheDir`. Cached files are revalidated with a conditional GET, so unchanged
+        files are not transferred again. Files that can't change anymore (the info files
+        of sealed bundles) are served from the cache without any request.
+    '''
+    def __init__(self, cacheDir):
+        self.__cacheDir = cacheDir
+
+    def getCacheDir(self):
+        return self.__cacheDir
+
+    def get(self, url, immutable=False):
+        '''
+            Returns the content of `url` as bytes. If `immutable` is True and `url` is
+            already cached, the cached content is returned without asking the server.
+            Raises the urllib exception if the file could not be fetched.
+        '''
+        (dataFile, metaFile) = self.__getCacheFiles(url)
+        meta = self.__loadMeta(metaFile, url)
+        data = self.__readData(dataFile) if meta is not None else None
+        if data is None:
+            meta = None
+        elif immutable:
+            return data
+        res = self.__fetch(url, meta)
+        if res is None: # not modified
+            return data
+        (data, headers) = res
+        try:
+            self.__store(dataFile, metaFile, url, data, headers.get('ETag'), headers.get('Last-Modified'))
+        except OSError as e:
+            logger.debug("Could not update the info file cache in {}: {}".format(self.__cacheDir, e))
+        return data
+
+    def __fetch(self, url, meta):
+        '''
+            Fetches `url` conditionally to the validators in `meta` (if not None). Returns
+            None if the server reports the file as not modified, otherwise the tuple
+            (data, headers).
+        '''
+        req = urllib.request.Request(url)
+        if meta is not None:
+            if meta.get('etag'):
+                req.add_header('If-None-Match', meta['etag'])
+            if meta.get('lastModified'):
+                req.add_header('If-Modified-Since', meta['lastModified'])
+        try:
+            with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT) as response:
+                return (response.read(), response.headers)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and meta is not None:
+                return None
+            raise
+
+    def __getCacheFiles(self, url):
+        name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return (os.path.join(self.__cacheDir, name), os.path.join(self.__cacheDir, name + ".json"))
+
+    def __loadMeta(self, metaFile, url):
+        try:
+            with open(metaFile, "r") as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('url') == url else None
+
+    def __readData(self, dataFile):
+        try:
+            with open(dataFile, "rb") as fh:
+                return fh.read()
+        except OSError:
+            return None
+
+    def __store(self, dataFile, metaFile, url, data, etag, lastModified):
+        os.makedirs(self.__cacheDir, exist_ok=True)
+        # the data is written first, so a meta file always describes complete data
+        self.__writeAtomic(dataFile, data)
+        self.__writeAtomic(metaFile, json.dumps({
+            'url': url,
+            'etag': etag,
+            'lastModified': lastModified
+        }, indent=1, sort_keys=True).encode('utf-8'))
+
+    def __writeAtomic(self, path, data):
+        fd, tmpFile = tempfile.mkstemp(dir=self.__cacheDir)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            os.replace(tmpFile, path)
+        except Exception:
+            os.remove(tmpFile)
+            raise
+
+
+__caches = dict()
+__lock = threading.Lock()
+
+
+def getInfoFileCache(cwd):
+    '''
+        Returns the InfoFileCache of the project in `cwd`. The cache is created on first
+        use and then shared by all callers using the same `cwd`. The cache folder is
+        only created when the first info file is stored.
+    '''
+    cacheDir = getCacheDir("infofiles", cwd=cwd)
+    with __lock:
+        cache = __caches.get(cacheDir)
+        if not cache:
+            cache = InfoFileCache(cacheDir)
+            __caches[cacheDir] = cache
+        return cache
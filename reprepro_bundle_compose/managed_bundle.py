@@ -19,11 +19,12 @@
 ##########################################################################
 import os
 import re
-import tempfile
+import hashlib
 import logging
 import apt_pkg
-from apt_repos import RepositoryScanner
 from reprepro_bundle_compose.bundle_status import BundleStatus
+from reprepro_bundle import PROJECT_DIR
+from reprepro_bundle_compose.info_file_cache import getInfoFileCache
 from urllib.parse import urljoin, urlparse
 
 logger = logging.getLogger(__name__)
@@ -43,10 +44,15 @@ class ManagedBundle:
         and to modify single aspekts of the TagSection. It also provided methods to access information
         from the corresponding RepoSuite-object.
     '''
-    BUNDLE_KEYS = [ "ID", "Status", "Target", "Trac", "Ignores" ]
+    BUNDLE_KEYS = [ "ID", "Status", "Target", "Trac", "Ignores", "Subject", "Creator", "BasedOn", "InfoHash" ]
+    SUMMARY_KEYS = [ "Subject", "Creator", "BasedOn", "InfoHash" ]
 
-    def __init__(self, tagSection, repoSuite=None):
+    def __init__(self, tagSection, repoSuite=None, cwd=PROJECT_DIR):
         self.__repoSuite = repoSuite
+        self.__cwd = cwd
+        self.__info = None
+        self.__infoHash = None
+        self.__summary = dict()
         if tagSection:
             self.__tagSection = tagSection
             self.__id = tagSection['ID']
@@ -54,6 +60,7 @@ class ManagedBundle:
             self.__target = tagSection['Target']
             self.__trac = tagSection.get('Trac', None)
             self.__ignores = str(tagSection.get('Ignores') or "").split(" ")
+            self.__summary = { key: tagSection[key] for key in self.SUMMARY_KEYS if tagSection.get(key) }
         elif repoSuite:
             self.__id = repoSuite.getSuiteName()
             self.__tagSection = apt_pkg.TagSection("ID: {}\n".format(self.__id))
@@ -68,27 +75,84 @@ class ManagedBundle:
     def getInfo(self):
         '''
             This returns a dict with the content of the bundle's info-file
-            or None if the info file could not be read.
+            or an empty dict if the info file could not be read. A successfully
+            read info file is read only once per ManagedBundle and RepoSuite,
+            a failed read is retried on the next call.
+        '''
+        if self.__info is None:
+            self.__info = self.__readInfo()
+            if self.__info is None:
+                return dict()
+        return self.__info
+
+    def __readInfo(self):
+        '''
+            Returns a dict with the content of the bundle's info-file or None if
+            the info file could not be read.
         '''
         res = dict()
         if not self.__repoSuite:
             if self.getStatus() != BundleStatus.DROPPED:
                 logger.warning("Could not read info file of {} as it's apt-repos suite could not be found.".format(self.__id))
-            return res
+            return None
         url = self.getInfoFileUrl()
         try:
-            data = RepositoryScanner.getFromURL(url)
-            with tempfile.TemporaryFile() as fp:
-                fp.write(data)
-                fp.seek(0)
-                with apt_pkg.TagFile(fp) as tagfile:
-                    tagfile.step()
-                    for key in tagfile.section.keys():
-                        res[key] = self.__unescapeMultiline(tagfile.section[key])
-                return res
+            data = getInfoFileCache(self.__cwd).get(url, immutable=self.isSealed())
+            section = apt_pkg.TagSection(self.__getFirstSection(data.decode('utf-8')))
+            for key in section.keys():
+                res[key] = self.__unescapeMultiline(section[key])
+            self.__infoHash = hashlib.sha256(data).hexdigest()
+            return res
         except Exception as e:
             logger.warning("Could not read info file of {}\n{}".format(self.__id, e))
-        return res
+        return None
+
+    def getInfoSummary(self):
+        '''
+            Returns a dict with the (optional) keys 'Subject' (the first line of the Releasenotes),
+            'Creator' and 'BasedOn' of the bundle's info file. The summary stored in the `bundles`
+            file is used if available (see updateInfoSummary()), so the info file is only read
+            for bundles without a stored summary.
+        '''
+        summary = self.__summary if self.hasInfoSummary() else self.__summarize(self.getInfo())
+        return { key: value for key, value in summary.items() if key != "InfoHash" }
+
+    def hasInfoSummary(self):
+        return "InfoHash" in self.__summary
+
+    def updateInfoSummary(self):
+        '''
+            Updates the summary of the bundle's info file that is stored in the `bundles` file
+            if the info file changed (by means of it's sha256 checksum). The info file of sealed
+            bundles with a stored summary is not read again. Returns True if the summary changed.
+        '''
+        if self.isSealed() and self.hasInfoSummary():
+            return False
+        info = self.getInfo()
+        if not self.__infoHash or self.__infoHash == self.__summary.get("InfoHash"):
+            return False
+        self.__summary = self.__summarize(info)
+        self.__summary["InfoHash"] = self.__infoHash
+        return True
+
+    def __summarize(self, info):
+        summary = {
+            "Subject": info.get("Releasenotes", "").split("\n", 1)[0].strip(),
+            "Creator": info.get("Creator", "").strip(),
+            "BasedOn": info.get("BasedOn", "").strip()
+        }
+        return { key: value for key, value in summary.items() if value }
+
+    def isSealed(self):
+        '''
+            Returns True if the bundle is sealed (it's status is beyond STAGING),
+            which means that it's info file doesn't change anymore.
+        '''
+        return self.getStatus() > BundleStatus.STAGING
+
+    def __getFirstSection(self, text):
+        section = text.lstrip("\n").split("\n\n", 1)[0]
+        return section.rstrip("\n") + "\n"
 
     def __unescapeMultiline(self, value):
         lines = list()
@@ -111,6 +175,14 @@ class ManagedBundle:
                "bundle-dist.{}".format(self.getAptSuite()) in tags and \
                "bundle-target.{}".format(self.getTarget()) in tags
 
+    def getTargetKey(self):
+        '''
+            Returns the tuple (stage, dist, target) of tag values a target suite has to define
+            (as tags "bundle-stage.<stage>", "bundle-dist.<dist>" and "bundle-target.<target>")
+            for the bundle to be supposed for the target (see isSupposedForTarget()).
+        '''
+        return ("{}".format(self.getStatus().getStage()), "{}".format(self.getAptSuite()), "{}".format(self.getTarget()))
+
     def getID(self):
         return self.__id
 
@@ -151,6 +223,7 @@ class ManagedBundle:
 
     def setRepoSuite(self, repoSuite):
         self.__repoSuite = repoSuite
+        self.__info = None
 
     def setStatus(self, status):
         self.__status = status
@@ -181,6 +254,8 @@ class ManagedBundle:
             changeset.append(('Ignores', " ".join(self.__ignores)))
         else:
             changeset.append(('Ignores', None))
+        for key in self.SUMMARY_KEYS:
+            changeset.append((key, self.__summary.get(key)))
         return apt_pkg.rewrite_section(self.__tagSection, self.BUNDLE_KEYS, changeset)
 
     def __str__(self):
@@ -0,0 +1,152 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import apt_pkg
+from functools import cmp_to_key
+
+logger = logging.getLogger(__name__)
+
+PACKAGE_INDEX_FILE = "binary-packages.json"
+
+
+class BinaryPackageIndex:
+    '''
+        A persistent inverted index that maps binary package names to the list of
+        entries [version, suite, bundleId] of all bundles providing the package.
+        For each bundle the index remembers the checksum of the Release file the
+        entries were queried for, so a bundle needs to be queried again only if
+        it's Release file changed (see isCurrent()).
+
+        The index is stored as json file in `cacheDir`.
+    '''
+    def __init__(self, cacheDir):
+        self.__cacheDir = cacheDir
+        self.__indexFile = os.path.join(cacheDir, PACKAGE_INDEX_FILE)
+        self.__bundles = dict() # maps bundleId -> {'release': checksum, 'names': [name, ...]}
+        self.__packages = dict() # maps name -> list of [version, suite, bundleId]
+        try:
+            with open(self.__indexFile, "r") as fh:
+                index = json.load(fh)
+            self.__bundles = index['bundles']
+            self.__packages = index['packages']
+        except (OSError, ValueError, KeyError) as e:
+            logger.debug("No usable binary package index {}: {}".format(self.__indexFile, e))
+
+    def getCacheDir(self):
+        return self.__cacheDir
+
+    def isCurrent(self, bundleId, releaseFile):
+        '''
+            Returns True if the entries of `bundleId` were queried for the current
+            content of `releaseFile` (which might be None if it is unknown).
+        '''
+        entry = self.__bundles.get(bundleId)
+        if entry is None or releaseFile is None:
+            return False
+        checksum = _checksum(releaseFile)
+        return checksum is not None and entry.get('release') == checksum
+
+    def update(self, bundleId, releaseFile, packages):
+        '''
+            Replaces the entries of `bundleId` by `packages`, a list of tuples
+            (name, version, suite), queried for the current content of `releaseFile`.
+        '''
+        self.remove(bundleId)
+        names = set()
+        for (name, version, suite) in packages:
+            self.__packages.setdefault(name, list()).append([version, suite, bundleId])
+            names.add(name)
+        self.__bundles[bundleId] = {
+            'release': _checksum(releaseFile) if releaseFile else None,
+            'names': sorted(names)
+        }
+
+    def remove(self, bundleId):
+        entry = self.__bundles.pop(bundleId, None)
+        if not entry:
+            return
+        for name in entry['names']:
+            entries = [e for e in self.__packages.get(name, list()) if e[2] != bundleId]
+            if entries:
+                self.__packages[name] = entries
+            else:
+                self.__packages.pop(name, None)
+
+    def retain(self, bundleIds):
+        '''
+            Removes all bundles from the index that are not contained in `bundleIds`.
+        '''
+        for bundleId in set(self.__bundles.keys()).difference(bundleIds):
+            self.remove(bundleId)
+
+    def getDependencies(self):
+        '''
+            Returns the list of dependencies [suite, otherSuite] between the suites that
+            share a binary package. For each binary package a suite depends on all suites
+            that provide the package with a lower version (or the same version and a
+            lower suite name).
+        '''
+        res = list()
+        known = set()
+        for name in sorted(self.__packages.keys()):
+            entries = self.__packages[name]
+            if len(entries) < 2:
+                continue
+            previous = list()
+            for (unused_version, suite, unused_bundleId) in sorted(entries, key=cmp_to_key(_compareEntries)):
+                for dep in previous:
+                    if not (suite, dep) in known:
+                        known.add((suite, dep))
+                        res.append([suite, dep])
+                previous.append(suite)
+        return res
+
+    def store(self):
+        os.makedirs(self.__cacheDir, exist_ok=True)
+        fd, tmpFile = tempfile.mkstemp(dir=self.__cacheDir)
+        try:
+            with os.fdopen(fd, "w") as out:
+                json.dump({ 'bundles': self.__bundles, 'packages': self.__packages }, out, sort_keys=True)
+            os.replace(tmpFile, self.__indexFile)
+        except Exception:
+            os.remove(tmpFile)
+            raise
+
+
+def _compareEntries(a, b):
+    res = apt_pkg.version_compare(a[0], b[0])
+    if res != 0:
+        return res
+    return (a[1] > b[1]) - (a[1] < b[1])
+
+
+def _checksum(filename):
+    sha = hashlib.sha256()
+    try:
+        with open(filename, "rb") as fh:
+            for chunk in iter(lambda: fh.read(65536), b""):
+                sha.update(chunk)
+    except OSError:
+        return None
+    return sha.hexdigest()
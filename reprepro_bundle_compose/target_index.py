@@ -0,0 +1,153 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import logging
+import itertools
+import apt_repos
+from reprepro_bundle.key_ids import getPublicKeyIDs
+
+logger = logging.getLogger(__name__)
+
+
+class TargetIndex:
+    '''
+        This class indexes the target suites (apt_repos.RepoSuite objects of all
+        "bundle-compose-target:" suites) by repository url and by the values of their
+        "bundle-stage.*", "bundle-dist.*", "bundle-target.*" and "base-dist.*" tags.
+        It is created once (e.g. per `bundle-compose apply`), so the apt-repos
+        suite resolution and the parsing of tags doesn't happen again for each
+        stage, repository or target.
+    '''
+    def __init__(self, targets):
+        '''
+            `targets` is a dict of suiteName to RepoSuite as returned by getTargetRepoSuites().
+        '''
+        self.__targets = dict(targets)
+        self.__byUrl = dict() # maps repoUrl -> list of targets
+        self.__tags = dict() # maps suiteName -> tag prefix -> list of tag values
+        self.__bundleBaseSuites = dict() # maps baseDist -> list of bundle-base suites
+        self.__keyIds = dict() # maps trusted gpg file -> sorted list of key IDs
+        for _, target in sorted(self.__targets.items()):
+            self.__byUrl.setdefault(target.getRepoUrl(), list()).append(target)
+            tags = dict()
+            for tag in target.getTags():
+                (prefix, sep, value) = tag.partition(".")
+                if sep:
+                    tags.setdefault(prefix, list()).append(value)
+            self.__tags[target.getSuiteName()] = tags
+
+    def getTargets(self, stage=None):
+        '''
+            Returns a dict of suiteName to RepoSuite of all targets or, if `stage` is
+            specified, of the targets having the tag "bundle-stage.<stage>".
+        '''
+        if not stage:
+            return dict(self.__targets)
+        return { name: target for name, target in self.__targets.items() if stage in self.getStages(target) }
+
+    def getRepoUrls(self, stages):
+        '''
+            Returns the set of repository urls of all targets in any of the `stages`.
+        '''
+        res = set()
+        for stage in sorted(stages):
+            targets = self.getTargets(stage)
+            logger.info("Found {} targets for stage '{}'".format(len(targets), stage))
+            for _, target in sorted(targets.items()):
+                logger.debug("Adding target {} with Url {}".format(target, target.getRepoUrl()))
+                res.add(target.getRepoUrl())
+        return res
+
+    def getTargetsForUrl(self, url):
+        '''
+            Returns the (sorted) list of all targets provided by the repository `url`.
+        '''
+        return list(self.__byUrl.get(url, list()))
+
+    def getStages(self, target):
+        return self.__getTagValues(target, "bundle-stage")
+
+    def getBundleDists(self, target):
+        return self.__getTagValues(target, "bundle-dist")
+
+    def getBundleTargets(self, target):
+        return self.__getTagValues(target, "bundle-target")
+
+    def getBaseDist(self, target):
+        '''
+            Returns the base-dist defined for the supplied target or None, if there is
+            is no base-dist defined for the target. The base-dist is
+            * either the {value} defined by a "base-dist.{value}"-tag (if defined) or
+            * the {value} defined by a "bundle-dist.{value}"-tag (as fallback).
+        '''
+        baseDists = self.__getTagValues(target, "base-dist")
+        bundleDists = self.getBundleDists(target)
+        if baseDists and baseDists[-1]:
+            return baseDists[-1]
+        return bundleDists[-1] if bundleDists else None
+
+    def getBundleBaseSuites(self, baseDist):
+        '''
+            Returns the sorted list of "bundle-base.<baseDist>:" suites. The suites are
+            resolved only once per baseDist.
+        '''
+        suites = self.__bundleBaseSuites.get(baseDist)
+        if suites is None:
+            suites = sorted(apt_repos.getSuites(["bundle-base.{}:".format(baseDist)]))
+            self.__bundleBaseSuites[baseDist] = suites
+        return suites
+
+    def getBundlesForTarget(self, target, bundleIndex):
+        '''
+            Returns the list of ManagedBundles (sorted by ID) that are supposed to be contained
+            in `target` (see ManagedBundle.isSupposedForTarget()). `bundleIndex` is the result of
+            indexBundles(), so only the bundles matching one of the target's (stage, dist, target)
+            combinations are visited instead of all bundles.
+        '''
+        res = dict()
+        for key in itertools.product(self.getStages(target), self.getBundleDists(target), self.getBundleTargets(target)):
+            for (bid, bundle) in bundleIndex.get(key, list()):
+                res[bid] = bundle
+        return [bundle for (_, bundle) in sorted(res.items())]
+
+    def getPublicKeyIDs(self, suite):
+        '''
+            Returns the sorted list of key IDs of the trusted gpg file of the RepoSuite `suite`.
+            The key IDs are determined only once per gpg file.
+        '''
+        gpgFile = suite.getTrustedGPGFile()
+        keyIds = self.__keyIds.get(gpgFile)
+        if keyIds is None:
+            keyIds = sorted(getPublicKeyIDs(gpgFile))
+            self.__keyIds[gpgFile] = keyIds
+        return keyIds
+
+    def __getTagValues(self, target, prefix):
+        return self.__tags.get(target.getSuiteName(), dict()).get(prefix, list())
+
+
+def indexBundles(bundles):
+    '''
+        Returns a dict that maps each (stage, dist, target) tuple (see ManagedBundle.getTargetKey())
+        to the list of tuples (bid, bundle) for the dict `bundles` of bid to ManagedBundle.
+    '''
+    res = dict()
+    for (bid, bundle) in sorted(bundles.items()):
+        res.setdefault(bundle.getTargetKey(), list()).append((bid, bundle))
+    return res
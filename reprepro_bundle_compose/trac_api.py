@@ -17,12 +17,114 @@
 # along with this program. If not, see
 # https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
 ##########################################################################
-from xmlrpc.client import ServerProxy, ProtocolError
+from xmlrpc.client import ServerProxy, ProtocolError, MultiCall, SafeTransport, DateTime
 from urllib.parse import urljoin, urlparse, urlunparse, quote
+import http.client
+import email.utils
+import threading
 import getpass
 
+MULTICALL_BATCH_SIZE = 100
+DEFAULT_POOL_SIZE = 4
+
+
+class TracConnectionError(Exception):
+    '''
+        Raised if the first request to trac fails, which means that the connection
+        to trac (or the authentication) doesn't work at all.
+    '''
+    pass
+
+
+class KeepAliveTransport(SafeTransport):
+    '''
+        A xmlrpc transport for http and https that keeps the HTTP/1.1 connections alive
+        and reuses them for subsequent requests instead of doing a new TCP (and TLS)
+        handshake for each request. Up to `poolSize` idle connections per host are kept
+        in a pool, so the transport can also be used by several threads. If `compress`
+        is True, the server is asked for gzip compressed responses.
+    '''
+    def __init__(self, https=True, poolSize=DEFAULT_POOL_SIZE, compress=True):
+        super().__init__()
+        self.__https = https
+        self.__poolSize = poolSize
+        self.__idle = dict() # maps host -> list of idle connections
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.accept_gzip_encoding = compress
+
+    def single_request(self, host, handler, request_body, verbose=False):
+        self.__local.connection = self.__acquire(host)
+        try:
+            return super().single_request(host, handler, request_body, verbose)
+        except ProtocolError:
+            # the state of the connection is unknown after an error response
+            self.close()
+            raise
+        finally:
+            connection = self.__local.connection
+            self.__local.connection = None
+            if connection:
+                self.__release(host, connection)
+
+    def parse_response(self, response):
+        self.__local.date = response.getheader('Date')
+        return super().parse_response(response)
+
+    def getLastResponseDate(self):
+        '''
+            Returns the value of the Date header of the last response received by the
+            current thread or None.
+        '''
+        return getattr(self.__local, 'date', None)
+
+    def make_connection(self, host):
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None:
+            connection = self.__acquire(host)
+            self.__local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self.__local, 'connection', None)
+        if connection:
+            # called by single_request on errors: drop the connection in use
+            self.__local.connection = None
+            connection.close()
+            return
+        with self.__lock:
+            idle = [c for connections in self.__idle.values() for c in connections]
+            self.__idle.clear()
+        for connection in idle:
+            connection.close()
+
+    def __acquire(self, host):
+        chost, self._extra_headers, x509 = self.get_host_info(host)
+        with self.__lock:
+            connections = self.__idle.get(chost)
+            if connections:
+                return connections.pop()
+        if self.__https:
+            return http.client.HTTPSConnection(chost, None, context=self.context, **(x509 or {}))
+        return http.client.HTTPConnection(chost)
+
+    def __release(self, host, connection):
+        chost, unused_headers, unused_x509 = self.get_host_info(host)
+        with self.__lock:
+            connections = self.__idle.setdefault(chost, list())
+            if len(connections) < self.__poolSize:
+                connections.append(connection)
+                return
+        connection.close()
+
+
 class TracApi:
-    def __init__(self, tracUrl, user=None, passwd=None):
+    '''
+        Access to trac's xmlrpc api using a KeepAliveTransport. The connection is not
+        checked on construction: the first request serves as check and raises a
+        TracConnectionError if it fails.
+    '''
+    def __init__(self, tracUrl, user=None, passwd=None, poolSize=DEFAULT_POOL_SIZE, compress=True):
         if not tracUrl.endswith("/"):
             tracUrl += "/"
         self.__tracUrl = tracUrl
@@ -37,26 +139,70 @@ class TracApi:
         url = urlparse(tracUrl)
         userinfo = "{}:{}".format(user, passwd)
         proxyurl = "".join([quote(url.scheme), '://', quote(userinfo), '@', quote(url.netloc), quote(url.path + "login/rpc")])
-        self.server = ServerProxy(proxyurl)
-        # ensure the connection works
-        try:
-            self.getTicket(1)
-        except ProtocolError as e:
-            raise Exception("Failed to read from trac: {}".format(e.errmsg))
+        self.server = ServerProxy(proxyurl, transport=KeepAliveTransport(url.scheme == "https", poolSize, compress))
+        self.__connected = False
 
     def getTracUrl(self):
         return self.__tracUrl
 
     def createTicket(self, title, text, args):
-        return self.server.ticket.create(title, text, args)
+        return self.__call(self.server.ticket.create, title, text, args)
 
     def getTicket(self, id):
-        return self.server.ticket.get(id)
+        return self.__call(self.server.ticket.get, id)
 
     def getTicketValues(self, id):
         (unused_id, unused_time_created, unused_time_changed, values) = self.getTicket(id)
         return values
 
+    def getTickets(self, ids, batchSize=MULTICALL_BATCH_SIZE):
+        '''
+            Returns a dict of id to ticket (as returned by getTicket) for all tickets `ids`.
+            The tickets are fetched in batches of `batchSize` tickets per request using
+            trac's system.multicall.
+        '''
+        res = dict()
+        for batch in _batches(list(ids), batchSize):
+            multicall = MultiCall(self.server)
+            for id in batch:
+                multicall.ticket.get(id)
+            for id, ticket in zip(batch, self.__call(multicall)):
+                res[id] = ticket
+        return res
+
+    def getTicketsValues(self, ids, batchSize=MULTICALL_BATCH_SIZE):
+        '''
+            Returns a dict of id to ticket values for all tickets `ids` (see getTickets).
+        '''
+        return { id: values for id, (unused_id, unused_time_created, unused_time_changed, values) in self.getTickets(ids, batchSize).items() }
+
+    def getRecentChanges(self, since):
+        '''
+            Returns the list of ids of all tickets changed at or after `since`, which is
+            an xmlrpc DateTime value string (like "20181231T23:59:59") in trac's time.
+        '''
+        return self.__call(self.server.ticket.getRecentChanges, DateTime(since))
+
+    def checkConnection(self):
+        '''
+            Sends a cheap request (system.getAPIVersion) to trac. Raises a TracConnectionError
+            if it is the first request and it fails. Returns the time trac reported in the
+            response (see getServerTime()).
+        '''
+        self.__call(self.server.system.getAPIVersion)
+        return self.getServerTime()
+
+    def getServerTime(self):
+        '''
+            Returns the time (as timezone aware datetime) trac reported in the Date header
+            of the last response received by the current thread or None if unknown.
+        '''
+        date = self.server('transport').getLastResponseDate()
+        try:
+            return email.utils.parsedate_to_datetime(date) if date else None
+        except (TypeError, ValueError):
+            return None
+
     def getTicketStatus(self, id):
         values = self.getTicketValues(id)
         return values['status']
@@ -70,4 +216,39 @@ class TracApi:
         return values['summary']
 
     def updateTicket(self, id, comment="", args=dict()):
-        return self.server.ticket.update(int(id), comment, args)
+        return self.__call(self.server.ticket.update, int(id), comment, args)
+
+    def updateTickets(self, updates, batchSize=MULTICALL_BATCH_SIZE):
+        '''
+            Performs all `updates` (a list of tuples (id, comment, args) with the same meaning
+            as the parameters of updateTicket) in the given order in batches of `batchSize`
+            updates per request using trac's system.multicall. Returns the list of results.
+        '''
+        res = list()
+        for batch in _batches(list(updates), batchSize):
+            multicall = MultiCall(self.server)
+            for (id, comment, args) in batch:
+                multicall.ticket.update(int(id), comment, args)
+            res.extend(self.__call(multicall))
+        return res
+
+    def close(self):
+        self.server('close')()
+
+    def __call(self, func, *args):
+        '''
+            Calls `func(*args)`. The first call also checks if the connection to trac works.
+        '''
+        if self.__connected:
+            return func(*args)
+        try:
+            res = func(*args)
+        except (ProtocolError, OSError) as e:
+            raise TracConnectionError("Failed to read from trac: {}".format(e.errmsg if isinstance(e, ProtocolError) else e))
+        self.__connected = True
+        return res
+
+
+def _batches(items, batchSize):
+    for i in range(0, len(items), max(1, batchSize)):
+        yield items[i:i + max(1, batchSize)]
@@ -0,0 +1,100 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import json
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+TRAC_SYNC_STATE_FILE = "trac-sync.json"
+
+
+class TracSyncState:
+    '''
+        The local state of the last synchronization with a trac instance: the high-water
+        mark `since` (trac's time at the start of the last synchronization minus a safety
+        overlap, as an xmlrpc DateTime value) and for each synchronized ticket the bundle
+        status and target it was left in sync with. A ticket needs to be synchronized
+        again only if it changed in trac since then (see ticket.getRecentChanges) or if
+        the status or target of it's bundle changed locally.
+
+        The state is stored as json file in `cacheDir`. A state recorded for a different
+        trac url is ignored.
+    '''
+    def __init__(self, cacheDir, tracUrl):
+        self.__cacheDir = cacheDir
+        self.__cacheFile = os.path.join(cacheDir, TRAC_SYNC_STATE_FILE)
+        self.__tracUrl = tracUrl
+        self.__since = None
+        self.__tickets = dict() # maps str(tid) -> [status, target]
+        try:
+            with open(self.__cacheFile, "r") as fh:
+                state = json.load(fh)
+            if state.get('tracUrl') == tracUrl:
+                self.__since = state.get('since')
+                self.__tickets = state.get('tickets', dict())
+        except (OSError, ValueError) as e:
+            logger.debug("No usable trac sync state {}: {}".format(self.__cacheFile, e))
+
+    def getSince(self):
+        '''
+            Returns the high-water mark of the last synchronization or None if the
+            next synchronization has to be a full synchronization.
+        '''
+        return self.__since
+
+    def isInSync(self, bundle):
+        '''
+            Returns True if `bundle` was left in sync with it's ticket by the last
+            synchronization and it's status and target didn't change since then.
+        '''
+        return self.__tickets.get(str(bundle.getTrac())) == [str(bundle.getStatus()), bundle.getTarget()]
+
+    def update(self, since, bundles):
+        '''
+            Moves the high-water mark to `since` (if it is later than the current mark)
+            and records the ManagedBundles `bundles` as being in sync with their tickets.
+        '''
+        if since and (not self.__since or since > self.__since):
+            self.__since = since
+        for bundle in bundles:
+            self.__tickets[str(bundle.getTrac())] = [str(bundle.getStatus()), bundle.getTarget()]
+
+    def forget(self, bundle):
+        '''
+            Removes `bundle` from the bundles in sync, so it is checked again next time.
+        '''
+        self.__tickets.pop(str(bundle.getTrac()), None)
+
+    def store(self):
+        os.makedirs(self.__cacheDir, exist_ok=True)
+        fd, tmpFile = tempfile.mkstemp(dir=self.__cacheDir)
+        try:
+            with os.fdopen(fd, "w") as out:
+                json.dump({
+                    'tracUrl': self.__tracUrl,
+                    'since': self.__since,
+                    'tickets': self.__tickets
+                }, out, indent=1, sort_keys=True)
+            os.replace(tmpFile, self.__cacheFile)
+        except Exception:
+            os.remove(tmpFile)
+            raise
@@ -38,6 +38,11 @@ function bundle_10_edit_cancel {
   cancel "$1"
 }
 
+function bundle_10l_edit_low_memory {
+  # the sources_control.list is written in low memory mode - the bundle must not change
+  cancel "$1"
+}
+
 function bundle_11_meta_cancel {
   cat "$1" >repo/editor.in
   cancel "$1"
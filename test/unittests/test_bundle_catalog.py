@@ -0,0 +1,115 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from reprepro_bundle import bundle_catalog
+from reprepro_bundle.bundle import Bundle
+from reprepro_bundle.bundle_catalog import BundleCatalog
+
+
+class TestBundleCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.writeBundle("mybionic/0001", "Target: standard\nCreator: someone\nReleasenotes: first line\n more\n")
+        self.writeBundle("mybionic/0002", "Target: unattended\nRollout: true\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def writeBundle(self, bundleName, info, readOnly=False):
+        confDir = os.path.join(self.tmpDir, "repo", "bundle", bundleName, "conf")
+        os.makedirs(confDir, exist_ok=True)
+        with open(os.path.join(confDir, "distributions"), "w") as out:
+            out.write("Codename: bundle/{}\n".format(bundleName))
+            if readOnly:
+                out.write("ReadOnly: Yes\n")
+        return self.writeInfo(bundleName, info)
+
+    def writeInfo(self, bundleName, info):
+        infoFile = os.path.join(self.tmpDir, "repo", "bundle", bundleName, "conf", "info")
+        with open(infoFile, "w") as out:
+            out.write(info)
+        return infoFile
+
+    def getEntries(self):
+        '''
+            Returns the tuple (entries, names of the bundles created from their files)
+        '''
+        with mock.patch.object(bundle_catalog, "Bundle", wraps=Bundle) as created:
+            entries = BundleCatalog(cwd=self.tmpDir).getEntries()
+        return ({e.bundleName: e for e in entries}, sorted(c[0][0] for c in created.call_args_list))
+
+    def test_entries(self):
+        (entries, created) = self.getEntries()
+        self.assertEqual(["repo/bundle/mybionic/0001", "repo/bundle/mybionic/0002"], created)
+        self.assertEqual(["mybionic/0001", "mybionic/0002"], sorted(entries.keys()))
+        first = entries["mybionic/0001"]
+        self.assertEqual("mybionic", first.distribution)
+        self.assertTrue(first.isEditable())
+        self.assertEqual("first line", first.get("Subject"))
+        self.assertEqual("someone", first.get("Creator"))
+        self.assertIsNone(first.get("Rollout"))
+        self.assertEqual("true", entries["mybionic/0002"].get("Rollout"))
+
+    def test_unchanged_bundles_are_not_read_again(self):
+        self.getEntries()
+        (entries, created) = self.getEntries()
+        self.assertEqual([], created)
+        self.assertEqual("first line", entries["mybionic/0001"].get("Subject"))
+
+    def test_changed_size_invalidates_the_entry(self):
+        self.getEntries()
+        self.writeInfo("mybionic/0001", "Target: standard\nReleasenotes: changed subject\n")
+        (entries, created) = self.getEntries()
+        self.assertEqual(["repo/bundle/mybionic/0001"], created)
+        self.assertEqual("changed subject", entries["mybionic/0001"].get("Subject"))
+
+    def test_changed_mtime_invalidates_the_entry(self):
+        self.getEntries()
+        # same size, different content and mtime
+        infoFile = self.writeInfo("mybionic/0002", "Target: unattended\nRollout: TRUE\n")
+        st = os.stat(infoFile)
+        os.utime(infoFile, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+        (entries, created) = self.getEntries()
+        self.assertEqual(["repo/bundle/mybionic/0002"], created)
+        self.assertEqual("TRUE", entries["mybionic/0002"].get("Rollout"))
+
+    def test_sealed_bundle_invalidates_the_entry(self):
+        self.getEntries()
+        self.writeBundle("mybionic/0001", "Target: standard\n", readOnly=True)
+        (entries, created) = self.getEntries()
+        self.assertEqual(["repo/bundle/mybionic/0001"], created)
+        self.assertFalse(entries["mybionic/0001"].isEditable())
+
+    def test_new_and_removed_bundles(self):
+        self.getEntries()
+        self.writeBundle("myxenial/0001", "Target: standard\n")
+        shutil.rmtree(os.path.join(self.tmpDir, "repo", "bundle", "mybionic", "0002"))
+        (entries, created) = self.getEntries()
+        self.assertEqual(["repo/bundle/myxenial/0001"], created)
+        self.assertEqual(["mybionic/0001", "myxenial/0001"], sorted(entries.keys()))
+
+
+if __name__ == "__main__":
+    unittest.main()
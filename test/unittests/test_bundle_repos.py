@@ -0,0 +1,111 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import shutil
+import tempfile
+import unittest
+from reprepro_bundle.bundle import Bundle
+from reprepro_bundle.bundle_repos import BundleReposConfig
+
+# bundle.repos as written by the former updateReposConfig() for the bundles created in setUp()
+EXPECTED = """[
+ {
+    "Oid": "bundle-repositories-mybionic",
+    "Suites":
+    ["--------",
+    { "Suite": "mybionic/0001", "Url": "mybionic/0001", "Tags": [ "sealed", "rollout" ] },
+    { "Suite": "mybionic/0002", "Url": "mybionic/0002", "Tags": [ "staging" ] },
+    { "Suite": "mybionic/0010", "Url": "mybionic/0010", "Tags": [ "staging" ] },
+    "---------"]
+ },
+ {
+    "Oid": "bundle-repositories-myxenial",
+    "Suites":
+    ["--------",
+    { "Suite": "myxenial/0003", "Url": "myxenial/0003", "Tags": [ "sealed", "rollout" ] },
+    "---------"]
+ }
+]
+"""
+
+
+class TestBundleReposConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.createBundle("mybionic/0001", True, "Bundlename: mybionic/0001\nRollout: true\nTarget: standard\n")
+        self.createBundle("mybionic/0002", False, "Bundlename: mybionic/0002\nRollout: false\n")
+        self.createBundle("mybionic/0010", False, None)
+        self.createBundle("myxenial/0003", True, "Bundlename: myxenial/0003\nRollout: True\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def createBundle(self, bundleName, readOnly, info):
+        confDir = os.path.join(self.tmpDir, "repo", "bundle", bundleName, "conf")
+        os.makedirs(confDir, exist_ok=True)
+        with open(os.path.join(confDir, "distributions"), "w") as out:
+            out.write("Codename: bundle/{}\n".format(bundleName))
+            if readOnly:
+                out.write("ReadOnly: Yes\n")
+        if info is not None:
+            with open(os.path.join(confDir, "info"), "w") as out:
+                out.write(info)
+        return Bundle(bundleName, self.tmpDir)
+
+    def rebuilt(self):
+        config = BundleReposConfig(cwd=self.tmpDir)
+        config.rebuild()
+        return config
+
+    def test_rebuild_renders_like_before(self):
+        self.assertEqual(EXPECTED, self.rebuilt().render())
+
+    def test_stored_file_is_loaded(self):
+        confFile = self.rebuilt().store()
+        with open(confFile, "r") as fh:
+            self.assertEqual(EXPECTED, fh.read())
+        config = BundleReposConfig(cwd=self.tmpDir)
+        self.assertTrue(config.load())
+        self.assertEqual(self.rebuilt().getEntries(), config.getEntries())
+
+    def test_missing_file_is_not_loaded(self):
+        self.assertFalse(BundleReposConfig(cwd=self.tmpDir).load())
+
+    def test_update_bundle_equals_rebuild(self):
+        self.rebuilt().store()
+        config = BundleReposConfig(cwd=self.tmpDir)
+        config.load()
+        self.assertFalse(config.updateBundle(Bundle("mybionic/0002", self.tmpDir)))
+        # seal and roll out an existing bundle, add new bundles at the start, in between and at the end
+        bundles = [
+            self.createBundle("mybionic/0002", True, "Bundlename: mybionic/0002\nRollout: true\n"),
+            self.createBundle("myartful/0001", False, None),
+            self.createBundle("mybionic/0005", False, "Rollout: false\n"),
+            self.createBundle("myzesty/0001", True, None)
+        ]
+        for bundle in bundles:
+            self.assertTrue(config.updateBundle(bundle))
+        self.assertEqual(self.rebuilt().render(), config.render())
+        self.assertIn('{ "Suite": "mybionic/0002", "Url": "mybionic/0002", "Tags": [ "sealed", "rollout" ] },', config.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import shutil
+import tempfile
+import unittest
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from reprepro_bundle.git_mirror import GitMirror, reserveBundleId, releaseBundleId
+
+GIT_ENV = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@localhost",
+               GIT_COMMITTER_NAME="test", GIT_COMMITTER_EMAIL="test@localhost")
+
+
+def git(*args, cwd=None):
+    return subprocess.check_output(('git',) + args, cwd=cwd, env=GIT_ENV, stderr=subprocess.DEVNULL).decode("utf-8")
+
+
+class TestBundleIdReservation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.origin = os.path.join(self.tmpDir, "origin.git")
+        self.work = os.path.join(self.tmpDir, "work")
+        git('init', '--quiet', '--bare', self.origin)
+        git('init', '--quiet', self.work)
+        self.pushBundle("mybionic/0001")
+
+    def pushBundle(self, bundleName):
+        os.makedirs(os.path.join(self.work, "repo", "bundle", bundleName))
+        with open(os.path.join(self.work, "repo", "bundle", bundleName, "info"), "w") as fh:
+            fh.write("Rollout: false\n")
+        git('add', 'repo', cwd=self.work)
+        git('commit', '--quiet', '-m', 'bundle ' + bundleName, cwd=self.work)
+        git('push', '--quiet', self.origin, 'HEAD:refs/heads/master', cwd=self.work)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def createMirror(self, name):
+        mirror = GitMirror(self.origin, os.path.join(self.tmpDir, name))
+        mirror.update()
+        return mirror
+
+    def remoteReservations(self):
+        return sorted(line.split("\t")[1] for line in git('ls-remote', self.origin, 'refs/bundle-ids/*').splitlines())
+
+    def test_concurrent_reservations_get_different_ids(self):
+        mirrors = [self.createMirror("mirror-{}".format(i)) for i in range(4)]
+        with ThreadPoolExecutor(max_workers=len(mirrors)) as executor:
+            ids = list(executor.map(lambda m: reserveBundleId(m, "mybionic", "master"), mirrors))
+        self.assertEqual([2, 3, 4, 5], sorted(ids))
+        self.assertEqual(["refs/bundle-ids/mybionic/{}".format(i) for i in (2, 3, 4, 5)], self.remoteReservations())
+
+    def test_reservations_from_stale_mirrors(self):
+        mirrorA = self.createMirror("mirror-a")
+        mirrorB = self.createMirror("mirror-b")
+        self.assertEqual(2, reserveBundleId(mirrorA, "mybionic", "master"))
+        self.assertEqual(3, reserveBundleId(mirrorB, "mybionic", "master"))
+
+    def test_repeated_reservation_without_fetch(self):
+        mirror = self.createMirror("mirror")
+        self.assertEqual(2, reserveBundleId(mirror, "mybionic", "master"))
+        self.assertEqual(3, reserveBundleId(mirror, "mybionic", "master"))
+        self.assertEqual(1, reserveBundleId(mirror, "other", "master"))
+
+    def test_released_id_is_taken_from_the_pushed_bundle(self):
+        mirrorA = self.createMirror("mirror-a")
+        mirrorB = self.createMirror("mirror-b")
+        self.assertEqual(2, reserveBundleId(mirrorA, "mybionic", "master"))
+        self.pushBundle("mybionic/0002")
+        releaseBundleId(mirrorA, "mybionic", 2)
+        self.assertEqual([], self.remoteReservations())
+        # mirrorB didn't fetch bundle 0002 yet and there is no reservation ref for it anymore
+        self.assertEqual(3, reserveBundleId(mirrorB, "mybionic", "master"))
+        self.assertEqual(["refs/bundle-ids/mybionic/3"], self.remoteReservations())
+
+    def test_rejected_push_is_not_an_existing_id(self):
+        mirror = self.createMirror("mirror")
+        hook = os.path.join(self.origin, "hooks", "pre-receive")
+        with open(hook, "w") as fh:
+            fh.write("#!/bin/sh\necho 'only refs/heads allowed' >&2\nexit 1\n")
+        os.chmod(hook, 0o755)
+        with self.assertRaises(subprocess.CalledProcessError):
+            reserveBundleId(mirror, "mybionic", "master")
+        self.assertEqual([], self.remoteReservations())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import urllib.error
+from unittest import mock
+from reprepro_bundle_compose import info_file_cache
+from reprepro_bundle_compose.info_file_cache import InfoFileCache, getInfoFileCache
+
+URL = "http://example.com/bundle/mybionic/0001/conf/info"
+INFO = b"Bundlename: mybionic/0001\nTarget: standard\n"
+
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, data, headers):
+        super().__init__(data)
+        self.headers = headers
+
+
+class FakeServer:
+    '''
+        Answers the requests to urlopen with the `responses` (either a tuple (data, headers)
+        or an exception) and records the conditional headers of each request.
+    '''
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = list()
+
+    def urlopen(self, req, timeout):
+        self.requests.append((req.get_header('If-none-match'), req.get_header('If-modified-since')))
+        res = self.responses.pop(0)
+        if isinstance(res, Exception):
+            raise res
+        return FakeResponse(*res)
+
+
+def notModified():
+    return urllib.error.HTTPError(URL, 304, "Not Modified", {}, None)
+
+
+class TestInfoFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.cache = InfoFileCache(os.path.join(self.tmpDir, "infofiles"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def get(self, server, immutable=False):
+        with mock.patch.object(info_file_cache.urllib.request, "urlopen", server.urlopen):
+            return self.cache.get(URL, immutable)
+
+    def test_cached_file_is_revalidated(self):
+        server = FakeServer((INFO, {'ETag': '"1"', 'Last-Modified': 'Mon, 01 Jan 2018 00:00:00 GMT'}), notModified())
+        self.assertEqual(INFO, self.get(server))
+        self.assertEqual(INFO, self.get(server))
+        self.assertEqual([(None, None), ('"1"', 'Mon, 01 Jan 2018 00:00:00 GMT')], server.requests)
+
+    def test_changed_file_replaces_the_cached_file(self):
+        changed = INFO + b"Rollout: true\n"
+        server = FakeServer((INFO, {'ETag': '"1"'}), (changed, {'ETag': '"2"'}), notModified())
+        self.assertEqual(INFO, self.get(server))
+        self.assertEqual(changed, self.get(server))
+        self.assertEqual(changed, self.get(server))
+        self.assertEqual(['"2"'], [etag for (etag, _) in server.requests[2:]])
+
+    def test_immutable_file_is_not_requested_again(self):
+        server = FakeServer((INFO, {}))
+        self.assertEqual(INFO, self.get(server, immutable=True))
+        self.assertEqual(INFO, self.get(server, immutable=True))
+        self.assertEqual(1, len(server.requests))
+
+    def test_unreadable_file_is_not_cached(self):
+        server = FakeServer(urllib.error.URLError("connection refused"),
+                            urllib.error.HTTPError(URL, 404, "Not Found", {}, None),
+                            (INFO, {'ETag': '"1"'}))
+        with self.assertRaises(urllib.error.URLError):
+            self.get(server, immutable=True)
+        with self.assertRaises(urllib.error.HTTPError):
+            self.get(server, immutable=True)
+        self.assertFalse(os.path.exists(self.cache.getCacheDir()))
+        self.assertEqual(INFO, self.get(server, immutable=True))
+        # the first successful read is unconditional, the failures left no validators
+        self.assertEqual([(None, None)] * 3, server.requests)
+
+    def test_caches_are_shared_per_project(self):
+        projectA = os.path.join(self.tmpDir, "a")
+        projectB = os.path.join(self.tmpDir, "b")
+        self.assertIs(getInfoFileCache(projectA), getInfoFileCache(projectA))
+        self.assertIsNot(getInfoFileCache(projectA), getInfoFileCache(projectB))
+        self.assertTrue(getInfoFileCache(projectA).getCacheDir().startswith(projectA))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import shutil
+import tempfile
+import unittest
+from reprepro_bundle.key_ids import getPublicKeyIDs, KeyIdCache
+
+GPG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".apt-repos", "gpg")
+DEBIAN_GPG = os.path.join(GPG_DIR, "debian.gpg")
+UBUNTU_GPG = os.path.join(GPG_DIR, "ubuntu.gpg")
+
+# the IDs listed by gpg --list-public-keys --with-colons for the test keyrings
+DEBIAN_IDS = {"7638D0442B90D010"}
+UBUNTU_IDS = {"251BEFF479164387", "3B4FE6ACC0B21F32", "40976EAF437D05B5", "46181433FBB75451", "D94AA3F0EFE21092"}
+
+
+class TestKeyIdCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.tmpDir, "keyids")
+        self.keyring = os.path.join(self.tmpDir, "keyring.gpg")
+        shutil.copyfile(DEBIAN_GPG, self.keyring)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_ids_are_cached(self):
+        self.assertEqual(DEBIAN_IDS, getPublicKeyIDs(self.keyring, self.cacheDir))
+        self.assertEqual(DEBIAN_IDS, KeyIdCache(self.cacheDir).get(self.keyring))
+
+    def test_changed_keyring_is_read_again(self):
+        self.assertEqual(DEBIAN_IDS, getPublicKeyIDs(self.keyring, self.cacheDir))
+        shutil.copyfile(UBUNTU_GPG, self.keyring)
+        self.assertIsNone(KeyIdCache(self.cacheDir).get(self.keyring))
+        self.assertEqual(UBUNTU_IDS, getPublicKeyIDs(self.keyring, self.cacheDir))
+
+    def test_same_content_at_another_path_shares_the_ids(self):
+        getPublicKeyIDs(self.keyring, self.cacheDir)
+        copy = os.path.join(self.tmpDir, "copy.gpg")
+        shutil.copyfile(self.keyring, copy)
+        self.assertEqual(DEBIAN_IDS, KeyIdCache(self.cacheDir).get(copy))
+
+    def test_no_keyring(self):
+        self.assertEqual(set(), getPublicKeyIDs(None, self.cacheDir))
+
+
+if __name__ == "__main__":
+    unittest.main()
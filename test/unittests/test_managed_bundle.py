@@ -0,0 +1,104 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import hashlib
+import unittest
+from unittest import mock
+import apt_pkg
+from reprepro_bundle_compose.managed_bundle import ManagedBundle
+
+INFO = b"""Bundlename: mybionic/0001
+Target: standard
+Creator: max.mustermann
+BasedOn: mybionic/0000
+Releasenotes: A new bundle
+ .
+ with some details
+"""
+
+SUMMARY = { "Subject": "A new bundle", "Creator": "max.mustermann", "BasedOn": "mybionic/0000" }
+
+
+class FakeSuite:
+    def getRepoUrl(self):
+        return "http://example.com/bundle/mybionic/0001/"
+
+
+class FakeInfoFileCache:
+    def __init__(self, data):
+        self.data = data
+        self.requests = list()
+
+    def get(self, url, immutable=False):
+        self.requests.append(url)
+        return self.data
+
+
+def bundle(status, **summary):
+    text = "ID: mybionic/0001\nStatus: {}\nTarget: standard\n".format(status)
+    text += "".join("{}: {}\n".format(key, value) for key, value in summary.items())
+    return ManagedBundle(apt_pkg.TagSection(text), FakeSuite())
+
+
+class TestInfoSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = FakeInfoFileCache(INFO)
+        patcher = mock.patch("reprepro_bundle_compose.managed_bundle.getInfoFileCache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_summary_is_read_from_the_info_file(self):
+        b = bundle("staging")
+        self.assertFalse(b.hasInfoSummary())
+        self.assertEqual(SUMMARY, b.getInfoSummary())
+        self.assertTrue(b.updateInfoSummary())
+        self.assertTrue(b.hasInfoSummary())
+        self.assertEqual(SUMMARY, b.getInfoSummary())
+
+    def test_stored_summary_is_used_without_reading_the_info_file(self):
+        b = bundle("production", Subject="Stored", InfoHash="0" * 64)
+        self.assertEqual({ "Subject": "Stored" }, b.getInfoSummary())
+        self.assertEqual([], self.cache.requests)
+
+    def test_sealed_bundle_with_stored_summary_is_not_updated(self):
+        b = bundle("production", Subject="Stored", InfoHash="0" * 64)
+        self.assertFalse(b.updateInfoSummary())
+        self.assertEqual([], self.cache.requests)
+
+    def test_unchanged_info_file_keeps_the_summary(self):
+        b = bundle("staging", Subject="Stored", InfoHash=hashlib.sha256(INFO).hexdigest())
+        self.assertFalse(b.updateInfoSummary())
+        self.assertEqual({ "Subject": "Stored" }, b.getInfoSummary())
+
+    def test_changed_info_file_updates_the_summary(self):
+        b = bundle("staging", Subject="Stored", InfoHash="0" * 64)
+        self.assertTrue(b.updateInfoSummary())
+        self.assertEqual(SUMMARY, b.getInfoSummary())
+
+    def test_unreadable_info_file_keeps_the_summary(self):
+        self.cache.data = None
+        b = bundle("staging", Subject="Stored", InfoHash="0" * 64)
+        with self.assertLogs("reprepro_bundle_compose.managed_bundle", "WARNING"):
+            self.assertFalse(b.updateInfoSummary())
+        self.assertEqual({ "Subject": "Stored" }, b.getInfoSummary())
+
+
+if __name__ == "__main__":
+    unittest.main()
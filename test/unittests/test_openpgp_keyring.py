@@ -0,0 +1,85 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import base64
+import shutil
+import tempfile
+import unittest
+from reprepro_bundle.openpgp_keyring import readPublicKeyIDs, ARMOR_BEGIN, ARMOR_END
+from reprepro_bundle.key_ids import listPublicKeyIDsWithGpg
+
+GPG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".apt-repos", "gpg")
+DEBIAN_GPG = os.path.join(GPG_DIR, "debian.gpg")
+UBUNTU_GPG = os.path.join(GPG_DIR, "ubuntu.gpg")
+
+# the IDs listed by gpg --list-public-keys --with-colons for the test keyrings
+DEBIAN_IDS = {"7638D0442B90D010"}
+UBUNTU_IDS = {"251BEFF479164387", "3B4FE6ACC0B21F32", "40976EAF437D05B5", "46181433FBB75451", "D94AA3F0EFE21092"}
+
+
+def hasGpg():
+    return shutil.which("gpg") is not None
+
+
+class TestOpenPGPKeyring(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_binary_keyrings(self):
+        self.assertEqual(DEBIAN_IDS, readPublicKeyIDs(DEBIAN_GPG))
+        self.assertEqual(UBUNTU_IDS, readPublicKeyIDs(UBUNTU_GPG))
+
+    def test_armored_keyring(self):
+        armored = os.path.join(self.tmpDir, "keys.asc")
+        with open(armored, "w") as out:
+            for keyring in (DEBIAN_GPG, UBUNTU_GPG):
+                with open(keyring, "rb") as fh:
+                    b64 = base64.b64encode(fh.read()).decode('ascii')
+                print(ARMOR_BEGIN, file=out)
+                print("Comment: test\n", file=out)
+                for i in range(0, len(b64), 64):
+                    print(b64[i:i + 64], file=out)
+                print("=AAAA", file=out)
+                print(ARMOR_END, file=out)
+        self.assertEqual(DEBIAN_IDS | UBUNTU_IDS, readPublicKeyIDs(armored))
+
+    def test_unknown_format_raises_value_error(self):
+        keybox = os.path.join(self.tmpDir, "pubring.kbx")
+        with open(keybox, "wb") as out:
+            out.write(b"\x00\x00\x00\x20\x01\x01\x00\x00KBXf")
+        with self.assertRaises(ValueError):
+            readPublicKeyIDs(keybox)
+
+    @unittest.skipUnless(hasGpg(), "gpg is not installed")
+    def test_same_ids_as_gpg(self):
+        os.environ["GNUPGHOME"] = self.tmpDir
+        try:
+            for keyring in (DEBIAN_GPG, UBUNTU_GPG):
+                self.assertEqual(listPublicKeyIDsWithGpg(keyring), readPublicKeyIDs(keyring))
+        finally:
+            del os.environ["GNUPGHOME"]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import unittest
+from reprepro_bundle.package import Package
+from reprepro_bundle.package_status import PackageStatus
+from reprepro_bundle.package_existence import PackageExistence
+from reprepro_bundle.package_classifier import PackageClassifier
+
+OWN = "bundle:mybionic/0001"
+REF = "target:mybionic/dev"
+SUPPLIER = "ubuntu:bionic-updates"
+
+
+class FakeSuite:
+    def __init__(self, suiteName):
+        self.suiteName = suiteName
+
+    def getSuiteName(self):
+        return self.suiteName
+
+
+def package(version, suiteName, component="main", status=PackageStatus.UNKNOWN):
+    return Package("src", version, suiteName, "net", component, PackageExistence.SRCBIN, status)
+
+
+class TestPackageClassifier(unittest.TestCase):
+
+    def classify(self, packages, mergePackages=(), addFrom=(), upgradeFrom=(), upgradeKeepComponent=True):
+        classifier = PackageClassifier(OWN, [FakeSuite(REF)], [FakeSuite(s) for s in addFrom],
+                                       [FakeSuite(s) for s in upgradeFrom], upgradeKeepComponent)
+        classifier.classify(set(packages), set(mergePackages))
+        return [(p.version, p.status, p.active) for p in sorted(packages, key=lambda p: (p.version, p.suiteName))]
+
+    def test_own_package_is_kept(self):
+        self.assertEqual([
+            ("1", PackageStatus.IS_DOWNGRADE, False),
+            ("2", PackageStatus.SHOULD_BE_KEPT, True),
+            ("3", PackageStatus.IS_UPGRADE, False)
+        ], self.classify([package("1", REF), package("2", OWN), package("3", SUPPLIER)]))
+
+    def test_latest_reference_package_is_current(self):
+        self.assertEqual([
+            ("1", PackageStatus.IS_DOWNGRADE, False),
+            ("2", PackageStatus.IS_SAME_VERSION, False),
+            ("2", PackageStatus.IS_CURRENT, True),
+            ("3", PackageStatus.IS_UPGRADE, False)
+        ], self.classify([package("1", REF), package("2", "other:suite"), package("2", REF), package("3", SUPPLIER)]))
+
+    def test_merged_downgrade_wins_over_kept_package(self):
+        self.assertEqual([
+            ("1", PackageStatus.IS_DOWNGRADE, True),
+            ("2", PackageStatus.SHOULD_BE_KEPT, False),
+            ("3", PackageStatus.IS_UPGRADE, False)
+        ], self.classify([package("1", REF), package("2", OWN), package("3", SUPPLIER, "universe")],
+                         mergePackages=[package("1", REF, status=PackageStatus.IS_DOWNGRADE)], upgradeFrom=[SUPPLIER]))
+
+    def test_upgrade_wins_over_merged_downgrade(self):
+        self.assertEqual([
+            ("1", PackageStatus.IS_DOWNGRADE, False),
+            ("2", PackageStatus.SHOULD_BE_KEPT, False),
+            ("3", PackageStatus.IS_UPGRADE, True)
+        ], self.classify([package("1", REF), package("2", OWN), package("3", SUPPLIER)],
+                         mergePackages=[package("1", REF, status=PackageStatus.IS_DOWNGRADE)], upgradeFrom=[SUPPLIER]))
+
+    def test_upgrade_keeps_component(self):
+        packages = [package("2", OWN), package("3", SUPPLIER, "universe")]
+        self.assertEqual([
+            ("2", PackageStatus.SHOULD_BE_KEPT, True),
+            ("3", PackageStatus.IS_UPGRADE, False)
+        ], self.classify(packages, upgradeFrom=[SUPPLIER]))
+        packages = [package("2", OWN), package("3", SUPPLIER, "universe")]
+        self.assertEqual([
+            ("2", PackageStatus.SHOULD_BE_KEPT, False),
+            ("3", PackageStatus.IS_UPGRADE, True)
+        ], self.classify(packages, upgradeFrom=[SUPPLIER], upgradeKeepComponent=False))
+
+    def test_missing_package_is_added_from_add_from_suite(self):
+        self.assertEqual([
+            ("1", PackageStatus.IS_MISSING, False),
+            ("2", PackageStatus.IS_MISSING, True)
+        ], self.classify([package("1", "other:suite"), package("2", SUPPLIER)], addFrom=[SUPPLIER]))
+
+
+if __name__ == "__main__":
+    unittest.main()
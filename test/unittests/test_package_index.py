@@ -0,0 +1,91 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import shutil
+import tempfile
+import unittest
+from reprepro_bundle_compose.package_index import BinaryPackageIndex
+
+SUITE_1 = "bundle:mybionic/0001"
+SUITE_2 = "bundle:mybionic/0002"
+SUITE_3 = "bundle:mybionic/0003"
+
+
+class TestBinaryPackageIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.tmpDir, "jsondeps")
+        self.releaseFiles = dict()
+        for bid in (SUITE_1, SUITE_2, SUITE_3):
+            self.releaseFiles[bid] = os.path.join(self.tmpDir, bid.replace("/", "_"))
+            with open(self.releaseFiles[bid], "w") as out:
+                out.write("Suite: {}\n".format(bid))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def createIndex(self):
+        index = BinaryPackageIndex(self.cacheDir)
+        index.update(SUITE_1, self.releaseFiles[SUITE_1], [("hello", "2.10-1", SUITE_1), ("zurl", "1.9.1-3", SUITE_1)])
+        index.update(SUITE_2, self.releaseFiles[SUITE_2], [("hello", "2.9-2", SUITE_2), ("apt", "1.6.3", SUITE_2)])
+        index.update(SUITE_3, self.releaseFiles[SUITE_3], [("hello", "2.10-1~bpo1", SUITE_3), ("zurl", "1.9.1-3", SUITE_3)])
+        return index
+
+    def test_dependencies(self):
+        # a suite depends on the suites providing a package with a lower version (or the same
+        # version and a lower suite name)
+        self.assertEqual([
+            [SUITE_3, SUITE_2],
+            [SUITE_3, SUITE_1],
+            [SUITE_1, SUITE_3],
+            [SUITE_1, SUITE_2]
+        ], sorted(self.createIndex().getDependencies(), reverse=True))
+
+    def test_stored_index_is_loaded(self):
+        index = self.createIndex()
+        index.store()
+        loaded = BinaryPackageIndex(self.cacheDir)
+        self.assertEqual(index.getDependencies(), loaded.getDependencies())
+        for bid, releaseFile in self.releaseFiles.items():
+            self.assertTrue(loaded.isCurrent(bid, releaseFile))
+
+    def test_changed_release_file_is_not_current(self):
+        index = self.createIndex()
+        with open(self.releaseFiles[SUITE_1], "a") as out:
+            out.write("Version: 2\n")
+        self.assertFalse(index.isCurrent(SUITE_1, self.releaseFiles[SUITE_1]))
+        self.assertFalse(index.isCurrent(SUITE_1, None))
+        self.assertFalse(index.isCurrent("bundle:mybionic/0004", self.releaseFiles[SUITE_2]))
+
+    def test_update_replaces_the_entries_of_a_bundle(self):
+        index = self.createIndex()
+        index.update(SUITE_3, self.releaseFiles[SUITE_3], [("apt", "1.6.4", SUITE_3)])
+        self.assertEqual([[SUITE_3, SUITE_2], [SUITE_1, SUITE_2]], sorted(index.getDependencies(), reverse=True))
+
+    def test_retain_removes_other_bundles(self):
+        index = self.createIndex()
+        index.retain([SUITE_1, SUITE_2])
+        self.assertEqual([[SUITE_1, SUITE_2]], index.getDependencies())
+        self.assertFalse(index.isCurrent(SUITE_3, self.releaseFiles[SUITE_3]))
+
+
+if __name__ == "__main__":
+    unittest.main()
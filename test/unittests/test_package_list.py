@@ -0,0 +1,94 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import contextlib
+import unittest
+from unittest import mock
+from reprepro_bundle.package_list import getPackageList, formatTable
+
+SUITE = "bundle:bionic/0001"
+
+
+class FakeRow:
+    def __init__(self, *data):
+        self.data = data
+
+    def getData(self):
+        return self.data
+
+    def __lt__(self, other):
+        return self.data < other.data
+
+
+class FakeSuite:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = list()
+
+    def scan(self, update):
+        self.calls.append(('scan', update))
+
+    def queryPackages(self, requestPackages, isRE, archs, sourceName, reqFields):
+        self.calls.append(('query', reqFields))
+        return self.rows
+
+
+@contextlib.contextmanager
+def fakeSuppress(forked):
+    yield forked
+
+
+class TestPackageList(unittest.TestCase):
+
+    def test_format_table(self):
+        self.assertEqual(
+            "Source | Version\n"
+            "====== | =======\n"
+            "0ad    | 0.0.22 \n"
+            "zurl   | 1.9.1-3\n",
+            formatTable(["Source", "Version"], [["0ad", "0.0.22"], ["zurl", "1.9.1-3"]]))
+
+    def test_format_empty_table(self):
+        self.assertEqual("A | B\n= | =\n", formatTable(["A", "B"], []))
+
+    def test_package_list_is_sorted(self):
+        suite = FakeSuite([
+            FakeRow("zurl", "zurl", "1.9.1-3", "amd64", "net", SUITE),
+            FakeRow("0ad", "0ad-data", "0.0.22-1", "all", "games", SUITE)
+        ])
+        with mock.patch("apt_repos.suppress_unwanted_apt_pkg_messages", create=True, new=lambda: fakeSuppress(True)):
+            table = getPackageList(suite, update=False)
+        self.assertEqual(['scan', 'query'], [call for (call, unused_arg) in suite.calls])
+        self.assertEqual(('scan', False), suite.calls[0])
+        self.assertEqual(
+            "Source | Package  | Version  | Arch  | Section | Suite             \n"
+            "====== | ======== | ======== | ===== | ======= | ==================\n"
+            "0ad    | 0ad-data | 0.0.22-1 | all   | games   | bundle:bionic/0001\n"
+            "zurl   | zurl     | 1.9.1-3  | amd64 | net     | bundle:bionic/0001\n",
+            table)
+
+    def test_filter_process_does_not_query(self):
+        suite = FakeSuite([FakeRow("zurl", "zurl", "1.9.1-3", "amd64", "net", SUITE)])
+        with mock.patch("apt_repos.suppress_unwanted_apt_pkg_messages", create=True, new=lambda: fakeSuppress(False)):
+            self.assertIsNone(getPackageList(suite))
+        self.assertEqual([], suite.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import shutil
+import tempfile
+import unittest
+from reprepro_bundle.query_cache import QueryCache, getSuiteConfig
+
+SUITE = "ubuntu:bionic"
+
+
+class FakeSuite:
+    def __init__(self, components, architectures):
+        self.components = components
+        self.architectures = architectures
+
+    def getRepoUrl(self):
+        return "http://archive.ubuntu.com/ubuntu/"
+
+    def getAptSuite(self):
+        return "bionic"
+
+    def getComponents(self):
+        return self.components
+
+    def getArchitectures(self):
+        return self.architectures
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.cache = QueryCache(os.path.join(self.tmpDir, "query"))
+        self.releaseFile = os.path.join(self.tmpDir, "Release")
+        with open(self.releaseFile, "w") as out:
+            out.write("Suite: bionic\n")
+        self.config = getSuiteConfig(FakeSuite(["main"], ["amd64"]))
+        self.sources = {
+            "0ad": ("0ad", "0.0.22-4", SUITE, "games", "universe"),
+            "zurl": ("zurl", "1.9.1-3", SUITE, "net", "universe")
+        }
+        self.binaries = {
+            "0ad": ("0ad", "0.0.22-4", SUITE, "games", "universe"),
+            "389-ds-base": ("389-ds-base", "1.3.7.10-1ubuntu1", SUITE, "net", None)
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_load_returns_the_stored_rows(self):
+        self.cache.store(SUITE, self.releaseFile, self.config, self.sources, self.binaries)
+        self.assertTrue(self.cache.isValid(SUITE, self.releaseFile, self.config))
+        self.assertEqual((self.sources, self.binaries), self.cache.load(SUITE, self.releaseFile, self.config))
+
+    def test_iter_rows_merges_sources_and_binaries(self):
+        self.cache.store(SUITE, self.releaseFile, self.config, self.sources, self.binaries)
+        self.assertEqual([
+            ("0ad", self.sources["0ad"], self.binaries["0ad"]),
+            ("389-ds-base", None, self.binaries["389-ds-base"]),
+            ("zurl", self.sources["zurl"], None)
+        ], list(self.cache.iterRows(SUITE)))
+
+    def test_changed_suite_config_invalidates_the_entry(self):
+        self.cache.store(SUITE, self.releaseFile, self.config, self.sources, self.binaries)
+        for suite in (FakeSuite(["main", "universe"], ["amd64"]), FakeSuite(["main"], ["amd64", "i386"])):
+            config = getSuiteConfig(suite)
+            self.assertNotEqual(self.config, config)
+            self.assertFalse(self.cache.isValid(SUITE, self.releaseFile, config))
+            self.assertIsNone(self.cache.load(SUITE, self.releaseFile, config))
+
+    def test_suite_config_ignores_the_order(self):
+        self.assertEqual(self.config, getSuiteConfig(FakeSuite(("main",), ("amd64",))))
+        self.assertEqual(getSuiteConfig(FakeSuite(["main", "universe"], ["amd64", "i386"])),
+                         getSuiteConfig(FakeSuite(["universe", "main"], ["i386", "amd64"])))
+
+    def test_changed_release_file_invalidates_the_entry(self):
+        self.cache.store(SUITE, self.releaseFile, self.config, self.sources, self.binaries)
+        with open(self.releaseFile, "a") as out:
+            out.write("Version: 18.04\n")
+        self.assertIsNone(self.cache.load(SUITE, self.releaseFile, self.config))
+
+    def test_truncated_entry_is_ignored(self):
+        self.cache.store(SUITE, self.releaseFile, self.config, self.sources, self.binaries)
+        cacheFile = os.path.join(self.cache.getCacheDir(), os.listdir(self.cache.getCacheDir())[0])
+        with open(cacheFile, "rb") as fh:
+            data = fh.read()
+        with open(cacheFile, "wb") as out:
+            out.write(data[:-10])
+        self.assertTrue(self.cache.isValid(SUITE, self.releaseFile, self.config))
+        self.assertIsNone(self.cache.load(SUITE, self.releaseFile, self.config))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import io
+import unittest
+import urllib.error
+from unittest import mock
+from reprepro_bundle import release_watch
+from reprepro_bundle.release_watch import ReleaseWatcher
+
+DISTS_URL = "http://example.com/ubuntu/dists/bionic/"
+
+
+class FakeResponse(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.headers = dict()
+
+
+class TestReleaseWatcher(unittest.TestCase):
+
+    def watch(self, responses, minDelay=2, maxDelay=10):
+        '''
+            Returns a list of (hasChanged, delay) for each of the `responses` (either
+            bytes or an exception raised by urlopen).
+        '''
+        def urlopen(req, timeout):
+            res = responses.pop(0)
+            if isinstance(res, Exception):
+                raise res
+            return FakeResponse(res)
+        watcher = ReleaseWatcher(DISTS_URL, minDelay, maxDelay)
+        res = list()
+        with mock.patch.object(release_watch.urllib.request, "urlopen", urlopen):
+            while responses:
+                res.append((watcher.hasChanged(), watcher.getDelay()))
+        return res
+
+    def test_delay_grows_up_to_max_delay_until_change(self):
+        self.assertEqual([(True, 2), (False, 4), (False, 8), (False, 10), (True, 2)],
+                         self.watch([b"a", b"a", b"a", b"a", b"b"]))
+
+    def test_max_delay_is_configurable(self):
+        self.assertEqual([(True, 1), (False, 2), (False, 3), (False, 3)],
+                         self.watch([b"a", b"a", b"a", b"a"], minDelay=1, maxDelay=3))
+
+    def test_not_modified_is_unchanged(self):
+        notModified = urllib.error.HTTPError(DISTS_URL + "InRelease", 304, "Not Modified", {}, None)
+        self.assertEqual([(True, 2), (False, 4)], self.watch([b"a", notModified]))
+
+    def test_unreadable_release_file_is_unchanged(self):
+        error = urllib.error.URLError("connection refused")
+        # after a failure, both InRelease and Release are tried again
+        self.assertEqual([(True, 2), (False, 4), (False, 8), (True, 2)],
+                         self.watch([b"a", error, error, error, b"b"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from reprepro_bundle import suite_scan
+from reprepro_bundle.bundle import Bundle
+
+OWN = "bundle:mybionic/0001"
+REF = "target:mybionic/dev"
+SUPPLIER = "ubuntu:bionic-updates"
+EMPTY = "ubuntu:bionic-backports"
+
+
+class FakeRow:
+    def __init__(self, suite, *data):
+        self.data = data[:2] + (suite,) + data[2:]
+
+    def getData(self):
+        return self.data
+
+    def __lt__(self, other):
+        return self.data[1] < other.data[1]
+
+
+class FakeSuite:
+    def __init__(self, suiteName, sources=(), binaries=()):
+        self.suiteName = suiteName
+        self.sources = [FakeRow(self, *row) for row in sources]
+        self.binaries = [FakeRow(self, *row) for row in binaries]
+
+    def getSuiteName(self):
+        return self.suiteName
+
+    def getRepoUrl(self):
+        return "http://example.com/" + self.suiteName
+
+    def getAptSuite(self):
+        return self.suiteName
+
+    def getComponents(self):
+        return ["main"]
+
+    def getArchitectures(self):
+        return ["amd64"]
+
+    def scan(self, update):
+        pass
+
+    def querySources(self, requestPackages, isRE, archs, sourceName, reqFields):
+        return self.sources
+
+    def queryPackages(self, requestPackages, isRE, archs, sourceName, reqFields):
+        return self.binaries
+
+    def __lt__(self, other):
+        return self.suiteName < other.suiteName
+
+
+class TestSourcesControlList(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        releaseFile = os.path.join(self.tmpDir, "Release")
+        with open(releaseFile, "w") as out:
+            out.write("Suite: any\n")
+        patcher = mock.patch.object(suite_scan, "getReleaseFile", lambda suite: releaseFile)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bundle = Bundle("mybionic/0001", self.tmpDir)
+        os.makedirs(os.path.dirname(self.bundle.scl))
+        self.own = FakeSuite(OWN, [("hello", "2.10-1", "devel", "main")], [("hello", "2.10-1", "devel", "main")])
+        self.ref = FakeSuite(REF, [
+            ("hello", "2.9-2", "devel", "main"),
+            ("zurl", "1.9.1-3", "net", "main")
+        ], [
+            ("0ad", "0.0.22-4", "games", "main"),
+            ("zurl", "1.9.1-3", "net", "main")
+        ])
+        self.supplier = FakeSuite(SUPPLIER, [
+            ("0ad", "0.0.23-1", "games", "universe"),
+            ("apt", "1.6.3", "admin", "main"),
+            ("zurl", "1.9.1-4", "net", "main")
+        ], [
+            ("apt", "1.6.3", "admin", "main"),
+        ])
+        self.empty = FakeSuite(EMPTY)
+        self.bundle._ownSuite = self.own
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def write(self, prevSourcesDict, streaming):
+        self.bundle.updateSourcesControlList([self.supplier, self.empty], [self.ref], prevSourcesDict, [self.own],
+                                             [], [self.supplier], True, True, "# cancel remark", 1, streaming)
+        with open(self.bundle.scl, "rb") as fh:
+            return fh.read()
+
+    def assertSameOutput(self, prevSourcesDict):
+        inMemory = self.write(prevSourcesDict, False)
+        self.assertEqual(inMemory, self.write(prevSourcesDict, True))
+        return inMemory
+
+    def test_streaming_without_previous_list(self):
+        output = self.assertSameOutput(dict())
+        self.assertIn(b"#" + b"=" * 80 + b"\n", output)
+        self.assertTrue(output.startswith(b"# cancel remark\n"))
+
+    def test_streaming_with_previous_list(self):
+        self.write(dict(), False)
+        prevSourcesDict = self.bundle.parseSourcesControlList()
+        self.assertIn("hello", prevSourcesDict)
+        output = self.assertSameOutput(prevSourcesDict)
+        self.assertIn(b"#" + b"=" * 80 + b"\n", output)
+
+    def test_streaming_without_highlights(self):
+        self.own = FakeSuite(OWN)
+        self.bundle._ownSuite = self.own
+        output = self.assertSameOutput(dict())
+        self.assertNotIn(b"#" + b"=" * 80, output)
+
+
+if __name__ == "__main__":
+    unittest.main()
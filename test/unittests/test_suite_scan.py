@@ -0,0 +1,121 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from reprepro_bundle import suite_scan
+
+SUITE = "ubuntu:bionic"
+
+
+class FakeRow:
+    def __init__(self, suite, *data):
+        self.data = data[:2] + (suite,) + data[2:]
+
+    def getData(self):
+        return self.data
+
+    def __lt__(self, other):
+        return self.data[1] < other.data[1]
+
+
+class FakeSuite:
+    def __init__(self):
+        self.scans = list()
+
+    def getSuiteName(self):
+        return SUITE
+
+    def getRepoUrl(self):
+        return "http://archive.ubuntu.com/ubuntu/"
+
+    def getAptSuite(self):
+        return "bionic"
+
+    def getComponents(self):
+        return ["main"]
+
+    def getArchitectures(self):
+        return ["amd64"]
+
+    def scan(self, update):
+        self.scans.append(update)
+
+    def querySources(self, requestPackages, isRE, archs, sourceName, reqFields):
+        return [FakeRow(self, "0ad", "0.0.22-4", "games", "universe")]
+
+    def queryPackages(self, requestPackages, isRE, archs, sourceName, reqFields):
+        return [FakeRow(self, "zurl", "1.9.1-3", "net", "universe")]
+
+
+class TestSuiteScan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.tmpDir, "query")
+        self.releaseFile = os.path.join(self.tmpDir, "Release")
+        with open(self.releaseFile, "w") as out:
+            out.write("Suite: bionic\n")
+        patcher = mock.patch.object(suite_scan, "getReleaseFile", lambda suite: self.releaseFile)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.expected = ({"0ad": ("0ad", "0.0.22-4", SUITE, "games", "universe")},
+                         {"zurl": ("zurl", "1.9.1-3", SUITE, "net", "universe")})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_cached_suite_is_not_scanned_without_update(self):
+        suite = FakeSuite()
+        self.assertEqual(self.expected, suite_scan.scanSuites([suite], False, 1, self.cacheDir)[SUITE])
+        self.assertEqual([False], suite.scans)
+        suite = FakeSuite()
+        self.assertEqual(self.expected, suite_scan.scanSuites([suite], False, 1, self.cacheDir)[SUITE])
+        self.assertEqual([], suite.scans)
+
+    def test_cached_suite_is_scanned_on_update(self):
+        suite_scan.scanSuites([FakeSuite()], False, 1, self.cacheDir)
+        suite = FakeSuite()
+        self.assertEqual(self.expected, suite_scan.scanSuites([suite], True, 1, self.cacheDir)[SUITE])
+        self.assertEqual([True], suite.scans)
+
+    def test_changed_release_file_is_scanned(self):
+        suite_scan.scanSuites([FakeSuite()], False, 1, self.cacheDir)
+        with open(self.releaseFile, "a") as out:
+            out.write("Version: 18.04\n")
+        suite = FakeSuite()
+        self.assertEqual(self.expected, suite_scan.scanSuites([suite], False, 1, self.cacheDir)[SUITE])
+        self.assertEqual([False], suite.scans)
+
+    def test_spooled_suite_is_not_scanned_without_update(self):
+        suite_scan.spoolSuites([FakeSuite()], False, self.cacheDir, 1)
+        suite = FakeSuite()
+        cache = suite_scan.spoolSuites([suite], False, self.cacheDir, 1)
+        self.assertEqual([], suite.scans)
+        self.assertEqual([
+            ("0ad", self.expected[0]["0ad"], None),
+            ("zurl", None, self.expected[1]["zurl"])
+        ], list(cache.iterRows(SUITE)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import shutil
+import tempfile
+import unittest
+from reprepro_bundle.template_env import getTemplateEnvironment
+
+
+class TestTemplateEnvironment(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.templateDir = os.path.join(self.tmpDir, "templates")
+        os.makedirs(self.templateDir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_environment_is_shared_per_template_dir(self):
+        env = getTemplateEnvironment(self.templateDir)
+        self.assertIs(env, getTemplateEnvironment(self.templateDir + "/"))
+        self.assertIs(env, getTemplateEnvironment(os.path.join(self.templateDir, "..", "templates")))
+        otherDir = os.path.join(self.tmpDir, "other")
+        os.makedirs(otherDir)
+        self.assertIsNot(env, getTemplateEnvironment(otherDir))
+
+    def test_bytecode_cache_dir_is_created(self):
+        cacheDir = os.path.join(self.tmpDir, "cache", "templates")
+        getTemplateEnvironment(self.templateDir, cacheDir)
+        self.assertTrue(os.path.isdir(cacheDir))
+
+    def test_unusable_bytecode_cache_dir_is_ignored(self):
+        blocker = os.path.join(self.tmpDir, "file")
+        with open(blocker, "w") as out:
+            out.write("not a folder")
+        self.assertIsNotNone(getTemplateEnvironment(self.templateDir, os.path.join(blocker, "templates")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import unittest
+from xmlrpc.client import ProtocolError
+from reprepro_bundle_compose.trac_api import TracApi, TracConnectionError
+
+
+class FakeSystem:
+    def __init__(self, server):
+        self.server = server
+
+    def multicall(self, calls):
+        self.server.requests.append([(call['methodName'], call['params']) for call in calls])
+        return [[self.server.answer(call['methodName'], *call['params'])] for call in calls]
+
+    def getAPIVersion(self):
+        self.server.requests.append("system.getAPIVersion")
+        if self.server.error:
+            raise self.server.error
+        return [1, 1, 6]
+
+
+class FakeServer:
+    '''
+        Answers system.multicall requests like trac's XmlRpcPlugin and records each
+        request as the list of (methodName, params) of the contained calls.
+    '''
+    def __init__(self, error=None):
+        self.requests = list()
+        self.error = error
+        self.system = FakeSystem(self)
+
+    def answer(self, methodName, id, *args):
+        if methodName == "ticket.get":
+            return [id, None, None, { "summary": "ticket {}".format(id) }]
+        return [id, None, None, args[1]]
+
+
+class TestTracApi(unittest.TestCase):
+
+    def setUp(self):
+        self.trac = TracApi("https://trac.example.com/trac", "user", "secret")
+        self.server = FakeServer()
+        self.trac.server = self.server
+
+    def test_get_tickets_is_split_into_batches(self):
+        tickets = self.trac.getTicketsValues(range(1, 6), batchSize=2)
+        self.assertEqual({ id: { "summary": "ticket {}".format(id) } for id in range(1, 6) }, tickets)
+        self.assertEqual([[1, 2], [3, 4], [5]], [[params[0] for _, params in r] for r in self.server.requests])
+        self.assertEqual({ "ticket.get" }, { name for r in self.server.requests for name, _ in r })
+
+    def test_update_tickets_keeps_the_order(self):
+        updates = [(str(id), "comment {}".format(id), { "status": "closed" }) for id in (3, 1, 2)]
+        res = self.trac.updateTickets(updates, batchSize=2)
+        self.assertEqual([[3, None, None, { "status": "closed" }], [1, None, None, { "status": "closed" }], [2, None, None, { "status": "closed" }]], res)
+        self.assertEqual([[("ticket.update", (3, "comment 3", { "status": "closed" })),
+                           ("ticket.update", (1, "comment 1", { "status": "closed" }))],
+                          [("ticket.update", (2, "comment 2", { "status": "closed" }))]], self.server.requests)
+
+    def test_no_tickets_need_no_request(self):
+        self.assertEqual({}, self.trac.getTickets([]))
+        self.assertEqual([], self.trac.updateTickets([]))
+        self.assertEqual([], self.server.requests)
+
+    def test_failing_first_request_raises_a_connection_error(self):
+        self.trac.server = FakeServer(ProtocolError("trac.example.com/login/rpc", 401, "Unauthorized", {}))
+        with self.assertRaises(TracConnectionError):
+            self.trac.checkConnection()
+
+
+if __name__ == "__main__":
+    unittest.main()
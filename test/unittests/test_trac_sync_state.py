@@ -0,0 +1,163 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+from reprepro_bundle_compose import syncTracTickets
+from reprepro_bundle_compose.bundle_status import BundleStatus
+from reprepro_bundle_compose.trac_sync_state import TracSyncState
+
+TRAC_URL = "https://trac.example.com/"
+
+
+class FakeBundle:
+    def __init__(self, trac, status="staging", target="standard"):
+        self.trac = trac
+        self.status = status
+        self.target = target
+
+    def getTrac(self):
+        return self.trac
+
+    def getStatus(self):
+        return self.status
+
+    def getTarget(self):
+        return self.target
+
+
+class TestTracSyncState(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.tmpDir, "trac-sync")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_initial_state_requires_a_full_sync(self):
+        state = TracSyncState(self.cacheDir, TRAC_URL)
+        self.assertIsNone(state.getSince())
+        self.assertFalse(state.isInSync(FakeBundle(1)))
+
+    def test_state_is_stored_and_loaded(self):
+        state = TracSyncState(self.cacheDir, TRAC_URL)
+        state.update("20181231T23:59:59", [FakeBundle(1), FakeBundle("2", "production", "unattended")])
+        state.store()
+        state = TracSyncState(self.cacheDir, TRAC_URL)
+        self.assertEqual("20181231T23:59:59", state.getSince())
+        self.assertTrue(state.isInSync(FakeBundle("1")))
+        self.assertTrue(state.isInSync(FakeBundle(2, "production", "unattended")))
+
+    def test_local_changes_are_not_in_sync(self):
+        state = TracSyncState(self.cacheDir, TRAC_URL)
+        state.update("20181231T23:59:59", [FakeBundle(1)])
+        self.assertFalse(state.isInSync(FakeBundle(1, status="production")))
+        self.assertFalse(state.isInSync(FakeBundle(1, target="unattended")))
+        self.assertFalse(state.isInSync(FakeBundle(2)))
+
+    def test_since_never_moves_backwards(self):
+        state = TracSyncState(self.cacheDir, TRAC_URL)
+        state.update("20181231T23:59:59", [])
+        state.update("20181230T00:00:00", [])
+        state.update(None, [])
+        self.assertEqual("20181231T23:59:59", state.getSince())
+        state.update("20190101T00:00:00", [])
+        self.assertEqual("20190101T00:00:00", state.getSince())
+
+    def test_forgotten_bundle_is_checked_again(self):
+        state = TracSyncState(self.cacheDir, TRAC_URL)
+        state.update("20181231T23:59:59", [FakeBundle(1)])
+        state.forget(FakeBundle(1))
+        self.assertFalse(state.isInSync(FakeBundle(1)))
+
+    def test_state_of_another_trac_is_ignored(self):
+        state = TracSyncState(self.cacheDir, TRAC_URL)
+        state.update("20181231T23:59:59", [FakeBundle(1)])
+        state.store()
+        state = TracSyncState(self.cacheDir, "https://other-trac.example.com/")
+        self.assertIsNone(state.getSince())
+        self.assertFalse(state.isInSync(FakeBundle(1)))
+
+    def test_corrupt_state_is_ignored(self):
+        os.makedirs(self.cacheDir)
+        with open(os.path.join(self.cacheDir, "trac-sync.json"), "w") as out:
+            out.write("{")
+        self.assertIsNone(TracSyncState(self.cacheDir, TRAC_URL).getSince())
+
+
+class FakeTracApi:
+    def __init__(self, serverTime, changed=()):
+        self.serverTime = serverTime
+        self.changed = list(changed)
+        self.calls = list()
+
+    def checkConnection(self):
+        self.calls.append(('checkConnection',))
+        return self.serverTime
+
+    def getRecentChanges(self, since):
+        self.calls.append(('getRecentChanges', since))
+        return self.changed
+
+    def getTickets(self, ids):
+        self.calls.append(('getTickets', sorted(ids)))
+        return { id: (id, None, None, {'status': 'new', 'bereitstellung': 'standard'}) for id in ids }
+
+    def updateTickets(self, updates):
+        self.calls.append(('updateTickets', updates))
+
+
+class TestSyncTracTickets(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.serverTime = datetime.datetime(2019, 1, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+        self.bundles = [FakeBundle(str(tid), BundleStatus.NEW) for tid in (1, 2, 3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_since_is_trac_time_before_the_first_query(self):
+        tracApi = FakeTracApi(self.serverTime)
+        state = TracSyncState(self.tmpDir, TRAC_URL)
+        syncTracTickets(tracApi, self.bundles, state)
+        self.assertEqual([('checkConnection',), ('getTickets', ['1', '2', '3'])], tracApi.calls)
+        self.assertEqual("20190101T11:55:00", TracSyncState(self.tmpDir, TRAC_URL).getSince())
+
+    def test_only_changed_tickets_are_fetched(self):
+        state = TracSyncState(self.tmpDir, TRAC_URL)
+        syncTracTickets(FakeTracApi(self.serverTime), self.bundles, state)
+        self.bundles[2].target = "unattended"
+        tracApi = FakeTracApi(self.serverTime + datetime.timedelta(hours=1), changed=[1])
+        syncTracTickets(tracApi, self.bundles, TracSyncState(self.tmpDir, TRAC_URL))
+        self.assertEqual([
+            ('checkConnection',),
+            ('getRecentChanges', "20190101T11:55:00"),
+            ('getTickets', ['1', '3']),
+            ('updateTickets', [('3', "Automatically updated by bundle-compose", {'bereitstellung': 'unattended'})])
+        ], tracApi.calls)
+        self.assertEqual("20190101T12:55:00", TracSyncState(self.tmpDir, TRAC_URL).getSince())
+
+
+if __name__ == "__main__":
+    unittest.main()
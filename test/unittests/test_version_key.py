@@ -0,0 +1,93 @@
+#!/usr/bin/python3 -Es
+# -*- coding: utf-8 -*-
+##########################################################################
+# Copyright (c) 2018 Landeshauptstadt München
+#           (c) 2018 Christoph Lutz (InterFace AG)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the European Union Public Licence (EUPL),
+# version 1.1 (or any later version).
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# European Union Public Licence for more details.
+#
+# You should have received a copy of the European Union Public Licence
+# along with this program. If not, see
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-11-12
+##########################################################################
+import random
+import unittest
+import apt_pkg
+from reprepro_bundle.version_key import versionKey
+
+# versions in ascending order according to dpkg; versions on the same line are equal
+DPKG_ORDER = [
+    ["1.0~alpha"],
+    ["1.0~beta~1"],
+    ["1.0~beta"],
+    ["1.0", "1.00", "1.0-0"],
+    ["1.0-0ubuntu1~18.04"],
+    ["1.0-0ubuntu1"],
+    ["1.0-1~bpo9+1"],
+    ["1.0-1"],
+    ["1.0-1+b1"],
+    ["1.0-1.1"],
+    ["1.0-2"],
+    ["1.0-10"],
+    ["1.0a"],
+    ["1.0+dfsg-1"],
+    ["1.0.1-1"],
+    ["1.2-1"],
+    ["1.10-1"],
+    ["10.0-1"],
+    ["1:0.9-1"],
+    ["1:1.0~rc1-1"],
+    ["1:1.0-1", "01:1.0-1"],
+    ["2:0.1-1"],
+]
+
+
+
+def sign(value):
+    return (value > 0) - (value < 0)
+
+
+class TestVersionKey(unittest.TestCase):
+
+    def setUp(self):
+        apt_pkg.init_system()
+        self.versions = [v for group in DPKG_ORDER for v in group]
+        self.expectedRanks = { v: rank for (rank, group) in enumerate(DPKG_ORDER) for v in group }
+
+    def test_sort_matches_dpkg_order(self):
+        shuffled = list(self.versions)
+        random.Random(42).shuffle(shuffled)
+        ordered = sorted(shuffled, key=versionKey)
+        ranks = [self.expectedRanks[v] for v in ordered]
+        self.assertEqual(sorted(ranks), ranks)
+
+    def test_equal_versions_have_equal_keys(self):
+        for group in DPKG_ORDER:
+            for version in group:
+                self.assertEqual(versionKey(group[0]), versionKey(version), version)
+
+    def test_compare_matches_apt_pkg(self):
+        for v1 in self.versions:
+            for v2 in self.versions:
+                (k1, k2) = (versionKey(v1), versionKey(v2))
+                self.assertEqual(sign(apt_pkg.version_compare(v1, v2)), (k1 > k2) - (k1 < k2), (v1, v2))
+
+    def test_tilde_and_padding_match_apt_pkg(self):
+        # '~' sorts before the end of a part, all other characters after it
+        versions = ["1", "1.0", "1.00", "1.0~", "1.0~~", "1.0~a", "1.0a", "1.0.", "1.0.0", "1.0+",
+                    "1~", "1~0", "1a", "1a~", "1.0-0", "1.0-0~1", "1.0-00", "1.0-0.0", "1.0-~", "1.0-a"]
+        for v1 in versions:
+            for v2 in versions:
+                (k1, k2) = (versionKey(v1), versionKey(v2))
+                self.assertEqual(sign(apt_pkg.version_compare(v1, v2)), (k1 > k2) - (k1 < k2), (v1, v2))
+
+
+if __name__ == "__main__":
+    unittest.main()